@@ -1,8 +1,79 @@
-"""Luxtronik v1 heatpump sensor integration."""
+"""Luxtronik v1 heatpump sensor integration.
 
+Importing the package does not import Home Assistant, the engine modules
+work standalone; the Home Assistant parts are imported on setup.
+"""
 
-async def async_setup(hass, config):
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .const import DEFAULT_NAME, DOMAIN
+
+if TYPE_CHECKING:
+    from homeassistant.config_entries import ConfigEntry
+    from homeassistant.core import HomeAssistant
+    from homeassistant.helpers.typing import ConfigType
+
+PLATFORMS = ["sensor", "binary_sensor", "select"]
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Integration setup."""
+    from .services import async_register_services
+
+    async_register_services(hass)
 
     # Return boolean to indicate that initialization was successful.
     return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up a controller from a config entry."""
+    from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT
+
+    from .const import CONF_PROXY_PORT
+    from .coordinator import HeatpumpCoordinator, async_open_history
+
+    options = {**entry.data, **entry.options}
+    coordinator = HeatpumpCoordinator(
+        hass,
+        options[CONF_HOST],
+        options[CONF_PORT],
+        title=options.get(CONF_NAME, DEFAULT_NAME),
+        history=await async_open_history(hass),
+        controller_id=entry.unique_id,
+    )
+    coordinator.apply_options(options)
+    await coordinator.async_set_proxy(options.get(CONF_PROXY_PORT, 0))
+    entry.runtime_data = coordinator
+    hass.data.setdefault(DOMAIN, {})[coordinator.controller_id] = coordinator
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+    # the first poll runs in the background, a slow or unreachable controller
+    # does not delay the startup
+    entry.async_create_background_task(
+        hass,
+        coordinator.async_refresh(),
+        f"{DOMAIN} first refresh {coordinator.controller_id}",
+    )
+    return True
+
+
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options to the running coordinator, without a reload."""
+    from .const import CONF_PROXY_PORT
+
+    options = {**entry.data, **entry.options}
+    entry.runtime_data.apply_options(options)
+    await entry.runtime_data.async_set_proxy(options.get(CONF_PROXY_PORT, 0))
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry and close its connection."""
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+    coordinator = entry.runtime_data
+    await coordinator.async_shutdown()
+    hass.data[DOMAIN].pop(coordinator.controller_id, None)
+    return True
@@ -0,0 +1,226 @@
+"""Compressor cycle, defrost and delta-T figures derived from the polls."""
+
+from __future__ import annotations
+
+from collections import deque, namedtuple
+from typing import NamedTuple
+
+if __package__:
+    from .const import (
+        DELTA_T_SAMPLES,
+        DERIVED_MAX_GAP,
+        RUN_LENGTH_RUNS,
+        SHORT_CYCLE,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+    )
+else:
+    from const import (
+        DELTA_T_SAMPLES,
+        DERIVED_MAX_GAP,
+        RUN_LENGTH_RUNS,
+        SHORT_CYCLE,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+    )
+
+
+class DerivedField(NamedTuple):
+    """Field of the derived record, shown as a sensor with name and unit."""
+
+    attr: str
+    name: str
+    unit: str = ""
+    total: bool = False  # only grows, apart from restarts
+
+
+# statuses accounted in time_<status>
+TIMED_STATUSES = tuple(
+    status for status in HeatPumpGenStatus if status != HeatPumpGenStatus.UNKNOWN
+)
+
+DERIVED_FIELDS = (
+    DerivedField("compressor_starts", "compressor starts", total=True),
+    DerivedField("compressor_starts_hour", "compressor starts last hour"),
+    DerivedField("compressor_short_cycles", "compressor short cycles", total=True),
+    DerivedField("compressor_run_length", "compressor last run length", "s"),
+    DerivedField("compressor_run_length_mean", "compressor mean run length", "s"),
+    DerivedField("defrosts", "defrosts", total=True),
+    DerivedField("defrosts_day", "defrosts last day"),
+    DerivedField("defrost_duration", "last defrost duration", "s"),
+    DerivedField("status_changes", "operational status changes", total=True),
+    DerivedField("delta_t", "heating circuit delta T", "°C"),
+    DerivedField("delta_t_running", "heating circuit mean delta T running", "°C"),
+    DerivedField("delta_t_source", "heat source delta T", "°C"),
+    *(
+        DerivedField(
+            "time_" + status.name.lower(),
+            "time " + status.name.lower().replace("_", " "),
+            "s",
+            True,
+        )
+        for status in TIMED_STATUSES
+    ),
+)
+
+DerivedRecord = namedtuple(
+    "DerivedRecord",
+    [field.attr for field in DERIVED_FIELDS],
+    defaults=(None,) * len(DERIVED_FIELDS),
+)
+
+EMPTY_DERIVED = DerivedRecord()
+
+
+class RollingMean:
+    """Mean of the last size samples, kept with a running sum."""
+
+    __slots__ = ("samples", "total")
+
+    def __init__(self, size) -> None:
+        """Init window."""
+        self.samples = deque(maxlen=size)
+        self.total = 0.0
+
+    def add(self, value):
+        """Add a sample, the oldest one leaves a full window."""
+        samples = self.samples
+        if len(samples) == samples.maxlen:
+            self.total -= samples[0]
+        samples.append(value)
+        self.total += value
+
+    @property
+    def mean(self):
+        """Mean of the window, None while it is empty."""
+        if not self.samples:
+            return None
+        return self.total / len(self.samples)
+
+
+class RollingCount:
+    """Events within the last seconds."""
+
+    __slots__ = ("times", "seconds")
+
+    def __init__(self, seconds) -> None:
+        """Init window."""
+        self.times = deque()
+        self.seconds = seconds
+
+    def add(self, now):
+        """Count an event."""
+        self.times.append(now)
+
+    def count(self, now):
+        """Events within the window ending at now."""
+        times = self.times
+        while times and times[0] <= now - self.seconds:
+            times.popleft()
+        return len(times)
+
+
+class DerivedMetrics:
+    """Figures derived from the raw records, updated in O(1) per poll.
+
+    The compressor runs while output_compressor1 or output_compressor2 is on,
+    a defrost while main_status is DEFROST. Time between two polls is
+    credited to the status seen by the first, up to DERIVED_MAX_GAP seconds
+    so an outage is not counted as time in a status.
+    """
+
+    def __init__(self) -> None:
+        """Init counters."""
+        self.record = EMPTY_DERIVED
+        self.last_time = None
+        self.status = None
+        self.status_since = None
+        self.running = None
+        self.run_start = None
+        self.starts = 0
+        self.short_cycles = 0
+        self.run_length = None
+        self.run_lengths = RollingMean(RUN_LENGTH_RUNS)
+        self.starts_hour = RollingCount(3600)
+        self.defrosts = 0
+        self.defrosts_day = RollingCount(86400)
+        self.defrost_duration = None
+        self.status_changes = 0
+        self.time_in_status = dict.fromkeys(TIMED_STATUSES, 0.0)
+        self.delta_t_running = RollingMean(DELTA_T_SAMPLES)
+
+    def update(self, records, now) -> DerivedRecord:
+        """Account the records of a poll at epoch time now."""
+        outputs = records[HeatPumpFunction.OUTPUTS]
+        temperatures = records[HeatPumpFunction.TEMPERATURE]
+        status = records[HeatPumpFunction.GEN_STATUS].main_status
+
+        if self.last_time is not None and self.status in self.time_in_status:
+            self.time_in_status[self.status] += min(
+                now - self.last_time, DERIVED_MAX_GAP
+            )
+        self.last_time = now
+
+        if status != HeatPumpGenStatus.UNKNOWN and status != self.status:
+            if self.status is not None:
+                self.status_changes += 1
+                if self.status == HeatPumpGenStatus.DEFROST:
+                    self.defrost_duration = now - self.status_since
+            if status == HeatPumpGenStatus.DEFROST and self.status is not None:
+                self.defrosts += 1
+                self.defrosts_day.add(now)
+            self.status = status
+            self.status_since = now
+
+        if outputs.output_compressor1 is not None:
+            running = bool(outputs.output_compressor1 or outputs.output_compressor2)
+            if running and self.running is False:
+                self.starts += 1
+                self.starts_hour.add(now)
+                self.run_start = now
+            elif not running and self.run_start is not None:
+                self.run_length = now - self.run_start
+                self.run_lengths.add(self.run_length)
+                if self.run_length < SHORT_CYCLE:
+                    self.short_cycles += 1
+                self.run_start = None
+            self.running = running
+
+        delta_t = difference(
+            temperatures.heating_circuit_flow_temp,
+            temperatures.heating_circuit_return_flow_temp_actual,
+        )
+        if delta_t is not None and self.running:
+            self.delta_t_running.add(delta_t)
+
+        self.record = DerivedRecord(
+            self.starts,
+            self.starts_hour.count(now),
+            self.short_cycles,
+            self.run_length,
+            rounded(self.run_lengths.mean),
+            self.defrosts,
+            self.defrosts_day.count(now),
+            self.defrost_duration,
+            self.status_changes,
+            delta_t,
+            rounded(self.delta_t_running.mean),
+            difference(
+                temperatures.heat_source_inlet_temp,
+                temperatures.heat_source_outlet_temp,
+            ),
+            *(round(seconds) for seconds in self.time_in_status.values()),
+        )
+        return self.record
+
+
+def difference(minuend, subtrahend):
+    """Difference of two temperatures, None if one is missing."""
+    if minuend is None or subtrahend is None:
+        return None
+    return round(minuend - subtrahend, 1)
+
+
+def rounded(value, digits=1):
+    """Round a value that may be None."""
+    return None if value is None else round(value, digits)
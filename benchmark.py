@@ -0,0 +1,664 @@
+"""Benchmarks for the heatpump engine.
+
+Run from the folder holding the integration, e.g.
+``python -m lux_heatpump.benchmark parse``,
+``python -m lux_heatpump.benchmark poll --controllers 1 8 --json poll.json``,
+``python -m lux_heatpump.benchmark replay lux.cap``,
+``python -m lux_heatpump.benchmark stress`` or
+``python -m lux_heatpump.benchmark imports``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+from datetime import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+if __package__:
+    from .const import (
+        RECORD_INTERVALS,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+    from .capture import async_replay, replay_engine
+    from .heatpump_engine import (
+        POLL_FUNCTIONS,
+        async_heatpump_engine,
+        heatpump_engine,
+    )
+    from .protocol import parse_record
+    from .simulator import ControllerModel, LuxtronikSimulator, SimulatorOptions
+else:
+    from const import (
+        RECORD_INTERVALS,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+    from capture import async_replay, replay_engine
+    from heatpump_engine import (
+        POLL_FUNCTIONS,
+        async_heatpump_engine,
+        heatpump_engine,
+    )
+    from protocol import parse_record
+    from simulator import ControllerModel, LuxtronikSimulator, SimulatorOptions
+
+# frames recorded from a Luxtronik v1 behind ser2net
+RECORDED_FRAMES = (
+    b"1100;12;301;289;290;512;-12;480;500;81;63;0;0;0",
+    b"3505;1;0",
+    b"3405;1;0",
+    b"1700;12;1; V2.33;1;5;24;9;11;10;12;30;0;1",
+    b"1100;12;298;287;290;498;-13;479;500;80;62;0;0;0",
+    b"1700;12;1; V2.33;1;0;24;9;11;10;12;35;0;1",
+)
+
+
+class LegacyParser:
+    """The per-line parsers used before the record layout table, as baseline."""
+
+    def __init__(self) -> None:
+        """Init parser state."""
+        self.main_sys_uptime = datetime.fromisoformat("2000-01-01T00:05:23")
+
+    def parse_line(self, line):
+        """Dispatch line like the former readlines if/elif chain."""
+        code = line.partition(b";")[0]
+        if code == b"1100":
+            self.extract_temp(line)
+        elif code == b"1700":
+            self.extract_gen_status(line, HeatPumpFunction.GEN_STATUS)
+        elif code == b"3405":
+            self.extract_mode(line, HeatPumpFunction.HEAT_CIRC)
+        else:
+            self.extract_mode(line, HeatPumpFunction.HOT_WATER)
+
+    def extract_temp(self, line):
+        """Extract temperature values from response."""
+
+        ser_str = line.decode("utf-8")
+        tokens = ser_str.split(";")
+        try:
+            cat1 = int(tokens[0])
+            if len(tokens) > 1:
+                nr_tokens = int(tokens[1])
+            else:
+                return
+        except ValueError:
+            return
+
+        if cat1 == 1100 and nr_tokens == 12 and len(tokens) == nr_tokens + 2:
+            tokens.pop(0)
+            tokens.pop(0)
+            try:
+                self.heating_circuit_flow_temp = float(tokens[0]) / 10.0
+                self.heating_circuit_return_flow_temp_actual = float(tokens[1]) / 10.0
+                self.heating_circuit_return_flow_temp_setpoint = float(tokens[2]) / 10.0
+                self.outdoor_temp = float(tokens[4]) / 10.0
+                self.domestic_hot_water_temp_actual = float(tokens[5]) / 10.0
+                self.domestic_hot_water_temp_setpoint = float(tokens[6]) / 10.0
+            except ValueError:
+                return
+
+    def extract_mode(self, line, function):
+        """Extract temperature values from response."""
+
+        if function in (HeatPumpFunction.HEAT_CIRC, HeatPumpFunction.HOT_WATER):
+            ser_str = line.decode("utf-8")
+            tokens = ser_str.split(";")
+            try:
+                cat1 = int(tokens[0])
+                if len(tokens) > 1:
+                    nr_tokens = int(tokens[1])
+                else:
+                    return -1
+            except ValueError:
+                return -1
+        else:
+            return -1
+
+        if cat1 == function.value and nr_tokens == 1 and len(tokens) == nr_tokens + 2:
+            tokens.pop(0)
+            tokens.pop(0)
+            if function == HeatPumpFunction.HEAT_CIRC:
+                self.heat_circ_mode = HeatPumpMode(int(tokens[0]))
+            else:
+                self.hot_water_mode = HeatPumpMode(int(tokens[0]))
+        return None
+
+    def extract_gen_status(self, line, function):
+        """Extract general status information from response."""
+
+        ser_str = line.decode("utf-8")
+        pattern = r"[,;]"
+        tokens = re.split(pattern, ser_str)
+        try:
+            cat1 = int(tokens[0])
+            if len(tokens) > 1:
+                nr_tokens = int(tokens[1])
+            else:
+                return -1
+        except ValueError:
+            return -1
+        if cat1 == function.value and nr_tokens == 12 and len(tokens) == nr_tokens + 2:
+            tokens.pop(0)
+            tokens.pop(0)
+            self.main_wp_type = HeatPumpType(int(tokens[0]))
+            self.main_sw_status = str(tokens[1]).strip()
+            self.main_biv_level = int(tokens[2])
+            self.main_status = HeatPumpGenStatus(int(tokens[3]))
+            self.main_sys_uptime = self.main_sys_uptime.replace(day=int(tokens[4]))
+            self.main_sys_uptime = self.main_sys_uptime.replace(month=int(tokens[5]))
+            self.main_sys_uptime = self.main_sys_uptime.replace(
+                year=2000 + int(tokens[6])
+            )
+            self.main_sys_uptime = self.main_sys_uptime.replace(hour=int(tokens[7]))
+            self.main_sys_uptime = self.main_sys_uptime.replace(minute=int(tokens[8]))
+            self.main_sys_uptime = self.main_sys_uptime.replace(second=int(tokens[9]))
+            self.main_compact = int(tokens[10])
+            self.main_comfort = int(tokens[11])
+        return None
+
+
+class _Target:
+    """Attribute sink for parse_record."""
+
+
+def bench_parse(frames=RECORDED_FRAMES, number=20000):
+    """Compare the record layout parser with the legacy parsers.
+
+    Returns {function code: (legacy, table)} in seconds per frame.
+    """
+    legacy = LegacyParser()
+    target = _Target()
+    for line in frames:
+        # both parsers must agree before their speed is compared
+        legacy.parse_line(line)
+        parse_record(target, line)
+    for attr, value in vars(legacy).items():
+        assert getattr(target, attr) == value, attr
+
+    results = {}
+    for line in frames:
+        code = line.partition(b";")[0].decode("utf-8")
+        if code in results:
+            continue
+        legacy_time = min(
+            timeit.repeat(lambda: legacy.parse_line(line), number=number, repeat=5)
+        )
+        table_time = min(
+            timeit.repeat(lambda: parse_record(target, line), number=number, repeat=5)
+        )
+        results[code] = (legacy_time / number, table_time / number)
+    return results
+
+
+def percentiles(samples):
+    """Return p50/p95/p99, mean and max of samples."""
+    if len(samples) < 2:
+        samples = samples * 2 or [0.0, 0.0]
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": cuts[49],
+        "p95": cuts[94],
+        "p99": cuts[98],
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+    }
+
+
+def bench_records(number=20000):
+    """Time parse_record on every record a controller sends.
+
+    Returns {record code: seconds per record}.
+    """
+    model = ControllerModel()
+    target = _Target()
+    results = {}
+    for function in POLL_FUNCTIONS:
+        for line in model.reply(function, time.time()).encode("utf-8").splitlines():
+            assert parse_record(target, line) is not None, line
+            results[line.partition(b";")[0].decode("utf-8")] = (
+                min(
+                    timeit.repeat(
+                        lambda: parse_record(target, line), number=number, repeat=5
+                    )
+                )
+                / number
+            )
+    return results
+
+
+async def bench_poll(controllers=1, cycles=200, pipelined=True, options=None):
+    """Run poll cycles of engines against simulated controllers.
+
+    Every record family is due in every cycle, a cycle polls all controllers
+    concurrently. Returns latency percentiles, bytes per poll, reconnects, the
+    serial line time per record family and the simulator statistics.
+    """
+    options = options or SimulatorOptions()
+    simulators = []
+    for index in range(controllers):
+        # every controller draws its own failures
+        controller_options = copy.copy(options)
+        controller_options.seed = options.seed + index
+        simulators.append(await LuxtronikSimulator(controller_options).start())
+    intervals = {
+        function: None if interval is None else 0
+        for function, interval in RECORD_INTERVALS.items()
+    }
+    engines = [
+        async_heatpump_engine(pipelined, adaptive=False, intervals=intervals)
+        for _ in simulators
+    ]
+    latencies = []
+    failed = 0
+    loop = asyncio.get_running_loop()
+
+    async def cycle(engine, port):
+        start = loop.time()
+        result = await engine.async_poll_for_stats("127.0.0.1", port)
+        latencies.append(loop.time() - start)
+        return result
+
+    try:
+        for _ in range(cycles):
+            results = await asyncio.gather(
+                *(
+                    cycle(engine, simulator.port)
+                    for engine, simulator in zip(engines, simulators)
+                )
+            )
+            failed += sum(1 for result in results if result != 0)
+    finally:
+        for engine in engines:
+            await engine.disconnect()
+        for simulator in simulators:
+            await simulator.stop()
+
+    polls = sum(engine.polls for engine in engines) or 1
+    connections = [engine.connection.stats() for engine in engines]
+    return {
+        "controllers": controllers,
+        "cycles": cycles,
+        "pipelined": pipelined,
+        "failed_polls": failed,
+        "strict_fallbacks": sum(
+            1 for engine in engines if pipelined and not engine.pipelined
+        ),
+        "cycle_latency": percentiles(latencies),
+        "bytes_read_per_poll": sum(c["bytes_read"] for c in connections) / polls,
+        "bytes_written_per_poll": sum(c["bytes_written"] for c in connections)
+        / polls,
+        "connects": sum(c["connects"] for c in connections),
+        "reconnects": sum(c["reconnects"] for c in connections),
+        "connect_duration": sum(c["connect_duration"] for c in connections),
+        "resyncs": sum(engine.decoder.resyncs for engine in engines),
+        "discarded_bytes": sum(engine.decoder.discarded_bytes for engine in engines),
+        "bus_time_per_fetch": {
+            function.name.lower(): sum(
+                engine.scheduler.schedules[function].bus_time for engine in engines
+            )
+            / (
+                sum(engine.scheduler.schedules[function].fetches for engine in engines)
+                or 1
+            )
+            for function in intervals
+        },
+        "simulator": {
+            key: sum(simulator.stats()[key] for simulator in simulators)
+            for key in simulators[0].stats()
+        },
+    }
+
+
+def bench_stress(
+    threads=8, tasks=8, readers=2, seconds=5.0, options=None, read_interval=0.001
+):
+    """Use one blocking engine from many threads and loop tasks at once.
+
+    threads call poll_for_stats, tasks on the engine loop call
+    async_poll_for_stats and readers take the latest snapshot without a lock
+    every read_interval seconds, all against one simulated controller with
+    every record family due in every poll. Returns the calls, the polls they
+    shared, the snapshot reads and the errors of engine and readers.
+    """
+    options = options or SimulatorOptions()
+    simulator_loop = asyncio.new_event_loop()
+    simulator_thread = threading.Thread(target=simulator_loop.run_forever)
+    simulator_thread.start()
+    simulator = asyncio.run_coroutine_threadsafe(
+        LuxtronikSimulator(options).start(), simulator_loop
+    ).result()
+    intervals = {
+        function: None if interval is None else 0
+        for function, interval in RECORD_INTERVALS.items()
+    }
+    wrapper = heatpump_engine(adaptive=False, intervals=intervals, poll_interval=0)
+    port = simulator.port
+    deadline = time.monotonic() + seconds
+    # list.append is atomic, the workers share these lists
+    latencies = []
+    failed = []
+    reads = []
+    regressions = []
+    incomplete = []
+
+    def call():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if wrapper.poll_for_stats("127.0.0.1", port) is not None:
+                failed.append(port)
+            latencies.append(time.perf_counter() - start)
+
+    async def call_async():
+        engine = wrapper.engine
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if await engine.async_poll_for_stats("127.0.0.1", port) != 0:
+                failed.append(port)
+            latencies.append(time.perf_counter() - start)
+
+    async def call_tasks():
+        await asyncio.gather(*(call_async() for _ in range(tasks)))
+
+    def read():
+        count = 0
+        seq = 0
+        while time.monotonic() < deadline:
+            snapshot = wrapper.snapshot
+            if snapshot.seq < seq:
+                regressions.append(snapshot.seq)
+            seq = snapshot.seq
+            # the first poll fetched every family, a record is never partial
+            if seq and any(None in record for record in snapshot.records.values()):
+                incomplete.append(seq)
+            count += 1
+            time.sleep(read_interval)
+        reads.append(count)
+
+    workers = [threading.Thread(target=call) for _ in range(threads)]
+    workers += [threading.Thread(target=read) for _ in range(readers)]
+    try:
+        for worker in workers:
+            worker.start()
+        asyncio.run_coroutine_threadsafe(call_tasks(), wrapper.loop).result()
+        for worker in workers:
+            worker.join()
+        simulator_stats = simulator.stats()
+    finally:
+        wrapper.close()
+        asyncio.run_coroutine_threadsafe(simulator.stop(), simulator_loop).result()
+        simulator_loop.call_soon_threadsafe(simulator_loop.stop)
+        simulator_thread.join()
+        simulator_loop.close()
+
+    engine = wrapper.engine
+    return {
+        "threads": threads,
+        "tasks": tasks,
+        "readers": readers,
+        "seconds": seconds,
+        "calls": len(latencies),
+        "polls": engine.polls,
+        "coalesced": engine.polls_coalesced,
+        "failed_calls": len(failed),
+        "call_latency": percentiles(latencies),
+        "snapshot_reads": sum(reads),
+        "seq_regressions": len(regressions),
+        "incomplete_snapshots": len(incomplete),
+        "engine_errors": engine.metrics_report().get("errors", {}),
+        "simulator": simulator_stats,
+    }
+
+
+async def bench_replay(path):
+    """Decode a frame capture at full speed.
+
+    Returns the received bytes, reads, snapshots and seconds it took.
+    """
+    engine = replay_engine(path)
+    snapshots = 0
+    start = time.perf_counter()
+    async for _ in async_replay(engine):
+        snapshots += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "bytes": engine.connection.bytes_read,
+        "reads": engine.connection.frames,
+        "snapshots": snapshots,
+        "seconds": elapsed,
+    }
+
+
+# standard library modules imported by Home Assistant before integrations
+PRELOADED = "argparse, asyncio, datetime, enum, json, mmap, random, struct"
+
+
+def bench_imports(repeat=5):
+    """Import the package and the standalone engine in fresh interpreters.
+
+    The standard library modules Home Assistant has loaded anyway are
+    imported first. Returns the best cumulative import time of every module
+    in seconds and whether the import pulled in Home Assistant.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    package = os.path.basename(folder)
+    # the standalone engine is imported with the folder behind the standard
+    # library, so its select platform does not shadow the select module
+    targets = {
+        package: "",
+        package + ".heatpump_engine": "",
+        "heatpump_engine": "sys.path.append(%r); " % folder,
+    }
+    results = {}
+    for module, setup in targets.items():
+        best = None
+        for _ in range(repeat):
+            process = subprocess.run(
+                [
+                    sys.executable,
+                    "-X",
+                    "importtime",
+                    "-c",
+                    "import sys, %s; %simport %s; "
+                    "print('homeassistant' in sys.modules)"
+                    % (PRELOADED, setup, module),
+                ],
+                cwd=os.path.dirname(folder),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            # import time: self [us] | cumulative | imported package
+            for line in process.stderr.splitlines():
+                fields = line.split("|")
+                if len(fields) == 3 and fields[2].strip() == module:
+                    cumulative = int(fields[1]) / 1e6
+                    best = cumulative if best is None else min(best, cumulative)
+        results[module] = {
+            "seconds": best,
+            "homeassistant": process.stdout.strip() == "True",
+        }
+    return results
+
+
+def print_poll(run):
+    """Print the summary of a bench_poll run."""
+    latency = run["cycle_latency"]
+    print(
+        "%3d controllers  %4d cycles  p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms"
+        "  %6.0f B/poll  %d reconnects  %d resyncs  %d failed"
+        % (
+            run["controllers"],
+            run["cycles"],
+            latency["p50"] * 1e3,
+            latency["p95"] * 1e3,
+            latency["p99"] * 1e3,
+            run["bytes_read_per_poll"],
+            run["reconnects"],
+            run["resyncs"],
+            run["failed_polls"],
+        )
+    )
+
+
+def main(argv=None):
+    """Run the benchmarks selected on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+    parse = sub.add_parser("parse", help="record parser micro-benchmark")
+    parse.add_argument("--number", type=int, default=20000)
+    poll = sub.add_parser("poll", help="poll cycles against simulated controllers")
+    poll.add_argument(
+        "--controllers", type=int, nargs="+", default=[1, 8], help="one run each"
+    )
+    poll.add_argument("--cycles", type=int, default=200)
+    poll.add_argument("--strict", action="store_true", help="disable pipelining")
+    poll.add_argument("--baud", type=int, default=57600, help="0 disables line delay")
+    poll.add_argument("--jitter", type=float, default=0.0)
+    poll.add_argument("--drop", type=float, default=0.0)
+    poll.add_argument("--garble", type=float, default=0.0)
+    poll.add_argument("--split", action="store_true")
+    poll.add_argument("--kick-interval", type=float, default=None)
+    poll.add_argument("--seed", type=int, default=0)
+    poll.add_argument("--json", help="write the results to this file")
+    replay = sub.add_parser("replay", help="decode a frame capture at full speed")
+    replay.add_argument("path")
+    stress = sub.add_parser("stress", help="concurrent callers of one engine")
+    stress.add_argument("--threads", type=int, default=8)
+    stress.add_argument("--tasks", type=int, default=8)
+    stress.add_argument("--readers", type=int, default=2)
+    stress.add_argument("--seconds", type=float, default=5.0)
+    stress.add_argument("--baud", type=int, default=57600, help="0 disables line delay")
+    stress.add_argument("--seed", type=int, default=0)
+    imports = sub.add_parser("imports", help="import time of package and engine")
+    imports.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.bench == "parse":
+        results = bench_parse(number=args.number)
+        print("code   legacy extract_*   parse_record   speedup")
+        for code, (legacy, table) in results.items():
+            print(
+                "%-6s %12.2f us %12.2f us %8.2f x"
+                % (code, legacy * 1e6, table * 1e6, legacy / table)
+            )
+        legacy = sum(result[0] for result in results.values())
+        table = sum(result[1] for result in results.values())
+        print(
+            "poll   %12.2f us %12.2f us %8.2f x"
+            % (legacy * 1e6, table * 1e6, legacy / table)
+        )
+        print("legacy extract_temp decodes 6 of the 12 fields of 1100")
+
+    if args.bench == "poll":
+        options = SimulatorOptions(
+            baud_rate=args.baud,
+            jitter=args.jitter,
+            drop_rate=args.drop,
+            garble_rate=args.garble,
+            split=args.split,
+            kick_interval=args.kick_interval,
+            seed=args.seed,
+        )
+        report = {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "options": vars(args),
+            "runs": [],
+            "parse_time": bench_records(),
+        }
+        for controllers in args.controllers:
+            run = asyncio.run(
+                bench_poll(controllers, args.cycles, not args.strict, options)
+            )
+            print_poll(run)
+            report["runs"].append(run)
+        for code, seconds in report["parse_time"].items():
+            print("parse %-6s %8.2f us" % (code, seconds * 1e6))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2)
+
+    if args.bench == "replay":
+        result = asyncio.run(bench_replay(args.path))
+        print(
+            "%d bytes in %d reads, %d snapshots in %.3f s, %.0f kB/s"
+            % (
+                result["bytes"],
+                result["reads"],
+                result["snapshots"],
+                result["seconds"],
+                result["bytes"] / result["seconds"] / 1e3,
+            )
+        )
+
+    if args.bench == "stress":
+        run = bench_stress(
+            args.threads,
+            args.tasks,
+            args.readers,
+            args.seconds,
+            SimulatorOptions(baud_rate=args.baud, seed=args.seed),
+        )
+        latency = run["call_latency"]
+        print(
+            "%d calls from %d threads and %d tasks shared %d polls"
+            "  p50 %.1f ms  p99 %.1f ms  %d failed"
+            % (
+                run["calls"],
+                run["threads"],
+                run["tasks"],
+                run["polls"],
+                latency["p50"] * 1e3,
+                latency["p99"] * 1e3,
+                run["failed_calls"],
+            )
+        )
+        print(
+            "%d lock-free snapshot reads, %d seq regressions, %d incomplete"
+            % (
+                run["snapshot_reads"],
+                run["seq_regressions"],
+                run["incomplete_snapshots"],
+            )
+        )
+        print("engine errors %s" % run["engine_errors"])
+        print("simulator %s" % run["simulator"])
+        if run["failed_calls"] or run["seq_regressions"] or run["engine_errors"]:
+            sys.exit(1)
+
+    if args.bench == "imports":
+        failed = False
+        for module, result in bench_imports(args.repeat).items():
+            print(
+                "%-32s %8.2f ms%s"
+                % (
+                    module,
+                    result["seconds"] * 1e3,
+                    "  imports homeassistant" if result["homeassistant"] else "",
+                )
+            )
+            failed |= result["homeassistant"]
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
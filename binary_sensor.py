@@ -0,0 +1,57 @@
+"""Platform for binary sensor integration."""
+
+from __future__ import annotations
+
+from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+from .const import DOMAIN, HeatPumpFunction
+from .coordinator import HeatpumpCoordinator
+from .entity import HeatpumpEntity
+from .protocol import Field, record_fields
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Set up the input and output states, discovered by the sensor platform."""
+    if discovery_info is None:
+        return
+    coordinator = hass.data[DOMAIN][discovery_info["controller"]]
+    async_add_entities(controller_binary_sensors(coordinator))
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the input and output states of a config entry."""
+    async_add_entities(controller_binary_sensors(entry.runtime_data))
+
+
+def controller_binary_sensors(coordinator: HeatpumpCoordinator):
+    """Return the input and output states of one controller."""
+    return [
+        HeatpumpBinarySensor(coordinator, field)
+        for function in (HeatPumpFunction.INPUTS, HeatPumpFunction.OUTPUTS)
+        for field in record_fields(function)
+    ]
+
+
+class HeatpumpBinarySensor(HeatpumpEntity, BinarySensorEntity):
+    """Representation of an input or output of the controller."""
+
+    def __init__(self, coordinator: HeatpumpCoordinator, field: Field) -> None:
+        """Init binary sensor."""
+        super().__init__(coordinator, field.attr, field.name)
+
+    def update_from_snapshot(self) -> None:
+        """Take over the field value of the latest snapshot."""
+        self._attr_is_on = self.snapshot_value()
@@ -0,0 +1,302 @@
+"""Capture of the bytes exchanged with ser2net and their replay.
+
+Decode a capture from the folder holding the integration, e.g.
+``python -m lux_heatpump.capture decode lux.cap`` or
+``python -m lux_heatpump.capture dump lux.cap``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import struct
+import time
+
+if __package__:
+    from .const import RECORD_INTERVALS
+    from .heatpump_engine import async_heatpump_engine
+    from .snapshot import json_value
+else:
+    from const import RECORD_INTERVALS
+    from heatpump_engine import async_heatpump_engine
+    from snapshot import json_value
+
+MAGIC = b"LUXCAP1\n"
+# epoch time, direction, payload length
+_RECORD = struct.Struct("<dcI")
+
+RECEIVED = b"R"
+SENT = b"W"
+CONNECTED = b"C"  # payload is "<host>:<port>"
+
+
+class FrameCapture:
+    """Append-only log of the bytes exchanged with ser2net."""
+
+    def __init__(self, path) -> None:
+        """Open the log, a new file starts with MAGIC."""
+        self.file = open(path, "ab", buffering=1 << 16)
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.records = 0
+
+    def record(self, direction: bytes, data: bytes, now=None):
+        """Append the bytes of one read, write or connect."""
+        self.file.write(
+            _RECORD.pack(time.time() if now is None else now, direction, len(data))
+        )
+        self.file.write(data)
+        self.records += 1
+
+    def received(self, data: bytes):
+        """Append received bytes."""
+        self.record(RECEIVED, data)
+
+    def sent(self, data: bytes):
+        """Append sent bytes."""
+        self.record(SENT, data)
+
+    def connected(self, host, port):
+        """Append the start of a session."""
+        self.record(CONNECTED, f"{host}:{port}".encode("utf-8"))
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        self.file.flush()
+
+    def close(self):
+        """Close the log."""
+        self.file.close()
+
+
+def read_capture(path):
+    """Yield (time, direction, data) of the records of a log.
+
+    A record cut off by a crash ends the log.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is no frame capture")
+        while True:
+            header = file.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            when, direction, size = _RECORD.unpack(header)
+            data = file.read(size)
+            if len(data) < size:
+                return
+            yield when, direction, data
+
+
+class ReplayConnection:
+    """Transport serving the received bytes of a capture to an engine.
+
+    It offers the interface of Ser2NetConnection. Every write of the engine
+    releases the bytes received up to the next recorded write, a read at a
+    recorded write the engine did not match times out at once. A recorded
+    connect ends the session like a dropped connection. With realtime the
+    bytes are served at their recorded pace, otherwise at full speed.
+    """
+
+    def __init__(self, records, realtime=False, on_connect=None) -> None:
+        """Init replay of (time, direction, data) records."""
+        self.records = iter(records)
+        self.next_record = next(self.records, None)
+        self.realtime = realtime
+        self.on_connect = on_connect
+        self.host = None
+        self.port = None
+        self.connected = False
+        self.written = False  # the engine wrote since the last recorded write
+        self.exhausted = False
+        self.start = None  # loop time and capture time of the first record
+        self.capture_start = None
+        self.last_time = None  # capture time of the last received bytes
+        # statistics
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.last_connect_duration = 0.0
+        self.connect_duration = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.frames = 0
+        self.disconnect_reason = None
+
+    def advance(self):
+        """Move on to the next record."""
+        self.next_record = next(self.records, None)
+
+    def is_connected(self) -> bool:
+        """Check connection state."""
+        return self.connected
+
+    async def set_peer(self, host, port):
+        """Take over host and port, they do not select anything."""
+        self.host = host
+        self.port = port
+
+    async def ensure_connected(self):
+        """Open the next recorded session, -1 at the end of the capture."""
+        if self.connected:
+            return 0
+        if self.next_record is None:
+            self.exhausted = True
+            self.connect_failures += 1
+            return -1
+        if self.next_record[1] == CONNECTED:
+            self.advance()
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        self.connected = True
+        self.written = False
+        if self.on_connect is not None:
+            self.on_connect()
+        return 0
+
+    async def close(self, reason=None):
+        """Close the session."""
+        self.drop(reason)
+
+    def drop(self, reason):
+        """End the session."""
+        self.connected = False
+        self.disconnect_reason = reason
+
+    async def pace(self, when):
+        """Wait until the recorded time of a record in realtime mode."""
+        loop = asyncio.get_running_loop()
+        if self.start is None:
+            self.start = loop.time()
+            self.capture_start = when
+        delay = (when - self.capture_start) - (loop.time() - self.start)
+        if self.realtime and delay > 0:
+            await asyncio.sleep(delay)
+
+    async def read(self, size):
+        """Return the next received bytes, b"" if the session ended."""
+        while self.connected:
+            if self.next_record is None:
+                self.exhausted = True
+                self.drop("end of capture")
+                break
+            when, direction, data = self.next_record
+            if direction == CONNECTED:
+                self.drop("reconnect in capture")
+                break
+            if direction == SENT:
+                if not self.written:
+                    raise TimeoutError
+                self.written = False
+                self.advance()
+                continue
+            await self.pace(when)
+            self.advance()
+            self.last_time = when
+            self.bytes_read += len(data)
+            self.frames += 1
+            return data
+        return b""
+
+    async def write(self, data):
+        """Accept data, 0 on success, -1 if the session ended."""
+        if not self.connected:
+            return -1
+        self.written = True
+        self.bytes_written += len(data)
+        return 0
+
+    def stats(self):
+        """Return replay statistics."""
+        return {
+            "connected": self.connected,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "last_connect_duration": self.last_connect_duration,
+            "connect_duration": self.connect_duration,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "failures_in_row": 0,
+            "retry_in": 0.0,
+            "session_duration": None,
+            "last_session_duration": None,
+            "disconnect_reason": self.disconnect_reason,
+        }
+
+
+def replay_engine(path, realtime=False):
+    """Return an engine reading the capture at path.
+
+    At full speed every poll requests all records, values are not filtered.
+    """
+    intervals = RECORD_INTERVALS
+    if not realtime:
+        intervals = {
+            function: None if interval is None else 0
+            for function, interval in intervals.items()
+        }
+    connection = ReplayConnection(read_capture(path), realtime)
+    return async_heatpump_engine(
+        adaptive=realtime,
+        intervals=intervals,
+        deadbands={},
+        connection=connection,
+    )
+
+
+async def async_replay(engine):
+    """Poll an engine on a ReplayConnection, yield every new snapshot."""
+    connection = engine.connection
+    snapshot = engine.snapshot
+    while not connection.exhausted:
+        # gaps in a capture are no controller dropping queued commands
+        engine.pipeline_drops = 0
+        if connection.realtime:
+            await asyncio.sleep(engine.scheduler.tick)
+        if await engine.async_poll_for_stats("replay", 0) == 0:
+            if engine.snapshot is not snapshot:
+                snapshot = engine.snapshot
+                yield snapshot
+
+
+async def async_decode(path, realtime):
+    """Print the snapshots decoded from a capture as JSON lines."""
+    engine = replay_engine(path, realtime)
+    async for snapshot in async_replay(engine):
+        print(
+            json.dumps(
+                {
+                    "seq": snapshot.seq,
+                    "time": engine.connection.last_time,
+                    "values": {
+                        attr: json_value(snapshot.get(attr))
+                        for attr in sorted(snapshot.changed)
+                    },
+                }
+            )
+        )
+
+
+def main(argv=None):
+    """Parse the command line and run the selected command."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump = sub.add_parser("dump", help="print the records of a capture")
+    dump.add_argument("path")
+    decode = sub.add_parser("decode", help="decode a capture to JSON lines")
+    decode.add_argument("path")
+    decode.add_argument("--realtime", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "dump":
+        for when, direction, data in read_capture(args.path):
+            print("%.6f %s %r" % (when, direction.decode("ascii"), data))
+    elif args.command == "decode":
+        asyncio.run(async_decode(args.path, args.realtime))
+
+
+if __name__ == "__main__":
+    main()
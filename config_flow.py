@@ -0,0 +1,147 @@
+"""Config flow for the Luxtronik v1 heatpump."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.config_entries import (
+    ConfigEntry,
+    ConfigFlow,
+    ConfigFlowResult,
+    OptionsFlow,
+)
+from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    CONF_ADAPTIVE,
+    CONF_CONNECT_TIMEOUT,
+    CONF_MODE_WRITES,
+    CONF_PIPELINED,
+    CONF_PROXY_PORT,
+    CONF_READ_TIMEOUT,
+    CONNECT_TIMEOUT,
+    DEFAULT_NAME,
+    DEFAULT_PORT,
+    DOMAIN,
+    PROXY_HOST,
+    READ_TIMEOUT,
+    RECORD_INTERVALS,
+)
+from .coordinator import interval_option
+
+
+async def async_can_connect(host, port, timeout=CONNECT_TIMEOUT) -> bool:
+    """Check that ser2net accepts a connection."""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+    except (TimeoutError, OSError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def async_can_reach(hass: HomeAssistant, host, port) -> bool:
+    """Check that ser2net at host:port is reachable, without kicking a poller.
+
+    With kickolduser a probe would kick the coordinator already polling the
+    endpoint, its proxy is probed instead, without one the probe is skipped.
+    """
+    for coordinator in hass.data.get(DOMAIN, {}).values():
+        if coordinator.host == host and coordinator.port == port:
+            if coordinator.proxy is None:
+                return True
+            return await async_can_connect(PROXY_HOST, coordinator.proxy.listen_port)
+    return await async_can_connect(host, port)
+
+
+class LuxHeatpumpConfigFlow(ConfigFlow, domain=DOMAIN):
+    """Add a controller by its ser2net host and port."""
+
+    VERSION = 1
+
+    async def async_step_user(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Ask for host, port and name."""
+        errors = {}
+        if user_input is not None:
+            host = user_input[CONF_HOST]
+            port = user_input[CONF_PORT]
+            await self.async_set_unique_id(f"{host}:{port}")
+            self._abort_if_unique_id_configured()
+            if await async_can_reach(self.hass, host, port):
+                return self.async_create_entry(
+                    title=user_input[CONF_NAME], data=user_input
+                )
+            errors["base"] = "cannot_connect"
+        return self.async_show_form(
+            step_id="user",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_HOST): str,
+                    vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
+                    vol.Required(CONF_NAME, default=DEFAULT_NAME): str,
+                }
+            ),
+            errors=errors,
+        )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        """Return the options flow."""
+        return LuxHeatpumpOptionsFlow(config_entry)
+
+
+class LuxHeatpumpOptionsFlow(OptionsFlow):
+    """Change peer, intervals and timeouts of a running controller."""
+
+    def __init__(self, config_entry: ConfigEntry) -> None:
+        """Init options flow."""
+        self.entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Show the options, they are applied without a reload."""
+        if user_input is not None:
+            return self.async_create_entry(data=user_input)
+        current = {**self.entry.data, **self.entry.options}
+        schema = {
+            vol.Required(CONF_HOST, default=current[CONF_HOST]): str,
+            vol.Required(CONF_PORT, default=current[CONF_PORT]): int,
+            vol.Required(
+                CONF_PIPELINED, default=current.get(CONF_PIPELINED, True)
+            ): bool,
+            vol.Required(CONF_ADAPTIVE, default=current.get(CONF_ADAPTIVE, True)): bool,
+            vol.Required(
+                CONF_READ_TIMEOUT, default=current.get(CONF_READ_TIMEOUT, READ_TIMEOUT)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0.05, max=10)),
+            vol.Required(
+                CONF_CONNECT_TIMEOUT,
+                default=current.get(CONF_CONNECT_TIMEOUT, CONNECT_TIMEOUT),
+            ): vol.All(vol.Coerce(float), vol.Range(min=1, max=60)),
+            vol.Required(
+                CONF_MODE_WRITES, default=current.get(CONF_MODE_WRITES, False)
+            ): bool,
+            vol.Required(
+                CONF_PROXY_PORT, default=current.get(CONF_PROXY_PORT, 0)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+        }
+        for function, interval in RECORD_INTERVALS.items():
+            if interval is not None:
+                option = interval_option(function)
+                schema[vol.Required(option, default=current.get(option, interval))] = (
+                    vol.All(vol.Coerce(float), vol.Range(min=1, max=86400))
+                )
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(schema))
@@ -0,0 +1,217 @@
+"""Long-lived ser2net connection with reconnect backoff."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import socket
+
+if __package__:
+    from .const import (
+        BACKOFF_INITIAL,
+        BACKOFF_MAX,
+        CONNECT_TIMEOUT,
+        KEEPALIVE_COUNT,
+        KEEPALIVE_IDLE,
+        KEEPALIVE_INTERVAL,
+    )
+else:
+    from const import (
+        BACKOFF_INITIAL,
+        BACKOFF_MAX,
+        CONNECT_TIMEOUT,
+        KEEPALIVE_COUNT,
+        KEEPALIVE_IDLE,
+        KEEPALIVE_INTERVAL,
+    )
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def enable_keepalive(sock: socket.socket) -> None:
+    """Let the kernel probe an idle connection to detect a dead peer."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # the fine tuning options are not available on every platform
+    for option, value in (
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+class Ser2NetConnection:
+    """One long-lived TCP session to ser2net.
+
+    The session is kept open between polls. It is only considered dead after
+    a read or write failed, the peer closed it or TCP keepalive gave up, then
+    it is reopened with exponential backoff and jitter.
+    """
+
+    def __init__(self, on_connect=None) -> None:
+        """Init connection, on_connect is called after every connect."""
+        self.host = None
+        self.port = None
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.on_connect = on_connect
+        self.connect_timeout = CONNECT_TIMEOUT
+        self.capture = None  # FrameCapture logging the exchanged bytes
+        self.failures = 0  # failed connects in a row
+        self.next_attempt = 0.0
+        # statistics
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.last_connect_duration = 0.0
+        self.connect_duration = 0.0  # seconds spent connecting, in total
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.connected_since = None  # loop time the session was opened
+        self.last_session_duration = None
+        self.disconnect_reason = None
+
+    def is_connected(self) -> bool:
+        """Check connection state without touching the socket."""
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def set_peer(self, host, port):
+        """Update host and port, an open session to another peer is closed."""
+        if port != self.port or host != self.host:
+            await self.close("peer changed")
+            self.host = host
+            self.port = port
+            self.failures = 0
+            self.next_attempt = 0.0
+
+    def backoff(self):
+        """Seconds to wait after the current number of failed connects."""
+        delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2 ** (self.failures - 1))
+        # equal jitter spreads reconnects of several clients
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def ensure_connected(self):
+        """Open the session unless it is open, 0 on success, -1 otherwise."""
+        if self.is_connected():
+            return 0
+        loop = asyncio.get_running_loop()
+        if loop.time() < self.next_attempt:
+            return -1
+        start = loop.time()
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.connect_timeout
+            )
+        except (TimeoutError, OSError) as err:
+            self.failures += 1
+            self.connect_failures += 1
+            self.next_attempt = loop.time() + self.backoff()
+            _LOGGER.warning(
+                "Cannot connect to %s:%s (%s), retry in %.1f s",
+                self.host,
+                self.port,
+                err or "timeout",
+                self.next_attempt - loop.time(),
+            )
+            return -1
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            enable_keepalive(sock)
+        self.last_connect_duration = loop.time() - start
+        self.connect_duration += self.last_connect_duration
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        self.failures = 0
+        self.connected_since = loop.time()
+        if self.capture is not None:
+            self.capture.connected(self.host, self.port)
+        if self.on_connect is not None:
+            self.on_connect()
+        return 0
+
+    async def close(self, reason=None):
+        """Close the session."""
+        if self.writer is not None:
+            self.disconnect_reason = reason
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.end_session()
+
+    def drop(self, reason):
+        """Forget a dead session, the next ensure_connected reopens it."""
+        _LOGGER.debug("Connection to %s:%s lost: %s", self.host, self.port, reason)
+        if self.writer is not None:
+            self.writer.close()
+        self.disconnect_reason = reason
+        self.end_session()
+
+    def end_session(self):
+        """Forget the session, keep how long it lasted."""
+        if self.connected_since is not None:
+            now = asyncio.get_running_loop().time()
+            self.last_session_duration = round(now - self.connected_since, 3)
+        self.reader = None
+        self.writer = None
+        self.connected_since = None
+
+    async def read(self, size):
+        """Read up to size bytes, b"" if the session died."""
+        if self.reader is None:
+            return b""
+        try:
+            data = await self.reader.read(size)
+        except OSError as err:
+            self.drop(str(err))
+            return b""
+        if not data:
+            self.drop("closed by peer")
+        self.bytes_read += len(data)
+        if self.capture is not None and data:
+            self.capture.received(data)
+        return data
+
+    async def write(self, data):
+        """Write data, 0 on success, -1 if the session died."""
+        try:
+            self.writer.write(data)
+            await self.writer.drain()
+        except OSError as err:
+            self.drop(str(err))
+            return -1
+        self.bytes_written += len(data)
+        if self.capture is not None:
+            self.capture.sent(data)
+        return 0
+
+    def stats(self):
+        """Return connect statistics.
+
+        session_duration is the age of the open session, retry_in the
+        backoff left before the next connect attempt, in seconds.
+        """
+        now = asyncio.get_running_loop().time()
+        return {
+            "connected": self.is_connected(),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "last_connect_duration": round(self.last_connect_duration, 6),
+            "connect_duration": round(self.connect_duration, 6),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "failures_in_row": self.failures,
+            "retry_in": round(max(self.next_attempt - now, 0.0), 1),
+            "session_duration": (
+                None
+                if self.connected_since is None
+                else round(now - self.connected_since, 3)
+            ),
+            "last_session_duration": self.last_session_duration,
+            "disconnect_reason": self.disconnect_reason,
+        }
@@ -3,8 +3,47 @@
 from enum import IntEnum
 
 DOMAIN = "lux_heatpump"
+DEFAULT_NAME = "luxtronik1"
+DEFAULT_PORT = 4322
+
+# options of a config entry next to host, port and name, the interval of a
+# record family is option "interval_<family>", e.g. interval_temperature
+CONF_PIPELINED = "pipelined"
+CONF_ADAPTIVE = "adaptive_polling"
+CONF_READ_TIMEOUT = "read_timeout"
+CONF_CONNECT_TIMEOUT = "connect_timeout"
+CONF_PROXY_PORT = "proxy_port"
+CONF_MODE_WRITES = "mode_writes"
 
 POLL_INTERVAL = 5  # seconds
+CONNECT_TIMEOUT = 5  # seconds
+BACKOFF_INITIAL = 1  # seconds before the first reconnect attempt
+BACKOFF_MAX = 300  # seconds, upper bound of the reconnect backoff
+KEEPALIVE_IDLE = 30  # seconds idle before TCP keepalive probes start
+KEEPALIVE_INTERVAL = 10  # seconds between TCP keepalive probes
+KEEPALIVE_COUNT = 3  # unanswered probes until the session is dead
+READ_TIMEOUT = 0.5  # seconds of an idle line until a reply counts as missing
+READ_SIZE = 1024  # bytes requested from the socket per read
+MAX_LINE = 512  # bytes a line may grow to before the decoder resyncs
+PROXY_HOST = "127.0.0.1"  # interface the ser2net proxy listens on
+PROXY_TTL = 2.0  # seconds a reply is served to proxy clients again
+PIPELINE_MAX_DROPS = 3  # lossy pipelined polls before falling back to strict mode
+PIPELINE_RETRY = 3600  # seconds in strict mode before pipelining is tried again
+RETRY_MAX = 300  # seconds, upper bound of the retry delay of a failing record
+STALE_INTERVALS = 3  # missed intervals after which a record is stale
+ADAPTIVE_STEADY_POLLS = 3  # unchanged fetches before a poll interval doubles
+ADAPTIVE_MAX_FACTOR = 4  # adaptive intervals stay below 4x their base interval
+TEMP_DEADBAND = 0.2  # degC a temperature must change to be published
+TEMP_HYSTERESIS = 0.1  # extra degC for a change against the last direction
+MAX_SILENCE = 300  # seconds a held back value waits at most
+SHORT_CYCLE = 600  # seconds, compressor runs shorter than this are short cycles
+RUN_LENGTH_RUNS = 10  # compressor runs averaged into the mean run length
+DELTA_T_SAMPLES = 60  # polls with running compressor averaged into the delta T
+DERIVED_MAX_GAP = 600  # seconds between polls credited to the last status
+HISTORY_ROWS = 720  # raw samples kept, an hour at the poll interval
+# rollup bucket seconds: buckets kept, a day of minutes, a week of quarter
+# hours and 90 days of hours
+HISTORY_ROLLUPS = {60: 1440, 900: 672, 3600: 2160}
 
 
 class HeatPumpType(IntEnum):
@@ -45,3 +84,67 @@ class HeatPumpType(IntEnum):
     LD5 = 41
     LD7 = 42
     UNKNOWN = -1
+
+
+class HeatPumpMode(IntEnum):
+    """Heatpump mode."""
+
+    AUTO = 0
+    ZWE = 1
+    PARTY = 2
+    VACATION = 3
+    OFF = 4
+    UNKNOWN = 5
+
+
+class HeatPumpFunction(IntEnum):
+    """Heatpump functions."""
+
+    UNIQUE_ID = 0
+    TEMPERATURE = 1100
+    INPUTS = 1200
+    OUTPUTS = 1300
+    RUNTIMES = 1400
+    FAULTS = 1500
+    SHUTDOWNS = 1600
+    HEAT_CIRC = 3405
+    HOT_WATER = 3505
+    GEN_STATUS = 1700
+    UNKNOWN = -1
+
+
+# requests "<code>;1;<mode>" setting the mode HEAT_CIRC and HOT_WATER read,
+# not confirmed on hardware yet, they are only sent with the mode_writes option
+MODE_WRITE_CODES = {
+    HeatPumpFunction.HEAT_CIRC: 3401,
+    HeatPumpFunction.HOT_WATER: 3501,
+}
+COMMAND_RETRIES = 2  # writes repeated when the read back mode differs
+
+
+class HeatPumpGenStatus(IntEnum):
+    """General heatpump status."""
+
+    HEATING = 0
+    HOT_WATER = 1
+    EVU_LOCK = 3  # external lock to stop heat pump electric power consumptions under certain conditions e.g. grit usage, price
+    DEFROST = 4
+    IDLE = 5
+    HEATING_EXT_SOURCE = 6
+    COOLING = 7
+    UNKNOWN = -1
+
+
+# seconds between two fetches of a function, None fetches once per connection
+RECORD_INTERVALS = {
+    HeatPumpFunction.UNIQUE_ID: None,
+    HeatPumpFunction.TEMPERATURE: POLL_INTERVAL,
+    HeatPumpFunction.INPUTS: POLL_INTERVAL,
+    HeatPumpFunction.OUTPUTS: POLL_INTERVAL,
+    HeatPumpFunction.HOT_WATER: POLL_INTERVAL,
+    HeatPumpFunction.HEAT_CIRC: POLL_INTERVAL,
+    HeatPumpFunction.GEN_STATUS: POLL_INTERVAL,
+    HeatPumpFunction.RUNTIMES: 300,
+    HeatPumpFunction.FAULTS: 600,
+    HeatPumpFunction.SHUTDOWNS: 600,
+}
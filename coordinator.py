@@ -0,0 +1,206 @@
+"""Coordinator running one heatpump poll per interval for all entities."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+
+from homeassistant.const import CONF_HOST, CONF_PORT
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import (
+    CONF_ADAPTIVE,
+    CONF_CONNECT_TIMEOUT,
+    CONF_MODE_WRITES,
+    CONF_PIPELINED,
+    CONF_READ_TIMEOUT,
+    CONNECT_TIMEOUT,
+    DEFAULT_NAME,
+    DOMAIN,
+    HISTORY_ROLLUPS,
+    HISTORY_ROWS,
+    PROXY_HOST,
+    READ_TIMEOUT,
+    RECORD_INTERVALS,
+    HeatPumpFunction,
+    HeatPumpMode,
+)
+from .heatpump_engine import POLL_FUNCTIONS, async_heatpump_engine
+from .history import HeatpumpHistory, history_fields
+from .proxy import Ser2NetProxy
+from .snapshot import HeatpumpSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def interval_option(function: HeatPumpFunction) -> str:
+    """Option holding the poll interval of a record family."""
+    return "interval_" + function.name.lower()
+
+
+def record_intervals(options) -> dict[HeatPumpFunction, float | None]:
+    """RECORD_INTERVALS updated by the intervals in options."""
+    return {
+        function: None
+        if interval is None
+        else float(options.get(interval_option(function), interval))
+        for function, interval in RECORD_INTERVALS.items()
+    }
+
+
+async def async_open_history(hass: HomeAssistant, path=None) -> HeatpumpHistory:
+    """Create a history, mapped to files starting with path if given."""
+    # mapping the history files blocks
+    return await hass.async_add_executor_job(
+        HeatpumpHistory,
+        history_fields(POLL_FUNCTIONS),
+        HISTORY_ROWS,
+        HISTORY_ROLLUPS,
+        path,
+    )
+
+
+class HeatpumpCoordinator(DataUpdateCoordinator[HeatpumpSnapshot]):
+    """Poll the heatpump once per interval and push the result to all entities.
+
+    Listeners are only called for a new snapshot or when the set of stale
+    families changed, a poll without changed values does not touch any
+    entity.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        host,
+        port,
+        pipelined=True,
+        adaptive=True,
+        title=DEFAULT_NAME,
+        history=None,
+        deadbands=None,
+        capture=None,
+        controller_id=None,
+        unique_id_prefix=None,
+        mode_writes=False,
+    ) -> None:
+        """Init coordinator and its engine, history records every poll."""
+        engine = async_heatpump_engine(
+            pipelined,
+            adaptive,
+            history=history,
+            deadbands=deadbands,
+            capture=capture,
+            mode_writes=mode_writes,
+        )
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {host}:{port}",
+            # the scheduler decides which functions a tick polls
+            update_interval=timedelta(seconds=engine.scheduler.tick),
+            always_update=False,
+        )
+        self.host = host
+        self.port = port
+        self.engine = engine
+        self.capture = capture
+        self.proxy = None
+        # record families not received for STALE_INTERVALS intervals
+        self.stale = frozenset()
+        self.title = title
+        # the controller is known by its host:port, that of a config entry by
+        # the host:port it was created with; unique ids of its entities start
+        # with unique_id_prefix, by default the controller id
+        self.controller_id = controller_id or f"{host}:{port}"
+        self.unique_id_prefix = unique_id_prefix or self.controller_id
+        # called when mode writes are switched, adds or removes the selects
+        self.mode_writes_listener = None
+
+    def apply_options(self, options) -> None:
+        """Apply host, port, intervals and timeouts to the running engine.
+
+        A new peer is connected on the next poll, the decoded state, the
+        history and the statistics are kept; switching mode writes adds or
+        removes the mode selects.
+        """
+        engine = self.engine
+        self.host = options.get(CONF_HOST, self.host)
+        self.port = int(options.get(CONF_PORT, self.port))
+        engine.pipelined = bool(options.get(CONF_PIPELINED, True))
+        engine.pipeline_drops = 0
+        engine.strict_until = None
+        engine.scheduler.adaptive = bool(options.get(CONF_ADAPTIVE, True))
+        engine.scheduler.set_intervals(record_intervals(options))
+        engine.read_timeout = float(options.get(CONF_READ_TIMEOUT, READ_TIMEOUT))
+        mode_writes = bool(options.get(CONF_MODE_WRITES, False))
+        if mode_writes != engine.mode_writes:
+            engine.mode_writes = mode_writes
+            if self.mode_writes_listener is not None:
+                self.mode_writes_listener()
+        engine.connection.connect_timeout = float(
+            options.get(CONF_CONNECT_TIMEOUT, CONNECT_TIMEOUT)
+        )
+        self.update_interval = timedelta(seconds=engine.scheduler.tick)
+
+    async def async_set_proxy(self, port) -> None:
+        """Serve the ser2net session to local clients on port, 0 stops it."""
+        proxy = self.proxy
+        if proxy is not None:
+            if port and proxy.listen_port == port:
+                proxy.host = self.host
+                proxy.port = self.port
+                return
+            self.proxy = None
+            await proxy.stop()
+        if port:
+            self.proxy = await Ser2NetProxy(self.engine, self.host, self.port).start(
+                PROXY_HOST, port
+            )
+
+    async def _async_update_data(self) -> HeatpumpSnapshot:
+        """Fetch new state data from the heatpump.
+
+        A failed poll only fails the update before anything was received,
+        later the last snapshot is served and the entities of the families
+        that went stale become unavailable.
+        """
+        engine = self.engine
+        if await engine.async_poll_for_stats(self.host, self.port) != 0:
+            if engine.snapshot.seq == 0:
+                raise UpdateFailed(f"Polling {self.host}:{self.port} failed")
+            _LOGGER.debug(
+                "Polling %s:%s failed, serving the last snapshot", self.host, self.port
+            )
+        stale = engine.stale_functions()
+        if stale != self.stale:
+            self.stale = stale
+            if engine.snapshot is self.data:
+                # listeners are only called for a new snapshot
+                self.async_update_listeners()
+        return engine.snapshot
+
+    async def async_set_mode(
+        self, function: HeatPumpFunction, mode: HeatPumpMode
+    ) -> None:
+        """Set a mode ahead of the next poll and push the read back state."""
+        if not self.engine.mode_writes:
+            raise HomeAssistantError(
+                f"Mode writes to {self.host}:{self.port} are disabled"
+            )
+        if not await self.engine.async_set_mode(self.host, self.port, function, mode):
+            raise HomeAssistantError(
+                f"{self.host}:{self.port} did not take {function.name} mode {mode.name}"
+            )
+        self.async_set_updated_data(self.engine.snapshot)
+
+    async def async_shutdown(self) -> None:
+        """Stop polling and close the ser2net connection."""
+        await super().async_shutdown()
+        await self.async_set_proxy(0)
+        await self.engine.disconnect()
+        if self.engine.history is not None:
+            await self.hass.async_add_executor_job(self.engine.history.close)
+        if self.capture is not None:
+            await self.hass.async_add_executor_job(self.capture.close)
@@ -0,0 +1,68 @@
+"""Base entity fed by the heatpump snapshots."""
+
+from __future__ import annotations
+
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .coordinator import HeatpumpCoordinator
+from .snapshot import FIELD_FAMILIES
+
+
+class HeatpumpEntity(CoordinatorEntity[HeatpumpCoordinator]):
+    """Entity showing one field of the controller snapshot.
+
+    The state is only written when the field differs from the value written
+    last or the availability changed. Snapshots published between two
+    coordinator updates, e.g. after a command or a proxy fetch, are covered
+    as well. A field is unavailable while its record family is stale.
+    """
+
+    def __init__(
+        self, coordinator: HeatpumpCoordinator, attr, name, unique_id=None
+    ) -> None:
+        """Init entity."""
+        super().__init__(coordinator)
+        self.engine_attr = attr
+        self._attr_name = coordinator.title + " " + name
+        self._attr_unique_id = (
+            coordinator.unique_id_prefix + ":" + (unique_id or attr)
+        )
+        self.written_available = None
+        self.update_from_snapshot()
+        self.written_value = self.snapshot_value()
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to the coordinator, the initial state is written on add."""
+        await super().async_added_to_hass()
+        self.written_available = self.available
+
+    @property
+    def available(self) -> bool:
+        """Return True while the record of the field is current."""
+        return (
+            super().available
+            and FIELD_FAMILIES.get(self.engine_attr) not in self.coordinator.stale
+        )
+
+    def snapshot_value(self):
+        """Return the field value of the latest snapshot."""
+        if self.coordinator.data is None:
+            return None
+        return self.coordinator.data.get(self.engine_attr)
+
+    def update_from_snapshot(self) -> None:
+        """Take over the field value of the latest snapshot."""
+        raise NotImplementedError
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state if the field or the availability changed."""
+        available = self.available
+        value = self.snapshot_value()
+        if available == self.written_available and value == self.written_value:
+            return
+        self.written_available = available
+        self.written_value = value
+        self.update_from_snapshot()
+        self.async_write_ha_state()
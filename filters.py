@@ -0,0 +1,109 @@
+"""Deadband filtering of the published values."""
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+if __package__:
+    from .const import MAX_SILENCE, TEMP_DEADBAND, TEMP_HYSTERESIS, HeatPumpFunction
+    from .protocol import record_fields
+    from .snapshot import FIELD_FAMILIES
+else:
+    from const import MAX_SILENCE, TEMP_DEADBAND, TEMP_HYSTERESIS, HeatPumpFunction
+    from protocol import record_fields
+    from snapshot import FIELD_FAMILIES
+
+# tolerance for the binary representation of 0.1 steps
+_EPSILON = 1e-9
+
+
+class Deadband(NamedTuple):
+    """Change filter of a numeric field.
+
+    A new value is published when it differs from the published one by at
+    least deadband, when it turns back against the last published change
+    by at least deadband + hysteresis. After max_silence seconds without a
+    published change the current value is published anyway.
+    """
+
+    deadband: float
+    hysteresis: float = 0.0
+    max_silence: float | None = None
+
+
+def default_deadbands() -> dict[str, Deadband]:
+    """Deadbands of all temperatures, other fields are published unfiltered."""
+    return {
+        field.attr: Deadband(TEMP_DEADBAND, TEMP_HYSTERESIS, MAX_SILENCE)
+        for field in record_fields(HeatPumpFunction.TEMPERATURE)
+    }
+
+
+def deadbands_from_config(options) -> dict[str, Deadband]:
+    """Merge the configured deadbands into the default ones.
+
+    options maps field attributes to a deadband or to a dict with deadband,
+    hysteresis and max_silence, a deadband of 0 removes the default one.
+    """
+    deadbands = default_deadbands()
+    for attr, option in (options or {}).items():
+        if not isinstance(option, dict):
+            option = {"deadband": option}
+        band = Deadband(
+            float(option.get("deadband", 0)),
+            float(option.get("hysteresis", 0)),
+            option.get("max_silence", MAX_SILENCE),
+        )
+        if band.deadband or band.hysteresis:
+            deadbands[attr] = band
+        else:
+            deadbands.pop(attr, None)
+    return deadbands
+
+
+class ChangeFilter:
+    """Hold back insignificant changes of the fields with a deadband."""
+
+    def __init__(self, deadbands: dict[str, Deadband]) -> None:
+        """Init filter, deadbands maps field attributes to their Deadband."""
+        self.deadbands = deadbands
+        # attr: [published value, time it was published, direction]
+        self.state: dict[str, list] = {}
+        self.suppressed = 0
+
+    def apply(self, records, now):
+        """Return records with insignificant changes replaced by the published values.
+
+        records maps the families to their records, families without held
+        back changes keep their record.
+        """
+        state = self.state
+        held = {}
+        for attr, band in self.deadbands.items():
+            family = FIELD_FAMILIES.get(attr)
+            record = records.get(family)
+            if record is None:
+                continue
+            value = getattr(record, attr)
+            published = state.get(attr)
+            if published is None or value is None or published[0] is None:
+                state[attr] = [value, now, 0]
+                continue
+            delta = value - published[0]
+            if delta == 0:
+                continue
+            step = band.deadband
+            if published[2] and (delta > 0) != (published[2] > 0):
+                step += band.hysteresis
+            if abs(delta) + _EPSILON >= step or (
+                band.max_silence is not None and now - published[1] >= band.max_silence
+            ):
+                state[attr] = [value, now, 1 if delta > 0 else -1]
+            else:
+                held.setdefault(family, {})[attr] = published[0]
+                self.suppressed += 1
+        if held:
+            records = dict(records)
+            for family, values in held.items():
+                records[family] = records[family]._replace(**values)
+        return records
@@ -1,199 +1,686 @@
 """Heatpump engine module."""
 
+from __future__ import annotations
+
+import asyncio
+from collections import deque
 from datetime import datetime
-from enum import IntEnum
-import re
-import socket
+import logging
+import sys
+import threading
 import time
 
-if __name__ != "__main__":
-    from .const import POLL_INTERVAL, HeatPumpType
+if __package__:
+    from .analytics import EMPTY_DERIVED, DerivedMetrics
+    from .const import (
+        COMMAND_RETRIES,
+        MODE_WRITE_CODES,
+        PIPELINE_MAX_DROPS,
+        PIPELINE_RETRY,
+        POLL_INTERVAL,
+        READ_SIZE,
+        READ_TIMEOUT,
+        STALE_INTERVALS,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+    from .protocol import (
+        RECORD_FAMILIES,
+        RECORD_LAYOUTS,
+        LineDecoder,
+        decode_record,
+        last_record_code,
+        record_fields,
+    )
+    from .connection import Ser2NetConnection
+    from .filters import ChangeFilter, default_deadbands
+    from .metrics import REGISTRY
+    from .scheduler import PollScheduler
+    from .snapshot import EMPTY_SNAPSHOT, FIELD_FAMILIES, RECORD_TYPES, flatten
 else:
-    from const import POLL_INTERVAL, HeatPumpType
-
-
-class HeatPumpMode(IntEnum):
-    """Heatpump mode."""
-
-    AUTO = 0
-    ZWE = 1
-    PARTY = 2
-    VACATION = 3
-    OFF = 4
-    UNKNOWN = 5
-
-
-class HeatPumpFunction(IntEnum):
-    """Heatpump functions."""
-
-    UNIQUE_ID = 0
-    TEMPERATURE = 1100
-    HEAT_CIRC = 3405
-    HOT_WATER = 3505
-    GEN_STATUS = 1700
-    UNKNOWN = -1
-
-
-class HeatPumpGenStatus(IntEnum):
-    """General heatpump status."""
-
-    HEATING = 0
-    HOT_WATER = 1
-    EVU_LOCK = 3  # external lock to stop heat pump electric power consumptions under certain conditions e.g. grit usage, price
-    DEFROST = 4
-    IDLE = 5
-    HEATING_EXT_SOURCE = 6
-    COOLING = 7
-    UNKNOWN = -1
-
-
-class heatpump_engine:
-    """Engine talking to the heatpump over ser2net."""
-
-    def __init__(self) -> None:
-        """Init heatpump connection."""
-        self.heating_circuit_flow_temp = None
-        self.heating_circuit_return_flow_temp_actual = None
-        self.heating_circuit_return_flow_temp_setpoint = None
-        self.domestic_hot_water_temp_setpoint = None
-        self.domestic_hot_water_temp_actual = None
-        self.outdoor_temp = None
+    from analytics import EMPTY_DERIVED, DerivedMetrics
+    from const import (
+        COMMAND_RETRIES,
+        MODE_WRITE_CODES,
+        PIPELINE_MAX_DROPS,
+        PIPELINE_RETRY,
+        POLL_INTERVAL,
+        READ_SIZE,
+        READ_TIMEOUT,
+        STALE_INTERVALS,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+    from protocol import (
+        RECORD_FAMILIES,
+        RECORD_LAYOUTS,
+        LineDecoder,
+        decode_record,
+        last_record_code,
+        record_fields,
+    )
+    from connection import Ser2NetConnection
+    from filters import ChangeFilter, default_deadbands
+    from metrics import REGISTRY
+    from scheduler import PollScheduler
+    from snapshot import EMPTY_SNAPSHOT, FIELD_FAMILIES, RECORD_TYPES, flatten
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# record families decoded by the engine
+POLL_FUNCTIONS = (
+    HeatPumpFunction.TEMPERATURE,
+    HeatPumpFunction.INPUTS,
+    HeatPumpFunction.OUTPUTS,
+    HeatPumpFunction.HOT_WATER,
+    HeatPumpFunction.HEAT_CIRC,
+    HeatPumpFunction.GEN_STATUS,
+    HeatPumpFunction.RUNTIMES,
+    HeatPumpFunction.FAULTS,
+    HeatPumpFunction.SHUTDOWNS,
+)
+
+# fields differing on every fetch, left out when the scheduler asks whether a
+# record changed, the controller clock would keep GEN_STATUS from backing off
+CLOCK_FIELDS = {HeatPumpFunction.GEN_STATUS: {"main_sys_uptime": None}}
+
+# values of the fields the controller did not send yet
+INITIAL_VALUES = {
+    "heat_circ_mode": HeatPumpMode.UNKNOWN,
+    "hot_water_mode": HeatPumpMode.UNKNOWN,
+    "main_wp_type": HeatPumpType.UNKNOWN,
+    "main_sw_status": "unknown",
+    "main_biv_level": -1,
+    "main_status": HeatPumpGenStatus.UNKNOWN,
+    "main_sys_uptime": datetime.fromisoformat("2000-01-01T00:05:23"),
+    "main_compact": -1,
+    "main_comfort": -1,
+    "mac_id": "-",
+}
+
+
+def initial_records():
+    """Return the records of all families before the first poll."""
+    records = {
+        function: RECORD_TYPES[function]()
+        for function in (HeatPumpFunction.UNIQUE_ID, *POLL_FUNCTIONS)
+    }
+    for attr, value in INITIAL_VALUES.items():
+        family = FIELD_FAMILIES[attr]
+        records[family] = records[family]._replace(**{attr: value})
+    return records
+
+
+class async_heatpump_engine:
+    """Engine talking to the heatpump over ser2net with asyncio streams."""
+
+    def __init__(
+        self,
+        pipelined=True,
+        adaptive=True,
+        intervals=None,
+        registry=REGISTRY,
+        history=None,
+        deadbands=None,
+        connection=None,
+        capture=None,
+        mode_writes=False,
+    ) -> None:
+        """Init heatpump connection, intervals overrides RECORD_INTERVALS.
+
+        A HeatpumpHistory passed as history records every poll. deadbands maps
+        field attributes to their Deadband, by default the temperatures have
+        one, {} publishes every change. connection replaces the ser2net
+        connection, e.g. by a ReplayConnection, a FrameCapture passed as
+        capture logs the exchanged bytes. Modes are only written with
+        mode_writes, the write codes are not confirmed on hardware.
+        """
+        self.pipelined = pipelined
+        self.pipeline_drops = 0
+        # loop time pipelining is tried again after falling back to strict mode
+        self.strict_until = None
+        self.read_timeout = READ_TIMEOUT
+        # the last read of replies ended with the line idle for read_timeout
+        self.line_idle = False
+        # frozen record per family, replaced as a whole once the reply of the
+        # family was parsed, readers never see a half updated family
+        self.records = initial_records()
+        # epoch time the record of each family was last received in full
+        self.record_times = {}
+        # received lines are decoded as they arrive, a partial line and the
+        # records of a partial reply wait for the rest, also across polls
+        self.decoder = LineDecoder()
+        self.pending = {}
+        # last valid line of every record code as received, for the proxy
+        self.raw_lines = {}
+        self.scheduler = PollScheduler(intervals, adaptive)
         self.polls = 0
         self.polls_skipped = 0
         self.epoch_time = int(time.time())
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.snapshot = EMPTY_SNAPSHOT
+        # compressor cycles, defrosts and delta T, updated with every snapshot
+        self.analytics = DerivedMetrics()
+        self.derived = EMPTY_DERIVED
+        self.history = history
+        self.change_filter = ChangeFilter(
+            default_deadbands() if deadbands is None else deadbands
+        )
+        # ser2net only sends the banner carrying uid= on connect
+        if connection is None:
+            connection = Ser2NetConnection()
+        connection.on_connect = self.on_connect
+        self.connection = connection
+        if capture is not None:
+            connection.capture = capture
+        # polls and commands take turns on the serial line, queued commands
+        # go before the next poll
+        self.bus = asyncio.Lock()
+        self.commands = deque()
+        self.mode_writes = mode_writes
+        # the controller echoes a write, the echo is no garbage
+        self.write_echo = None
+        # single flight, callers arriving during a poll share its result
+        self.poll_task = None
+        self.poll_peer = None
+        self.polls_coalesced = 0
         self.host = None
         self.port = None
-        self.heat_circ_mode = HeatPumpMode.UNKNOWN
-        self.hot_water_mode = HeatPumpMode.UNKNOWN
-        # gen status record
-        self.main_wp_type = HeatPumpType.UNKNOWN
-        self.main_sw_status = "unknown"
-        self.main_biv_level = -1
-        self.main_status = HeatPumpGenStatus.UNKNOWN
-        # self.datetime.datetime(2011, 11, 4, 0, 5, 23)
-        self.main_sys_uptime = datetime.fromisoformat("2000-01-01T00:05:23")
-        self.main_compact = -1
-        self.main_comfort = -1
-        self.mac_id = "-"
+        # phase timers and error counters, labelled with the controller
+        self.registry = registry
+        self.timers = {}
+        self.errors = {}
+
+    def __getattr__(self, name):
+        """Return a field of the current records, e.g. engine.outdoor_temp."""
+        family = FIELD_FAMILIES.get(name)
+        if family is None:
+            raise AttributeError(name)
+        return getattr(self.records[family], name)
+
+    def on_connect(self):
+        """Start a new session, the rest of a partial line will not come."""
+        self.scheduler.reset_connection()
+        self.decoder.reset()
+        self.pending.clear()
 
     def align_peer(self, host, port):
         """Update host and port information."""
         if port != self.port or host != self.host:
             self.host = host
             self.port = port
-
-    def maintain_socket(self, host, port):
-        """Check and repair socket."""
-
-        if self.is_socket_closed(self.sock) or port != self.port or host != self.host:
-            self.align_peer(host, port)
-            self.sock.close()
-            self.sock = None
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.settimeout(0.1)
-            if self.connect() == -1:
-                return -1
-        return 0
-
-    def poll_for_stats(self, host, port):
-        """Poll sensor data."""
-
-        new_time = int(time.time())
-        if new_time - self.epoch_time > POLL_INTERVAL or self.polls == 0:
-            if self.maintain_socket(host, port) == 0:
-                self.readlines(HeatPumpFunction.UNIQUE_ID)
-                if self.trigger_stats(HeatPumpFunction.TEMPERATURE) != 0:
-                    return -1
-                self.readlines(HeatPumpFunction.TEMPERATURE)
-
-                if self.trigger_stats(HeatPumpFunction.HOT_WATER) != 0:
-                    return -1
-                self.readlines(HeatPumpFunction.HOT_WATER)
-
-                if self.trigger_stats(HeatPumpFunction.HEAT_CIRC) != 0:
-                    return -1
-                self.readlines(HeatPumpFunction.HEAT_CIRC)
-
-                if self.trigger_stats(HeatPumpFunction.GEN_STATUS) != 0:
-                    return -1
-                self.readlines(HeatPumpFunction.GEN_STATUS)
-
-                self.epoch_time = new_time
-                self.polls += 1
+            self.timers = {}
+            self.errors = {}
+
+    @property
+    def controller_id(self):
+        """Label of the controller in the metrics."""
+        return f"{self.host}:{self.port}"
+
+    def observe(self, phase, label, seconds):
+        """Account the duration of a phase of function or record label."""
+        timer = self.timers.get((phase, label))
+        if timer is None:
+            timer = self.timers[(phase, label)] = self.registry.timer(
+                phase, controller=self.controller_id, function=label
+            )
+        timer.observe(seconds)
+
+    def count_error(self, kind, label):
+        """Count an error of function label."""
+        counter = self.errors.get((kind, label))
+        if counter is None:
+            counter = self.errors[(kind, label)] = self.registry.counter(
+                "errors", controller=self.controller_id, function=label, kind=kind
+            )
+        counter.inc()
+
+    def metrics_report(self):
+        """Return {phase: {function: timer stats}} and {"errors": {kind: count}}."""
+        report = {}
+        for name, labels, value in self.registry.collect(
+            controller=self.controller_id
+        ):
+            if name == "errors":
+                errors = report.setdefault("errors", {})
+                errors[labels["kind"]] = errors.get(labels["kind"], 0) + value
+            else:
+                report.setdefault(name, {})[labels["function"]] = value
+        return report
+
+    async def maintain_connection(self, host, port):
+        """Keep the ser2net session open, reopening a dead one with backoff."""
+
+        self.align_peer(host, port)
+        await self.connection.set_peer(host, port)
+        connection = self.connection
+        connects = connection.connects
+        failures = connection.connect_failures
+        result = await connection.ensure_connected()
+        if connection.connects != connects:
+            self.observe("connect", "session", connection.last_connect_duration)
+        elif connection.connect_failures != failures:
+            self.count_error("connect", "session")
+        return result
+
+    async def async_poll_for_stats(self, host, port):
+        """Poll the functions due in the scheduler, after queued commands.
+
+        Concurrent callers for the same peer wait for the poll in flight
+        instead of starting another one. A cancelled caller does not cancel
+        the poll the others wait for.
+        """
+        task = self.poll_task
+        if task is None or self.poll_peer != (host, port):
+            task = asyncio.ensure_future(self.locked_poll(host, port))
+            self.poll_task = task
+            self.poll_peer = (host, port)
+            task.add_done_callback(self.poll_done)
         else:
-            self.polls_skipped += 1
-
-        return None
-
-    def is_socket_closed(self, sock: socket.socket) -> bool:
-        """Check socket closed state."""
-        sock.settimeout(0.1)
-        try:
-            # this will try to read bytes without blocking and also without removing them from buffer (peek only)
-            data = sock.recv(16, socket.MSG_DONTWAIT | socket.MSG_PEEK)
-            if len(data) == 0:
-                return False
-        except BlockingIOError:
-            return True  # socket is open and reading from it would block
-        except ConnectionResetError:
-            return True  # socket was closed for some other reason
-        except Exception:  # noqa: BLE001
-            return True  # socket was closed for some other reason
-        return True
-
-    def connect(self):
-        """Connect to ser2net socket."""
-        try:
-            self.sock.connect((self.host, self.port))
-        except TimeoutError:
-            print("oops timeout")
-            return -1
-        except ConnectionAbortedError:
-            print("oops abortr")
+            self.polls_coalesced += 1
+        return await asyncio.shield(task)
+
+    def poll_done(self, task):
+        """Let the next caller start a new poll."""
+        if self.poll_task is task:
+            self.poll_task = None
+
+    async def locked_poll(self, host, port):
+        """Run queued commands and a poll, they take turns on the bus."""
+        async with self.bus:
+            if self.commands:
+                await self.run_commands(host, port)
+            return await self.poll(host, port)
+
+    async def async_fetch(self, host, port, functions):
+        """Fetch functions now, whether they are due or not.
+
+        Waits for its turn on the bus like a poll and accounts the replies in
+        the scheduler. Returns the loop time each complete reply arrived at.
+        Only record families can be requested, the unique id comes with the
+        ser2net banner on connect.
+        """
+        functions = [function for function in functions if function in RECORD_LAYOUTS]
+        if not functions:
+            return {}
+        async with self.bus:
+            if self.commands:
+                await self.run_commands(host, port)
+            if await self.maintain_connection(host, port) != 0:
+                return {}
+            now = asyncio.get_running_loop().time()
+            before = {function: self.record_values(function) for function in functions}
+            if self.pipelined:
+                completed = await self.poll_pipelined(functions)
+            else:
+                completed = {}
+                for function in functions:
+                    if await self.trigger_stats(function) != 0:
+                        break
+                    completed.update(
+                        await self.read_frames((function,), function.name.lower())
+                    )
+            for function in functions:
+                if function in completed:
+                    self.scheduler.done(
+                        function, now, self.record_values(function) != before[function]
+                    )
+                else:
+                    self.count_error("timeout", function.name.lower())
+                    self.scheduler.failed(function, now)
+            if completed:
+                self.publish()
+            return completed
+
+    async def async_set_mode(self, host, port, function, mode):
+        """Set the HeatPumpMode of HEAT_CIRC or HOT_WATER.
+
+        The command is queued ahead of the next poll. Returns True once the
+        mode was read back from the controller, False if it was not or mode
+        writes are disabled.
+        """
+        if not self.mode_writes:
+            _LOGGER.warning(
+                "%s:%s ignores %s mode %s, mode writes are disabled",
+                host,
+                port,
+                function.name,
+                mode.name,
+            )
+            return False
+        future = asyncio.get_running_loop().create_future()
+        self.commands.append((function, mode, future))
+        async with self.bus:
+            if self.commands:
+                await self.run_commands(host, port)
+        return await future
+
+    async def run_commands(self, host, port):
+        """Write the queued commands, the bus must be held."""
+        loop = asyncio.get_running_loop()
+        while self.commands:
+            function, mode, future = self.commands.popleft()
+            label = "set_" + function.name.lower()
+            start = loop.time()
+            verified = False
+            for _ in range(1 + COMMAND_RETRIES):
+                if await self.maintain_connection(host, port) != 0:
+                    break
+                verified = await self.write_mode(function, mode)
+                if verified:
+                    break
+            if verified:
+                self.observe("command", label, loop.time() - start)
+                self.scheduler.done(function, loop.time(), True)
+                self.publish()
+            else:
+                self.count_error("command", label)
+            if not future.done():
+                future.set_result(verified)
+
+    async def write_mode(self, function, mode):
+        """Write a mode and request it back, True if the controller took it."""
+        request = f"{MODE_WRITE_CODES[function]};1;{mode.value}"
+        self.write_echo = request.encode("utf-8")
+        request += "\n\r"
+        if await self.connection.write(request.encode("utf-8")) != 0:
+            return False
+        if await self.trigger_stats(function) != 0:
+            return False
+        completed = await self.read_frames((function,), function.name.lower())
+        return function in completed and self.records[function][0] == mode
+
+    async def poll(self, host, port):
+        """Poll the functions due in the scheduler, the bus must be held."""
+
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        if await self.maintain_connection(host, port) != 0:
             return -1
-        except socket.gaierror:
-            print("oops gaierror")
+        now = loop.time()
+        functions = self.scheduler.due(now)
+        if not functions:
+            return 0
+        before = {function: self.record_values(function) for function in functions}
+
+        start = loop.time()
+        if self.strict_until is not None and start >= self.strict_until:
+            # the controller may have been busy, one more drop falls back
+            _LOGGER.info("%s:%s tries pipelining again", self.host, self.port)
+            self.pipelined = True
+            self.strict_until = None
+            self.pipeline_drops = PIPELINE_MAX_DROPS - 1
+        pipeline_missed = ()
+        if self.pipelined and len(functions) > 1:
+            resyncs = self.decoder.resyncs
+            completed = await self.poll_pipelined(functions)
+            missing = [f for f in functions if f not in completed]
+            for function in missing:
+                self.count_error("pipeline_miss", function.name.lower())
+            if not missing:
+                self.pipeline_drops = 0
+            elif (
+                self.line_idle
+                and self.decoder.resyncs == resyncs
+                and 2 * len(missing) >= len(functions)
+            ):
+                # a controller dropping queued commands only answers the first
+                # requests and falls silent, a garbled or lost reply is no
+                # dropped command
+                pipeline_missed = missing
+        else:
+            completed = {}
+            missing = functions
+
+        sent = {}
+        unsent = None
+        for function in missing:
+            sent[function] = loop.time()
+            if function != HeatPumpFunction.UNIQUE_ID:
+                if await self.trigger_stats(function) != 0:
+                    # the session died, the replies received so far count
+                    unsent = function
+                    break
+            completed.update(
+                await self.read_frames((function,), function.name.lower())
+            )
+
+        # replies are serialized on the line, each occupied it since the
+        # previous one completed or since it was requested
+        previous = start
+        for function, complete in sorted(completed.items(), key=lambda i: i[1]):
+            self.observe(
+                "frame", function.name.lower(), complete - sent.get(function, start)
+            )
+            self.scheduler.done(
+                function,
+                now,
+                self.record_values(function) != before[function],
+                complete - max(previous, sent.get(function, start)),
+            )
+            previous = complete
+        # functions not requested before the session died stay due as well
+        for function in missing:
+            if function in sent and function not in completed:
+                if function != unsent:
+                    self.count_error("timeout", function.name.lower())
+                self.scheduler.failed(function, now)
+        if unsent is not None:
+            if completed:
+                self.publish()
             return -1
-        # print("connect ok")
+        # a reply missing from the pipelined poll but answered when requested
+        # alone on the same session is a dropped queued command
+        if any(function in completed for function in pipeline_missed):
+            self.pipeline_dropped(loop.time())
+
+        self.epoch_time = int(time.time())
+        self.polls += 1
+        self.publish()
+        self.observe("poll", "cycle", loop.time() - begin)
         return 0
 
-    def readlines(self, function):
-        """Read answer from ser2net/heatpump."""
-        # print("readlines: " + str(function.name))
-        data = b""
-        self.sock.settimeout(0.5)
-        while True:
+    def pipeline_dropped(self, now):
+        """Account a dropped queued command, fall back to strict mode.
+
+        After PIPELINE_MAX_DROPS in a row the functions are requested one at
+        a time, pipelining is tried again PIPELINE_RETRY seconds later.
+        """
+        self.pipeline_drops += 1
+        if self.pipeline_drops >= PIPELINE_MAX_DROPS:
+            _LOGGER.warning(
+                "%s:%s drops queued commands, using strict mode",
+                self.host,
+                self.port,
+            )
+            self.pipelined = False
+            self.strict_until = now + PIPELINE_RETRY
+
+    def stale_functions(self, now=None):
+        """Families whose record was not received for STALE_INTERVALS intervals.
+
+        Families fetched once per connection are never stale.
+        """
+        if now is None:
+            now = time.time()
+        scheduler = self.scheduler
+        stale = []
+        for function, schedule in scheduler.schedules.items():
+            if schedule.interval is None:
+                continue
+            updated = self.record_times.get(function)
+            limit = STALE_INTERVALS * max(schedule.interval, scheduler.tick)
+            if updated is None or now - updated > limit:
+                stale.append(function)
+        return frozenset(stale)
+
+    def record_values(self, function):
+        """Current record of function, without the fields of CLOCK_FIELDS."""
+        record = self.records[function]
+        clock = CLOCK_FIELDS.get(function)
+        return record if clock is None else record._replace(**clock)
+
+    async def poll_pipelined(self, functions):
+        """Send all requests back to back and demultiplex the replies.
+
+        Returns the loop time each reply that arrived completed at.
+        """
+        requests = [f for f in functions if f != HeatPumpFunction.UNIQUE_ID]
+        if await self.trigger_stats(*requests) != 0:
+            return {}
+        return await self.read_frames(functions, "pipelined")
+
+    async def disconnect(self):
+        """Close the ser2net connection."""
+        await self.connection.close("shutdown")
+
+    async def readlines(self, function):
+        """Read answer from ser2net/heatpump.
+
+        Returns as soon as the reply frame of function is complete, read_timeout
+        only bounds the wait for a missing reply. Returns False for a missing
+        reply.
+        """
+        return function in await self.read_frames((function,))
+
+    async def read_frames(self, functions, label=None):
+        """Read until the reply frames of all functions are complete.
+
+        Every line is parsed as soon as it arrived. Returns the loop time each
+        complete reply frame arrived at. The first byte latency is accounted
+        to label.
+        """
+        loop = asyncio.get_running_loop()
+        # a reply is complete once its last record replaced the family, a
+        # garbled record leaves it missing
+        last_codes = {
+            last_record_code(function): function
+            for function in functions
+            if function != HeatPumpFunction.UNIQUE_ID
+        }
+        wants_uid = HeatPumpFunction.UNIQUE_ID in functions
+        completed = {}
+        received = False
+        begin = loop.time()
+        # a reply is missing once the line was idle for read_timeout, a slow
+        # controller answering one request after the other keeps the read
+        # going, up to read_timeout per function
+        limit = begin + self.read_timeout * max(len(functions), 1)
+        deadline = begin + self.read_timeout
+        self.line_idle = False
+        while len(completed) < len(functions):
+            remaining = min(deadline, limit) - loop.time()
+            if remaining <= 0:
+                self.line_idle = deadline <= limit
+                break
             try:
-                new_data = self.sock.recv(1024)
+                new_data = await asyncio.wait_for(
+                    self.connection.read(READ_SIZE), remaining
+                )
             except TimeoutError:
+                self.line_idle = deadline <= limit
                 break
-            except ConnectionAbortedError:
-                break
-            data += new_data
             if len(new_data) == 0:
+                if label is not None:
+                    self.count_error("disconnect", label)
                 break
+            if not received and label is not None:
+                self.observe("first_byte", label, loop.time() - begin)
+            received = True
+            deadline = loop.time() + self.read_timeout
+            for line in self.decoder.feed(new_data):
+                code = self.parse_received(line)
+                if code == HeatPumpFunction.UNIQUE_ID:
+                    if wants_uid:
+                        completed.setdefault(HeatPumpFunction.UNIQUE_ID, loop.time())
+                    continue
+                function = last_codes.get(code)
+                if (
+                    function is not None
+                    and function not in completed
+                    and function not in self.pending
+                ):
+                    completed[function] = loop.time()
+        return completed
+
+    def parse_received(self, line):
+        """Parse a received line, return its record code.
+
+        The ser2net banner returns UNIQUE_ID, other lines None. Lines that are
+        neither a record, the banner, the echo of a mode write nor empty are
+        discarded and counted as a resync.
+        """
+        parse_start = time.perf_counter()
+        code = self.parse_line(line, self.pending)
+        if code is not None:
+            self.observe("parse", str(code), time.perf_counter() - parse_start)
+            return code
+        if b"uid=" in line:
+            return HeatPumpFunction.UNIQUE_ID
+        if line == self.write_echo:
+            self.write_echo = None
+            return None
+        if line:
+            head = line.partition(b";")[0]
+            if head.isdigit():
+                self.count_error("parse", head.decode("ascii", "replace"))
+            self.count_error("resync", "stream")
+            self.decoder.discard(len(line))
+        return None
 
-        lines = data.split(b"\r\n")
-        for line in lines:
-            if function == HeatPumpFunction.TEMPERATURE:
-                self.extract_temp(line)
-            elif function == HeatPumpFunction.GEN_STATUS:
-                self.extract_gen_status(line, function)
-            elif function == HeatPumpFunction.UNIQUE_ID:
-                self.extract_mac_id(line)
-            else:
-                self.extract_mode(line, function)
+    def parse_line(self, line, pending):
+        """Decode a received record, return its code.
 
-    def trigger_stats(self, function):
-        """Trigger response from heatpump."""
-        buf = "" + str(function.value) + "\n\r"  # temperature stats only
-        # print("trigger_stats: " + str(function.name))
-        try:
-            self.sock.send(buf.encode(encoding="utf-8"))
-        except BrokenPipeError:
+        pending collects the records of the families whose reply is not
+        complete yet, the record of a family is replaced once all its records
+        were decoded. Families left in pending keep their record.
+        """
+        decoded = decode_record(line)
+        if decoded is None:
+            if b"uid=" in line:
+                self.extract_mac_id(line)
+            return None
+        code, values = decoded
+        self.raw_lines[code] = line
+        family = RECORD_FAMILIES[code]
+        parts = pending.setdefault(family, {})
+        parts[code] = values
+        if len(parts) == RECORD_LAYOUTS[family].entries + 1:
+            del pending[family]
+            self.records[family] = self.records[family]._replace(
+                **{attr: value for values in parts.values() for attr, value in values}
+            )
+            self.record_times[family] = time.time()
+        return code
+
+    def reply_frame(self, function):
+        """Return the last reply of function as received, None if incomplete."""
+        lines = [
+            self.raw_lines.get(code)
+            for code in range(function, last_record_code(function) + 1)
+        ]
+        if None in lines:
+            return None
+        return b"\r\n".join(lines) + b"\r\n"
+
+    async def trigger_stats(self, *functions):
+        """Trigger response from heatpump, several requests are sent at once."""
+        buf = "".join(str(function.value) + "\n\r" for function in functions)
+        label = functions[0].name.lower() if len(functions) == 1 else "pipelined"
+        if not self.connection.is_connected():
+            self.count_error("send", label)
             return -1
-        return 0
+        start = time.perf_counter()
+        result = await self.connection.write(buf.encode(encoding="utf-8"))
+        if result != 0:
+            self.count_error("send", label)
+        else:
+            self.observe("send", label, time.perf_counter() - start)
+        return result
 
     def extract_mac_id(self, line):
         """Extract temperature values from response."""
@@ -203,114 +690,25 @@ class heatpump_engine:
 
         try:
             if len(tokens) > 1:
-                self.mac_id = str(tokens[1]).strip()
-            else:
-                return
-        except ValueError:
-            return
-
-    def extract_temp(self, line):
-        """Extract temperature values from response."""
-
-        ser_str = line.decode("utf-8")
-        tokens = ser_str.split(";")
-        try:
-            cat1 = int(tokens[0])
-            if len(tokens) > 1:
-                nr_tokens = int(tokens[1])
+                self.records[HeatPumpFunction.UNIQUE_ID] = RECORD_TYPES[
+                    HeatPumpFunction.UNIQUE_ID
+                ](str(tokens[1]).strip())
+                self.record_times[HeatPumpFunction.UNIQUE_ID] = time.time()
             else:
                 return
         except ValueError:
             return
 
-        if cat1 == 1100 and nr_tokens == 12 and len(tokens) == nr_tokens + 2:
-            # for token in tokens:
-            #    print(token)
-            tokens.pop(0)
-            tokens.pop(0)
-            # print(ser_str)
-            try:
-                self.heating_circuit_flow_temp = float(tokens[0]) / 10.0
-                self.heating_circuit_return_flow_temp_actual = float(tokens[1]) / 10.0
-                self.heating_circuit_return_flow_temp_setpoint = float(tokens[2]) / 10.0
-                self.outdoor_temp = float(tokens[4]) / 10.0
-                self.domestic_hot_water_temp_actual = float(tokens[5]) / 10.0
-                self.domestic_hot_water_temp_setpoint = float(tokens[6]) / 10.0
-            except ValueError:
-                return
-
-    def extract_mode(self, line, function):
-        """Extract temperature values from response."""
-
-        if function in (HeatPumpFunction.HEAT_CIRC, HeatPumpFunction.HOT_WATER):
-            ser_str = line.decode("utf-8")
-            tokens = ser_str.split(";")
-            try:
-                cat1 = int(tokens[0])
-                if len(tokens) > 1:
-                    nr_tokens = int(tokens[1])
-                else:
-                    return -1
-            except ValueError:
-                return -1
-        else:
-            return -1
-
-        if cat1 == function.value and nr_tokens == 1 and len(tokens) == nr_tokens + 2:
-            # for token in tokens:
-            #    print(token)
-            tokens.pop(0)
-            tokens.pop(0)
-            # print(ser_str)
-            if function == HeatPumpFunction.HEAT_CIRC:
-                self.heat_circ_mode = HeatPumpMode(int(tokens[0]))
-            else:
-                self.hot_water_mode = HeatPumpMode(int(tokens[0]))
-        return None
-
-    def extract_gen_status(self, line, function):
-        """Extract general status information from response."""
-
-        # print("extract_gen_status: " + str(function.name) + " START")
-        ser_str = line.decode("utf-8")
-        pattern = r"[,;]"
-        tokens = re.split(pattern, ser_str)
-        # tokens = ser_str.split('[,;]')
-        # print("extract_gen_status: " + str(tokens))
-        # for token in tokens:
-        #    print(token)
-        try:
-            cat1 = int(tokens[0])
-            if len(tokens) > 1:
-                nr_tokens = int(tokens[1])
-            else:
-                return -1
-        except ValueError:
-            return -1
-        # print("extract_gen_status: cat1:" + str(cat1) + " nr_tokens: " + str(nr_tokens))
-        # print(tokens)
-        if cat1 == function.value and nr_tokens == 12 and len(tokens) == nr_tokens + 2:
-            # for token in tokens:
-            #    print(token)
-            tokens.pop(0)
-            tokens.pop(0)
-            # print(ser_str)
-            self.main_wp_type = HeatPumpType(int(tokens[0]))
-            self.main_sw_status = str(tokens[1]).strip()
-            self.main_biv_level = int(tokens[2])
-            self.main_status = HeatPumpGenStatus(int(tokens[3]))
-            self.main_sys_uptime = self.main_sys_uptime.replace(day=int(tokens[4]))
-            self.main_sys_uptime = self.main_sys_uptime.replace(month=int(tokens[5]))
-            self.main_sys_uptime = self.main_sys_uptime.replace(
-                year=2000 + int(tokens[6])
-            )
-            self.main_sys_uptime = self.main_sys_uptime.replace(hour=int(tokens[7]))
-            self.main_sys_uptime = self.main_sys_uptime.replace(minute=int(tokens[8]))
-            self.main_sys_uptime = self.main_sys_uptime.replace(second=int(tokens[9]))
-            self.main_compact = int(tokens[10])
-            self.main_comfort = int(tokens[11])
-        # print("extract_gen_status: " + str(function.name) + " END")
-        return None
+    def publish(self):
+        """Publish the decoded record set as the next snapshot."""
+        records = self.records
+        now = time.time()
+        if self.history is not None:
+            # the history keeps the values as polled
+            self.history.record(flatten(records), now)
+        self.derived = self.analytics.update(records, now)
+        self.snapshot = self.snapshot.next(self.change_filter.apply(records, now), now)
+        return self.snapshot
 
     def print_sensors(self):
         print(
@@ -355,18 +753,93 @@ class heatpump_engine:
         print("System uptime: \t" + str(self.main_sys_uptime))
         print("Compact: \t" + str(self.main_compact))
         print("Comfort: \t" + str(self.main_comfort))
+        for function in (
+            HeatPumpFunction.INPUTS,
+            HeatPumpFunction.OUTPUTS,
+            HeatPumpFunction.RUNTIMES,
+            HeatPumpFunction.FAULTS,
+            HeatPumpFunction.SHUTDOWNS,
+        ):
+            print("")
+            print(function.name.capitalize() + ":")
+            print("=" * (len(function.name) + 1))
+            for field in record_fields(function):
+                if field.name:
+                    print(
+                        "%-40s = %s %s"
+                        % (field.name, getattr(self, field.attr), field.unit)
+                    )
 
         print(
             "=============================================================================="
         )
 
 
-my_heatpump_engine = heatpump_engine()
+async def async_poll_controllers(controllers):
+    """Poll several controllers concurrently.
+
+    controllers holds (engine, host, port) tuples, the results of
+    async_poll_for_stats are returned in the same order. A cycle takes as long
+    as the slowest controller.
+    """
+    return await asyncio.gather(
+        *(engine.async_poll_for_stats(host, port) for engine, host, port in controllers)
+    )
+
+
+class heatpump_engine:
+    """Blocking wrapper around async_heatpump_engine, callable from any thread.
+
+    The engine and its socket belong to an event loop running in a private
+    thread. Concurrent poll_for_stats calls share the poll in flight, the
+    latest snapshot and the fields are read without a lock.
+    """
+
+    def __init__(
+        self, pipelined=True, adaptive=True, intervals=None, poll_interval=None
+    ) -> None:
+        """Init engine and start the thread of its event loop."""
+        self.engine = async_heatpump_engine(pipelined, adaptive, intervals)
+        self.poll_interval = POLL_INTERVAL if poll_interval is None else poll_interval
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="heatpump_engine", daemon=True
+        )
+        self.thread.start()
+
+    def __getattr__(self, name):
+        """Expose the state of the wrapped engine."""
+        return getattr(self.engine, name)
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def poll_for_stats(self, host, port):
+        """Poll sensor data, at most once per poll_interval."""
+
+        engine = self.engine
+        if engine.polls and int(time.time()) - engine.epoch_time < self.poll_interval:
+            engine.polls_skipped += 1
+            return None
+        if self.run(engine.async_poll_for_stats(host, port)) != 0:
+            return -1
+        return None
+
+    def close(self):
+        """Close connection and stop the event loop."""
+        self.run(self.engine.disconnect())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
 
 
 if __name__ == "__main__":
+    # debug view of one controller, poller.py streams snapshots
+    host = sys.argv[1] if len(sys.argv) > 1 else "baba-cafe"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 4322
     conn = heatpump_engine()
     while True:
-        conn.poll_for_stats("baba-cafe", 4322)
+        conn.poll_for_stats(host, port)
         conn.print_sensors()
         time.sleep(4)
@@ -0,0 +1,258 @@
+"""Compact in-memory history of the polled values with rollups."""
+
+from __future__ import annotations
+
+from enum import IntEnum
+import math
+import mmap
+import os
+import struct
+import zlib
+
+if __package__:
+    from .const import HISTORY_ROLLUPS, HISTORY_ROWS
+    from .protocol import flag, record_fields
+else:
+    from const import HISTORY_ROLLUPS, HISTORY_ROWS
+    from protocol import flag, record_fields
+
+# magic, layout checksum, capacity, columns, next row, rows
+_HEADER = struct.Struct("<4sIIIII")
+_MAGIC = b"LUXH"
+_NAN = float("nan")
+
+
+def history_fields(functions):
+    """Attributes of the numeric fields of functions, history entries excluded."""
+    return tuple(
+        field.attr
+        for function in functions
+        for field in record_fields(function)
+        if not field.attr.startswith(("fault_", "shutdown_"))
+        and (
+            field.type in (float, int, flag)
+            or (isinstance(field.type, type) and issubclass(field.type, IntEnum))
+        )
+    )
+
+
+def numeric(value) -> float:
+    """Column value of a field value, nan if unknown."""
+    if value is None:
+        return _NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+class RingBuffer:
+    """Fixed capacity table of float64 columns, column 0 holds the time.
+
+    The columns are views into one buffer: a bytearray, or a file mapped into
+    memory, which keeps the table across restarts. A file written for other
+    columns or another capacity is started over.
+    """
+
+    def __init__(self, columns, capacity, path=None) -> None:
+        """Init ring buffer with the column names, time excluded."""
+        self.columns = ("time", *columns)
+        self.capacity = capacity
+        layout = zlib.crc32(",".join(self.columns).encode("utf-8"))
+        size = _HEADER.size + len(self.columns) * capacity * 8
+        self.file = None
+        if path is None:
+            self.buffer = bytearray(size)
+            fresh = True
+        else:
+            fresh = not os.path.exists(path) or os.path.getsize(path) != size
+            self.file = open(path, "r+b" if not fresh else "w+b")
+            if fresh:
+                self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), size)
+            magic, checksum, *_ = _HEADER.unpack_from(self.buffer)
+            fresh = fresh or magic != _MAGIC or checksum != layout
+        self.view = memoryview(self.buffer)
+        self.data = [
+            self.view[offset : offset + capacity * 8].cast("d")
+            for offset in range(_HEADER.size, size, capacity * 8)
+        ]
+        if fresh:
+            self.head = 0  # next row written
+            self.rows = 0
+            self.layout = layout
+            self.sync()
+        else:
+            _, self.layout, _, _, self.head, self.rows = _HEADER.unpack_from(
+                self.buffer
+            )
+
+    def sync(self):
+        """Write the header, the rows are written in place."""
+        _HEADER.pack_into(
+            self.buffer,
+            0,
+            _MAGIC,
+            self.layout,
+            self.capacity,
+            len(self.columns),
+            self.head,
+            self.rows,
+        )
+
+    def append(self, time, values):
+        """Append a row, overwriting the oldest one when full."""
+        head = self.head
+        self.data[0][head] = time
+        for column, value in zip(self.data[1:], values):
+            column[head] = value
+        self.head = (head + 1) % self.capacity
+        if self.rows < self.capacity:
+            self.rows += 1
+        self.sync()
+
+    def indices(self, since=None, until=None):
+        """Row indices in time order, limited to since <= time < until."""
+        times = self.data[0]
+        start = (self.head - self.rows) % self.capacity
+        for offset in range(self.rows):
+            index = (start + offset) % self.capacity
+            if (since is None or times[index] >= since) and (
+                until is None or times[index] < until
+            ):
+                yield index
+
+    def query(self, columns=None, since=None, until=None):
+        """Return {column: [values]} of the rows in the time range."""
+        names = ("time", *(self.columns[1:] if columns is None else columns))
+        data = [self.data[self.columns.index(name)] for name in names]
+        rows = list(self.indices(since, until))
+        return {
+            name: [None if math.isnan(v) else v for v in (c[i] for i in rows)]
+            for name, c in zip(names, data)
+        }
+
+    def close(self):
+        """Release the buffer, flushing a mapped file."""
+        for column in self.data:
+            column.release()
+        self.view.release()
+        if self.file is not None:
+            self.buffer.flush()
+            self.buffer.close()
+            self.file.close()
+            self.file = None
+
+
+class Rollup:
+    """Min, max and mean of the fields per bucket of resolution seconds."""
+
+    def __init__(self, fields, resolution, capacity, path=None) -> None:
+        """Init rollup."""
+        self.fields = fields
+        self.resolution = resolution
+        self.table = RingBuffer(
+            [f"{attr}_{stat}" for attr in fields for stat in ("min", "max", "mean")],
+            capacity,
+            path,
+        )
+        self.bucket = None  # start time of the open bucket
+        self.reset()
+
+    def reset(self):
+        """Start an empty bucket."""
+        count = len(self.fields)
+        self.low = [math.inf] * count
+        self.high = [-math.inf] * count
+        self.total = [0.0] * count
+        self.count = [0] * count
+
+    def add(self, time, values):
+        """Account a sample, a sample of a new bucket closes the open one."""
+        bucket = time - time % self.resolution
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+        low, high, total, count = self.low, self.high, self.total, self.count
+        for i, value in enumerate(values):
+            if value == value:  # not nan
+                if value < low[i]:
+                    low[i] = value
+                if value > high[i]:
+                    high[i] = value
+                total[i] += value
+                count[i] += 1
+
+    def flush(self):
+        """Store the open bucket."""
+        if self.bucket is None:
+            return
+        row = []
+        for low, high, total, count in zip(
+            self.low, self.high, self.total, self.count
+        ):
+            if count:
+                row.extend((low, high, total / count))
+            else:
+                row.extend((_NAN, _NAN, _NAN))
+        self.table.append(self.bucket, row)
+        self.bucket = None
+        self.reset()
+
+    def query(self, fields, since=None, until=None):
+        """Return {"time": [...], field: {"min": [...], ...}} of the buckets."""
+        columns = [
+            f"{attr}_{stat}" for attr in fields for stat in ("min", "max", "mean")
+        ]
+        rows = self.table.query(columns, since, until)
+        result = {"time": rows["time"]}
+        for attr in fields:
+            result[attr] = {
+                stat: rows[f"{attr}_{stat}"] for stat in ("min", "max", "mean")
+            }
+        return result
+
+
+class HeatpumpHistory:
+    """Raw samples of every poll plus 1 min, 15 min and 1 h rollups.
+
+    With a path, every table is a memory mapped file named <path>-<table>.
+    The bucket open at shutdown is lost.
+    """
+
+    def __init__(
+        self, fields, rows=HISTORY_ROWS, rollups=HISTORY_ROLLUPS, path=None
+    ) -> None:
+        """Init history of the numeric fields."""
+        self.fields = tuple(fields)
+
+        def table_path(name):
+            return None if path is None else f"{path}-{name}"
+
+        self.raw = RingBuffer(self.fields, rows, table_path("raw"))
+        self.rollups = {
+            resolution: Rollup(
+                self.fields, resolution, capacity, table_path(f"{resolution}s")
+            )
+            for resolution, capacity in rollups.items()
+        }
+
+    def record(self, values, time):
+        """Add the {field: value} of a poll at epoch time."""
+        values = [numeric(values.get(attr)) for attr in self.fields]
+        self.raw.append(time, values)
+        for rollup in self.rollups.values():
+            rollup.add(time, values)
+
+    def query(self, fields=None, since=None, until=None, resolution=None):
+        """Return the raw samples or, with a resolution in seconds, its rollup."""
+        fields = [attr for attr in fields or self.fields if attr in self.fields]
+        if resolution is None:
+            return self.raw.query(fields, since, until)
+        return self.rollups[resolution].query(fields, since, until)
+
+    def close(self):
+        """Release the tables."""
+        self.raw.close()
+        for rollup in self.rollups.values():
+            rollup.table.close()
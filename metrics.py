@@ -0,0 +1,99 @@
+"""In-process registry of timing and error metrics."""
+
+from __future__ import annotations
+
+
+class Timer:
+    """Count, total, maximum and last of observed durations in seconds."""
+
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        """Init timer."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds):
+        """Account one duration."""
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def stats(self):
+        """Return the timer values."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "last": self.last,
+        }
+
+
+class Counter:
+    """Monotonic event counter."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        """Init counter."""
+        self.value = 0
+
+    def inc(self, amount=1):
+        """Count events."""
+        self.value += amount
+
+
+class MetricsRegistry:
+    """Timers and counters identified by a name and labels.
+
+    Metrics are created on first use and never locked, lookups belong outside
+    of hot loops: keep the returned Timer or Counter and update it directly.
+    """
+
+    def __init__(self) -> None:
+        """Init registry."""
+        self.metrics: dict[tuple, Timer | Counter] = {}
+
+    def _get(self, kind, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            metric = self.metrics[key] = kind()
+        return metric
+
+    def timer(self, name, **labels) -> Timer:
+        """Return the timer of name and labels."""
+        return self._get(Timer, name, labels)
+
+    def counter(self, name, **labels) -> Counter:
+        """Return the counter of name and labels."""
+        return self._get(Counter, name, labels)
+
+    def collect(self, **match):
+        """Yield (name, labels, value) of the metrics carrying all match labels.
+
+        The value of a timer is its stats(), that of a counter its count.
+        """
+        wanted = match.items()
+        for (name, labels), metric in list(self.metrics.items()):
+            labels = dict(labels)
+            if wanted <= labels.items():
+                if isinstance(metric, Timer):
+                    yield name, labels, metric.stats()
+                else:
+                    yield name, labels, metric.value
+
+    def remove(self, **match):
+        """Forget the metrics carrying all match labels."""
+        wanted = set(match.items())
+        for key in list(self.metrics):
+            if wanted <= set(key[1]):
+                del self.metrics[key]
+
+
+# registry shared by all engines of the process
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,356 @@
+"""Headless poller streaming controller snapshots to files, stdout and HTTP.
+
+Run from the folder holding the integration, e.g.
+``python -m lux_heatpump.poller heatpump:4322 --output lux.ndjson --http
+127.0.0.1:8080`` or
+``python -m lux_heatpump.poller 10.0.0.5 10.0.0.6:4323 --format csv``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import signal
+import sys
+
+if __package__:
+    from .analytics import DERIVED_FIELDS
+    from .const import DEFAULT_PORT
+    from .heatpump_engine import async_heatpump_engine, async_poll_controllers
+    from .snapshot import FIELD_FAMILIES, json_value
+else:
+    from analytics import DERIVED_FIELDS
+    from const import DEFAULT_PORT
+    from heatpump_engine import async_heatpump_engine, async_poll_controllers
+    from snapshot import FIELD_FAMILIES, json_value
+
+_LOGGER = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+BATCH_ROWS = 50  # rows buffered before they are written
+FLUSH_INTERVAL = 10.0  # seconds a buffered row waits at most
+MAX_BYTES = 64 << 20  # file size that starts a new file
+BACKUPS = 5  # rotated files kept as <path>.1 ... <path>.5
+
+# CSV columns after controller, seq and time
+CSV_FIELDS = (*FIELD_FAMILIES, *(field.attr for field in DERIVED_FIELDS))
+
+
+def parse_controller(value):
+    """Return (host, port) of "host[:port]"."""
+    host, sep, port = value.rpartition(":")
+    if not sep:
+        return value, DEFAULT_PORT
+    return host, int(port)
+
+
+def snapshot_row(controller, engine, changed_only=False):
+    """Return the latest snapshot of engine as a JSON compatible dict.
+
+    changed_only limits the values to the fields that changed with it.
+    """
+    snapshot = engine.snapshot
+    attrs = snapshot.changed if changed_only else FIELD_FAMILIES
+    return {
+        "controller": controller,
+        "seq": snapshot.seq,
+        "time": snapshot.time,
+        "values": {attr: json_value(snapshot.get(attr)) for attr in attrs},
+        # epoch time each family was last received, values of a family whose
+        # poll failed are the last known good ones
+        "updated": {
+            function.name.lower(): updated
+            for function, updated in engine.record_times.items()
+        },
+        "derived": {
+            attr: json_value(value)
+            for attr, value in engine.derived._asdict().items()
+        },
+    }
+
+
+class SnapshotWriter:
+    """Buffered writer of snapshot rows as NDJSON or CSV.
+
+    Rows are collected and written in batches of batch_rows, or once the
+    oldest waited flush_interval seconds. A file reaching max_bytes is
+    renamed to <path>.1, older ones move up to <path>.<backups>. Without a
+    path the rows go to stdout.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        fmt="ndjson",
+        batch_rows=BATCH_ROWS,
+        flush_interval=FLUSH_INTERVAL,
+        max_bytes=MAX_BYTES,
+        backups=BACKUPS,
+    ) -> None:
+        """Init writer, the file is opened for appending."""
+        if fmt not in FORMATS:
+            raise ValueError(fmt)
+        self.path = path
+        self.format = fmt
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.rows = []
+        self.first_row_time = None
+        self.file = None
+        self.size = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.open()
+
+    def open(self):
+        """Open the output, a new CSV file starts with its header."""
+        if self.path is None:
+            self.file = sys.stdout
+            self.size = 0
+        else:
+            self.file = open(self.path, "a", encoding="utf-8", newline="")
+            self.size = self.file.tell()
+        if self.format == "csv" and self.size == 0:
+            header = ("controller", "seq", "time", *CSV_FIELDS)
+            self.file.write(self.encode_csv([header]))
+
+    def write(self, row, now):
+        """Buffer a row, at loop time now."""
+        if not self.rows:
+            self.first_row_time = now
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_rows:
+            self.flush()
+
+    def flush_due(self, now):
+        """Flush the buffered rows if the oldest waited long enough."""
+        if self.rows and now - self.first_row_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows in one go."""
+        if not self.rows:
+            return
+        if self.format == "csv":
+            data = self.encode_csv(
+                [
+                    (
+                        row["controller"],
+                        row["seq"],
+                        row["time"],
+                        *(
+                            row["values"].get(attr, row["derived"].get(attr))
+                            for attr in CSV_FIELDS
+                        ),
+                    )
+                    for row in self.rows
+                ]
+            )
+        else:
+            data = "".join(
+                json.dumps(row, separators=(",", ":")) + "\n" for row in self.rows
+            )
+        full = self.size and self.size + len(data) > self.max_bytes
+        if self.path is not None and full:
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        self.rows_written += len(self.rows)
+        self.flushes += 1
+        self.rows = []
+
+    @staticmethod
+    def encode_csv(rows):
+        """Return rows as CSV text."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    def rotate(self):
+        """Move the full file to <path>.1 and start a new one."""
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self.open()
+
+    def close(self):
+        """Write the buffered rows and close the file."""
+        self.flush()
+        if self.path is not None:
+            self.file.close()
+
+    def stats(self):
+        """Return writer statistics."""
+        return {
+            "rows_written": self.rows_written,
+            "rows_buffered": len(self.rows),
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+        }
+
+
+class SnapshotServer:
+    """Local HTTP endpoint serving the latest snapshot of every controller.
+
+    GET / returns all controllers, GET /<host>:<port> one of them. It
+    listens on TCP or on a Unix socket.
+    """
+
+    def __init__(self) -> None:
+        """Init server."""
+        self.latest = {}
+        self.servers = []
+        self.requests = 0
+
+    async def start(self, address=None, path=None):
+        """Listen on "host:port" address and the Unix socket at path."""
+        if address is not None:
+            host, port = parse_controller(address)
+            self.servers.append(await asyncio.start_server(self.handle, host, port))
+        if path is not None:
+            self.servers.append(await asyncio.start_unix_server(self.handle, path))
+        return self
+
+    async def stop(self):
+        """Stop listening."""
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+
+    async def handle(self, reader, writer):
+        """Answer one request and close the connection."""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            method, target, _ = request.split(b" ", 2)
+            target = target.decode("ascii", "replace").strip("/")
+            self.requests += 1
+            if method != b"GET":
+                status, body = "405 Method Not Allowed", {"error": "GET only"}
+            elif not target:
+                status, body = "200 OK", self.latest
+            elif target in self.latest:
+                status, body = "200 OK", self.latest[target]
+            else:
+                status, body = "404 Not Found", {"error": "unknown controller"}
+            data = json.dumps(body).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode(
+                    "ascii"
+                )
+                + data
+            )
+            await writer.drain()
+        except (TimeoutError, ValueError, OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def async_run(args):
+    """Poll the controllers until SIGINT or SIGTERM, stream every snapshot."""
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    controllers = [
+        # the export carries the values as polled, without deadbands
+        (
+            async_heatpump_engine(not args.strict, deadbands={}),
+            *parse_controller(value),
+        )
+        for value in args.controllers
+    ]
+    labels = [f"{host}:{port}" for _, host, port in controllers]
+    published = [None] * len(controllers)
+    writer = SnapshotWriter(
+        args.output,
+        args.format,
+        args.batch,
+        args.flush_interval,
+        args.max_bytes,
+        args.backups,
+    )
+    server = SnapshotServer()
+    await server.start(args.http, args.unix)
+    tick = min(engine.scheduler.tick for engine, _, _ in controllers)
+    try:
+        while not stop.is_set():
+            start = loop.time()
+            results = await async_poll_controllers(controllers)
+            for index, (engine, _, _) in enumerate(controllers):
+                if results[index] != 0:
+                    _LOGGER.warning("Polling %s failed", labels[index])
+                if engine.snapshot is published[index]:
+                    continue
+                published[index] = engine.snapshot
+                row = server.latest[labels[index]] = snapshot_row(labels[index], engine)
+                if args.changed:
+                    row = snapshot_row(labels[index], engine, True)
+                writer.write(row, loop.time())
+            writer.flush_due(loop.time())
+            try:
+                await asyncio.wait_for(stop.wait(), tick - (loop.time() - start))
+            except TimeoutError:
+                pass
+    finally:
+        await server.stop()
+        for engine, _, _ in controllers:
+            await engine.disconnect()
+        writer.close()
+        _LOGGER.info("Stopped, %s", writer.stats())
+
+
+def main(argv=None):
+    """Parse the command line and run the poller."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "controllers", nargs="+", metavar="HOST[:PORT]", help="ser2net peers"
+    )
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--output", help="file to append to, stdout by default")
+    parser.add_argument(
+        "--changed",
+        action="store_true",
+        help="only write the changed fields (ndjson)",
+    )
+    parser.add_argument(
+        "--batch", type=int, default=BATCH_ROWS, help="rows per write"
+    )
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    parser.add_argument("--backups", type=int, default=BACKUPS)
+    parser.add_argument(
+        "--http", metavar="HOST:PORT", help="serve the latest snapshots"
+    )
+    parser.add_argument("--unix", metavar="PATH", help="serve them on a Unix socket")
+    parser.add_argument("--strict", action="store_true", help="disable pipelining")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if args.changed and args.format == "csv":
+        # CSV rows have a cell for every field
+        parser.error("--changed only works with --format ndjson")
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    asyncio.run(async_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Luxtronik v1 record layouts and the table driven record parser."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Callable, Iterable, NamedTuple
+
+if __package__:
+    from .const import (
+        MAX_LINE,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+else:
+    from const import (
+        MAX_LINE,
+        HeatPumpFunction,
+        HeatPumpGenStatus,
+        HeatPumpMode,
+        HeatPumpType,
+    )
+
+
+def text(value: bytes) -> str:
+    """Decode a text field."""
+    return value.decode("utf-8").strip()
+
+
+def flag(value: bytes) -> bool:
+    """Decode an on/off field."""
+    return int(value) != 0
+
+
+def system_time(day, month, year, hour, minute, second) -> datetime:
+    """Build the controller clock from its six fields."""
+    return datetime(
+        2000 + int(year), int(month), int(day), int(hour), int(minute), int(second)
+    )
+
+
+def entry_time(day, month, year, hour, minute) -> datetime:
+    """Build the time stamp of a history entry."""
+    return datetime(2000 + int(year), int(month), int(day), int(hour), int(minute))
+
+
+class Field(NamedTuple):
+    """Field of a record.
+
+    index is the position after the "<code>;<count>" header, a tuple of
+    positions hands several fields to one type. The raw value is divided by
+    scale. Fields with a name are shown as sensors.
+    """
+
+    index: int | tuple[int, ...]
+    scale: int
+    type: Callable[..., Any]
+    attr: str
+    name: str = ""
+    unit: str = ""
+
+
+class RecordLayout(NamedTuple):
+    """Layout of a "<code>;<count>;<field>;..." record.
+
+    History records only send a "<code>;<entries>" header, followed by one
+    record per entry numbered <code>+1 ... <code>+entries.
+    """
+
+    count: int
+    fields: tuple[Field, ...]
+    comma: bool = False  # fields are also separated by ","
+    entries: int = 0
+
+
+def _temp(index, attr, name):
+    """Temperature field in 0.1 degC."""
+    return Field(index, 10, float, attr, name, "°C")
+
+
+def _runtime(index, attr, name):
+    """Runtime field in seconds."""
+    return Field(index, 1, int, attr, name, "s")
+
+
+def _history(function: HeatPumpFunction, prefix, name, entries=5):
+    """Layouts of a history record and its entries, entry 1 is the latest."""
+    layouts = {function: RecordLayout(entries, (), entries=entries)}
+    for entry in range(1, entries + 1):
+        layouts[function + entry] = RecordLayout(
+            6,
+            (
+                Field(
+                    0,
+                    1,
+                    int,
+                    f"{prefix}_{entry}_code",
+                    name + " code" if entry == 1 else "",
+                ),
+                Field(
+                    (1, 2, 3, 4, 5),
+                    1,
+                    entry_time,
+                    f"{prefix}_{entry}_time",
+                    name + " time" if entry == 1 else "",
+                ),
+            ),
+        )
+    return layouts
+
+
+RECORD_LAYOUTS: dict[int, RecordLayout] = {
+    HeatPumpFunction.TEMPERATURE: RecordLayout(
+        12,
+        (
+            _temp(0, "heating_circuit_flow_temp", "heating circuit flow temperature"),
+            _temp(
+                1,
+                "heating_circuit_return_flow_temp_actual",
+                "heating circuit return flow temperature (actual)",
+            ),
+            _temp(
+                2,
+                "heating_circuit_return_flow_temp_setpoint",
+                "heating circuit return flow temperature (setpoint)",
+            ),
+            _temp(3, "hot_gas_temp", "hot gas temperature"),
+            _temp(4, "outdoor_temp", "Outdoor temperature"),
+            _temp(
+                5, "domestic_hot_water_temp_actual", "hot water temperature (actual)"
+            ),
+            _temp(
+                6,
+                "domestic_hot_water_temp_setpoint",
+                "hot water temperature (setpoint)",
+            ),
+            _temp(7, "heat_source_inlet_temp", "heat source inlet temperature"),
+            _temp(8, "heat_source_outlet_temp", "heat source outlet temperature"),
+            _temp(9, "mixer_circuit_flow_temp", "mixer circuit flow temperature"),
+            _temp(
+                10,
+                "mixer_circuit_flow_temp_setpoint",
+                "mixer circuit flow temperature (setpoint)",
+            ),
+            _temp(11, "remote_room_temp", "room temperature (remote control)"),
+        ),
+    ),
+    HeatPumpFunction.INPUTS: RecordLayout(
+        6,
+        (
+            Field(0, 1, flag, "input_defrost_brine_flow", "defrost/brine/flow switch"),
+            Field(1, 1, flag, "input_utility_lock", "utility lock (EVU)"),
+            Field(2, 1, flag, "input_high_pressure", "high pressure switch"),
+            Field(3, 1, flag, "input_motor_protection", "motor protection"),
+            Field(4, 1, flag, "input_low_pressure", "low pressure switch"),
+            Field(5, 1, flag, "input_ext_anode", "external current anode"),
+        ),
+    ),
+    HeatPumpFunction.OUTPUTS: RecordLayout(
+        13,
+        (
+            Field(0, 1, flag, "output_defrost_valve", "defrost valve"),
+            Field(1, 1, flag, "output_hot_water_pump", "hot water pump"),
+            Field(2, 1, flag, "output_floor_heating_pump", "floor heating pump"),
+            Field(3, 1, flag, "output_heating_pump", "heating pump"),
+            Field(4, 1, flag, "output_mixer_open", "mixer open"),
+            Field(5, 1, flag, "output_mixer_close", "mixer close"),
+            Field(6, 1, flag, "output_ventilation", "ventilation"),
+            Field(7, 1, flag, "output_brine_pump", "brine/well pump"),
+            Field(8, 1, flag, "output_compressor1", "compressor 1"),
+            Field(9, 1, flag, "output_compressor2", "compressor 2"),
+            Field(10, 1, flag, "output_circulation_pump", "circulation pump"),
+            Field(11, 1, flag, "output_aux_pump", "auxiliary circulation pump"),
+            Field(
+                12, 1, flag, "output_second_heat_generator", "second heat generator"
+            ),
+        ),
+    ),
+    HeatPumpFunction.RUNTIMES: RecordLayout(
+        9,
+        (
+            _runtime(0, "compressor1_runtime", "compressor 1 runtime"),
+            Field(1, 1, int, "compressor1_starts", "compressor 1 starts"),
+            _runtime(2, "compressor1_avg_runtime", "compressor 1 average runtime"),
+            _runtime(3, "compressor2_runtime", "compressor 2 runtime"),
+            Field(4, 1, int, "compressor2_starts", "compressor 2 starts"),
+            _runtime(5, "compressor2_avg_runtime", "compressor 2 average runtime"),
+            _runtime(6, "heat_generator1_runtime", "second heat generator 1 runtime"),
+            _runtime(7, "heat_generator2_runtime", "second heat generator 2 runtime"),
+            _runtime(8, "heatpump_runtime", "heat pump runtime"),
+        ),
+    ),
+    **_history(HeatPumpFunction.FAULTS, "fault", "last fault"),
+    **_history(HeatPumpFunction.SHUTDOWNS, "shutdown", "last shutdown"),
+    HeatPumpFunction.HEAT_CIRC: RecordLayout(
+        1, (Field(0, 1, HeatPumpMode, "heat_circ_mode", "heat circuit mode"),)
+    ),
+    HeatPumpFunction.HOT_WATER: RecordLayout(
+        1, (Field(0, 1, HeatPumpMode, "hot_water_mode", "hot water mode"),)
+    ),
+    HeatPumpFunction.GEN_STATUS: RecordLayout(
+        12,
+        (
+            Field(0, 1, HeatPumpType, "main_wp_type", "heat pump type"),
+            Field(1, 1, text, "main_sw_status", "software version"),
+            Field(2, 1, int, "main_biv_level", "BIV level"),
+            Field(3, 1, HeatPumpGenStatus, "main_status", "operational status"),
+            Field(
+                (4, 5, 6, 7, 8, 9), 1, system_time, "main_sys_uptime", "system uptime"
+            ),
+            Field(10, 1, int, "main_compact", "compact"),
+            Field(11, 1, int, "main_comfort", "comfort"),
+        ),
+        comma=True,
+    ),
+}
+
+
+def record_fields(function: HeatPumpFunction):
+    """Fields of function, including those of its history entries."""
+    layout = RECORD_LAYOUTS[function]
+    yield from layout.fields
+    for entry in range(1, layout.entries + 1):
+        yield from RECORD_LAYOUTS[function + entry].fields
+
+
+def last_record_code(function: HeatPumpFunction) -> int:
+    """Code of the record completing the reply of function."""
+    return function + RECORD_LAYOUTS[function].entries
+
+
+def _converter(field: Field) -> Callable[[list[bytes]], Any]:
+    """Compile field into a function taking the record tokens."""
+    convert = field.type
+    scale = field.scale
+    if isinstance(field.index, tuple):
+        indices = tuple(i + 1 for i in field.index)
+        return lambda tokens: convert(*[tokens[i] for i in indices])
+    index = field.index + 1
+    if convert in (HeatPumpMode, HeatPumpType, HeatPumpGenStatus):
+        # raw value to member lookup, unknown values raise KeyError
+        members = {str(member.value).encode("utf-8"): member for member in convert}
+        return lambda tokens: members[tokens[index].strip()]
+    if scale != 1:
+        return lambda tokens: convert(tokens[index]) / scale
+    return lambda tokens: convert(tokens[index])
+
+
+# family of every record code, history entries belong to their header
+RECORD_FAMILIES = {
+    code: function
+    for function, layout in RECORD_LAYOUTS.items()
+    if isinstance(function, HeatPumpFunction)
+    for code in range(function, function + layout.entries + 1)
+}
+
+
+def _uniform(layout: RecordLayout) -> tuple[tuple[str, ...], Callable, int] | None:
+    """Return (attrs, type, scale) if all fields share type and scale.
+
+    Such a record, e.g. the temperatures, holds one field per token in index
+    order and is converted with one comprehension over the tokens.
+    """
+    fields = layout.fields
+    if not fields or len(fields) != layout.count:
+        return None
+    convert, scale = fields[0].type, fields[0].scale
+    if convert in (HeatPumpMode, HeatPumpType, HeatPumpGenStatus):
+        return None
+    for index, field in enumerate(fields):
+        if (field.index, field.type, field.scale) != (index, convert, scale):
+            return None
+    return tuple(field.attr for field in fields), convert, scale
+
+
+# parser table keyed by the raw function code, tokens[0] of a record is <count>
+# and history headers carry no fields
+_PARSERS = {
+    str(int(function)).encode("utf-8"): (
+        function,
+        layout.count,
+        1 if layout.entries else layout.count + 1,
+        layout.comma,
+        tuple((field.attr, _converter(field)) for field in layout.fields),
+        _uniform(layout),
+    )
+    for function, layout in RECORD_LAYOUTS.items()
+}
+
+
+def decode_record(line: bytes) -> tuple[int, Iterable[tuple[str, Any]]] | None:
+    """Decode a record into its code and (field attribute, value) pairs.
+
+    The pairs can be iterated once. Returns None if line is no valid record.
+    """
+    code, sep, rest = line.partition(b";")
+    parser = _PARSERS.get(code)
+    if parser is None:
+        return None
+    function, count, size, comma, fields, uniform = parser
+    if comma:
+        rest = rest.replace(b",", b";")
+    tokens = rest.split(b";")
+    try:
+        if int(tokens[0]) != count or len(tokens) != size:
+            return None
+        if uniform is not None:
+            attrs, convert, scale = uniform
+            if scale == 1:
+                values = [convert(token) for token in tokens[1:]]
+            else:
+                values = [convert(token) / scale for token in tokens[1:]]
+            # the values are converted here, zip only pairs them up
+            return function, zip(attrs, values)
+        return function, [(attr, convert(tokens)) for attr, convert in fields]
+    except (ValueError, KeyError):
+        return None
+
+
+def parse_record(target, line: bytes) -> int | None:
+    """Decode a record and write all its fields to target in one pass.
+
+    Returns the code of the record, None if line is no valid record.
+    Nothing is written for invalid records.
+    """
+    decoded = decode_record(line)
+    if decoded is None:
+        return None
+    function, values = decoded
+    for attr, value in values:
+        setattr(target, attr, value)
+    return function
+
+
+class LineDecoder:
+    """Incremental splitter of the ser2net byte stream into lines.
+
+    Received bytes are appended to one reusable buffer, complete lines are
+    handed out as they arrive and a partial line is kept for the next read,
+    also across polls. A line growing beyond max_line without its \\r\\n is
+    dropped, counted as a resync like the lines the parsers rejected.
+    """
+
+    def __init__(self, max_line=MAX_LINE) -> None:
+        """Init decoder."""
+        self.buffer = bytearray()
+        self.max_line = max_line
+        self.lines = 0
+        self.resyncs = 0
+        self.discarded_bytes = 0
+
+    def feed(self, data) -> list[bytes]:
+        """Append received bytes, return the lines they completed."""
+        buffer = self.buffer
+        # the terminator may be split between two reads
+        search = max(len(buffer) - 1, 0)
+        buffer += data
+        lines = []
+        start = 0
+        end = buffer.find(b"\r\n", search)
+        if end == -1:
+            if len(buffer) > self.max_line:
+                self.discard(len(buffer))
+                buffer.clear()
+            return lines
+        with memoryview(buffer) as view:
+            while end != -1:
+                lines.append(view[start:end].tobytes())
+                start = end + 2
+                end = buffer.find(b"\r\n", start)
+        del buffer[:start]
+        if len(buffer) > self.max_line:
+            self.discard(len(buffer))
+            buffer.clear()
+        self.lines += len(lines)
+        return lines
+
+    def discard(self, size):
+        """Account a dropped line of size bytes."""
+        self.resyncs += 1
+        self.discarded_bytes += size
+
+    def reset(self):
+        """Drop the partial line, e.g. of a closed session."""
+        if self.buffer:
+            self.discard(len(self.buffer))
+            self.buffer.clear()
+
+    @property
+    def pending(self) -> int:
+        """Bytes of the partial line waiting for the rest."""
+        return len(self.buffer)
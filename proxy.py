@@ -0,0 +1,220 @@
+"""Local ser2net look-alike sharing the session of an engine.
+
+ser2net kicks the integration off the line for every other client. Local
+tools connect to the proxy instead, e.g.
+``python -m lux_heatpump.proxy heatpump:4322 --listen 127.0.0.1:4422``, run
+from the folder holding the integration; the engine keeps
+the only ser2net session and answers repeated reads from its cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+if __package__:
+    from .const import (
+        MODE_WRITE_CODES,
+        PROXY_HOST,
+        PROXY_TTL,
+        HeatPumpFunction,
+        HeatPumpMode,
+    )
+    from .heatpump_engine import async_heatpump_engine
+    from .poller import parse_controller
+    from .protocol import RECORD_LAYOUTS
+else:
+    from const import (
+        MODE_WRITE_CODES,
+        PROXY_HOST,
+        PROXY_TTL,
+        HeatPumpFunction,
+        HeatPumpMode,
+    )
+    from heatpump_engine import async_heatpump_engine
+    from poller import parse_controller
+    from protocol import RECORD_LAYOUTS
+
+# function read back by every mode write code
+WRITE_FUNCTIONS = {code: function for function, code in MODE_WRITE_CODES.items()}
+
+
+class Ser2NetProxy:
+    """Serve local clients like ser2net, through the session of one engine.
+
+    Requests of all clients take turns on the bus of the engine with its own
+    polls. A read of a function fetched less than ttl seconds ago, by a
+    client or by a poll, is answered from the last reply, clients asking for
+    a function already being fetched wait for that fetch. Mode writes, if
+    the engine allows them, go through the verified command queue and are
+    echoed once they were read back.
+    """
+
+    def __init__(self, engine, host, port, ttl=PROXY_TTL) -> None:
+        """Init proxy for the engine polling ser2net at host:port."""
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.server: asyncio.Server | None = None
+        self.clients: set[asyncio.Task] = set()
+        self.fetches: dict[HeatPumpFunction, asyncio.Future] = {}
+        # statistics
+        self.connects = 0
+        self.requests = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.fetched = 0
+        self.failed = 0
+
+    async def start(self, host=PROXY_HOST, port=0):
+        """Listen for local clients, port 0 picks a free port."""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self
+
+    @property
+    def listen_port(self):
+        """Port the proxy listens on."""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and close the client sessions."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for task in list(self.clients):
+            task.cancel()
+
+    async def handle(self, reader, writer):
+        """Serve one client session."""
+        self.connects += 1
+        self.clients.add(asyncio.current_task())
+        try:
+            if self.engine.mac_id == "-":
+                # the uid comes with the banner of the first session, which
+                # a short read opens and reads
+                await self.read(HeatPumpFunction.HEAT_CIRC)
+            # the uid of the last session of the engine
+            mac_id = self.engine.mac_id.encode("utf-8")
+            writer.write(b"\r\nser2net port uid=" + mac_id + b"\r\n")
+            buffer = b""
+            while True:
+                data = await reader.read(256)
+                if not data:
+                    break
+                buffer += data
+                # requests are terminated by "\n\r", tolerate "\r\n" and "\n"
+                *lines, buffer = buffer.replace(b"\r", b"\n").split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self.requests += 1
+                        writer.write(await self.answer(line.strip()))
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clients.discard(asyncio.current_task())
+            writer.close()
+
+    async def answer(self, request: bytes) -> bytes:
+        """Return the reply to one request, b"" if there is none."""
+        code, _, value = request.partition(b";")
+        try:
+            code = int(code)
+        except ValueError:
+            return b""
+        function = WRITE_FUNCTIONS.get(code)
+        if function is not None:
+            try:
+                mode = HeatPumpMode(int(value.rpartition(b";")[2]))
+            except ValueError:
+                return b""
+            if await self.engine.async_set_mode(self.host, self.port, function, mode):
+                return request + b"\r\n"
+            self.failed += 1
+            return b""
+        try:
+            function = HeatPumpFunction(code)
+        except ValueError:
+            return b""
+        # the unique id is no request, clients get it with the banner
+        if value or function not in RECORD_LAYOUTS:
+            return b""
+        return await self.read(function)
+
+    async def read(self, function: HeatPumpFunction) -> bytes:
+        """Return a reply of function at most ttl seconds old."""
+        engine = self.engine
+        last_fetch = engine.scheduler.schedules[function].last_fetch
+        frame = engine.reply_frame(function)
+        now = asyncio.get_running_loop().time()
+        fresh = last_fetch is not None and now - last_fetch < self.ttl
+        if frame is not None and fresh:
+            self.cache_hits += 1
+            return frame
+        fetch = self.fetches.get(function)
+        if fetch is None:
+            fetch = asyncio.ensure_future(
+                engine.async_fetch(self.host, self.port, (function,))
+            )
+            self.fetches[function] = fetch
+            fetch.add_done_callback(lambda _: self.fetches.pop(function, None))
+            self.fetched += 1
+        else:
+            self.coalesced += 1
+        if function not in await asyncio.shield(fetch):
+            self.failed += 1
+            return b""
+        return engine.reply_frame(function) or b""
+
+    def stats(self):
+        """Return proxy statistics."""
+        return {
+            "connects": self.connects,
+            "clients": len(self.clients),
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "fetched": self.fetched,
+            "failed": self.failed,
+        }
+
+
+async def async_main(args):
+    """Proxy one controller until interrupted."""
+    host, port = parse_controller(args.controller)
+    engine = async_heatpump_engine(not args.strict, mode_writes=args.mode_writes)
+    listen_host, listen_port = parse_controller(args.listen)
+    proxy = await Ser2NetProxy(engine, host, port, args.ttl).start(
+        listen_host, listen_port
+    )
+    print("proxying %s:%s on %s:%s" % (host, port, listen_host, proxy.listen_port))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await proxy.stop()
+        await engine.disconnect()
+        print(proxy.stats())
+
+
+def main(argv=None):
+    """Parse the command line and run the proxy."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("controller", metavar="HOST[:PORT]", help="ser2net peer")
+    parser.add_argument("--listen", default=f"{PROXY_HOST}:4422", metavar="HOST:PORT")
+    parser.add_argument(
+        "--ttl", type=float, default=PROXY_TTL, help="seconds a reply is reused"
+    )
+    parser.add_argument("--strict", action="store_true", help="disable pipelining")
+    parser.add_argument(
+        "--mode-writes", action="store_true", help="pass mode writes on"
+    )
+    try:
+        asyncio.run(async_main(parser.parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Per record family poll scheduling."""
+
+from __future__ import annotations
+
+if __package__:
+    from .const import (
+        ADAPTIVE_MAX_FACTOR,
+        ADAPTIVE_STEADY_POLLS,
+        RECORD_INTERVALS,
+        RETRY_MAX,
+    )
+else:
+    from const import (
+        ADAPTIVE_MAX_FACTOR,
+        ADAPTIVE_STEADY_POLLS,
+        RECORD_INTERVALS,
+        RETRY_MAX,
+    )
+
+
+class FunctionSchedule:
+    """Schedule and bus statistics of one function."""
+
+    def __init__(self, base_interval) -> None:
+        """Init schedule, a base_interval of None fetches once per connection."""
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self.last_fetch = None
+        self.steady = 0  # fetches in a row without a changed value
+        self.fetches = 0
+        self.failures = 0
+        self.failed_in_row = 0
+        self.retry_at = None  # monotonic time a failing function is retried
+        self.bus_time = 0.0  # seconds the reply occupied the serial line, in total
+        self.last_bus_time = 0.0
+
+
+class PollScheduler:
+    """Decide which functions a poll requests.
+
+    Every function has its own interval. With adaptive scheduling the interval
+    of a function whose values did not change for ADAPTIVE_STEADY_POLLS fetches
+    doubles, up to ADAPTIVE_MAX_FACTOR times its base interval, and drops back
+    to the base interval on the first change. A function whose reply failed is
+    retried on the next tick, after further failures in a row the retry delay
+    doubles up to RETRY_MAX seconds.
+    """
+
+    def __init__(self, intervals=None, adaptive=True) -> None:
+        """Init schedules."""
+        if intervals is None:
+            intervals = RECORD_INTERVALS
+        self.adaptive = adaptive
+        self.schedules = {
+            function: FunctionSchedule(interval)
+            for function, interval in intervals.items()
+        }
+
+    def set_intervals(self, intervals):
+        """Change base intervals, the time of the last fetches is kept."""
+        for function, interval in intervals.items():
+            schedule = self.schedules.get(function)
+            if schedule is None:
+                self.schedules[function] = FunctionSchedule(interval)
+            elif interval != schedule.base_interval:
+                schedule.base_interval = interval
+                schedule.interval = interval
+                schedule.steady = 0
+
+    @property
+    def tick(self):
+        """Seconds between two polls, the shortest base interval."""
+        return min(
+            schedule.base_interval
+            for schedule in self.schedules.values()
+            if schedule.base_interval is not None
+        )
+
+    def due(self, now):
+        """Functions due at monotonic time now."""
+        # half a tick of slack keeps functions due on every tick although
+        # the ticks jitter
+        slack = self.tick / 2
+        return [
+            function
+            for function, schedule in self.schedules.items()
+            if (schedule.retry_at is None or now >= schedule.retry_at - slack)
+            and (
+                schedule.last_fetch is None
+                or (
+                    schedule.interval is not None
+                    and now - schedule.last_fetch >= schedule.interval - slack
+                )
+            )
+        ]
+
+    def done(self, function, now, changed, bus_time=0.0):
+        """Account a complete reply of function."""
+        schedule = self.schedules[function]
+        schedule.last_fetch = now
+        schedule.fetches += 1
+        schedule.failed_in_row = 0
+        schedule.retry_at = None
+        schedule.bus_time += bus_time
+        schedule.last_bus_time = bus_time
+        if schedule.interval is None or not self.adaptive:
+            return
+        if changed:
+            schedule.steady = 0
+            schedule.interval = schedule.base_interval
+            return
+        schedule.steady += 1
+        if schedule.steady >= ADAPTIVE_STEADY_POLLS:
+            schedule.steady = 0
+            schedule.interval = min(
+                schedule.interval * 2, schedule.base_interval * ADAPTIVE_MAX_FACTOR
+            )
+
+    def failed(self, function, now):
+        """Account a missing reply of function, it stays due."""
+        schedule = self.schedules[function]
+        schedule.failures += 1
+        schedule.failed_in_row += 1
+        if schedule.interval is None:
+            # one attempt per connection
+            schedule.last_fetch = now
+        elif schedule.failed_in_row > 1:
+            schedule.retry_at = now + min(
+                RETRY_MAX, self.tick * 2 ** (schedule.failed_in_row - 2)
+            )
+
+    def reset_connection(self):
+        """Make the once per connection functions due again."""
+        for schedule in self.schedules.values():
+            if schedule.base_interval is None:
+                schedule.last_fetch = None
+
+    def report(self):
+        """Return interval and bus time statistics per function."""
+        return {
+            function.name.lower(): {
+                "interval": schedule.interval,
+                "fetches": schedule.fetches,
+                "failures": schedule.failures,
+                "failed_in_row": schedule.failed_in_row,
+                "bus_time": round(schedule.bus_time, 6),
+                "last_bus_time": round(schedule.last_bus_time, 6),
+            }
+            for function, schedule in self.schedules.items()
+        }
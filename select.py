@@ -0,0 +1,102 @@
+"""Platform for select integration."""
+
+from __future__ import annotations
+
+from homeassistant.components.select import SelectEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+from .const import DOMAIN, MODE_WRITE_CODES, HeatPumpFunction, HeatPumpMode
+from .coordinator import HeatpumpCoordinator
+from .entity import HeatpumpEntity
+from .protocol import record_fields
+
+# modes the controller accepts
+SETTABLE_MODES = [mode.name for mode in HeatPumpMode if mode != HeatPumpMode.UNKNOWN]
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Set up the mode selects, discovered by the sensor platform.
+
+    The selects only exist with the mode_writes option.
+    """
+    if discovery_info is None:
+        return
+    coordinator = hass.data[DOMAIN][discovery_info["controller"]]
+    async_setup_selects(hass, coordinator, async_add_entities)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the mode selects of a config entry."""
+    async_setup_selects(hass, entry.runtime_data, async_add_entities)
+
+
+@callback
+def async_setup_selects(
+    hass: HomeAssistant,
+    coordinator: HeatpumpCoordinator,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Add the mode selects with mode writes, follow later option changes.
+
+    Enabling mode writes adds the selects, disabling removes them from the
+    entity registry, the coordinator and its engine keep running.
+    """
+    selects: list[HeatpumpModeSelect] = []
+
+    @callback
+    def async_update_selects() -> None:
+        if coordinator.engine.mode_writes and not selects:
+            selects.extend(
+                HeatpumpModeSelect(coordinator, function)
+                for function in MODE_WRITE_CODES
+            )
+            async_add_entities(selects)
+        elif not coordinator.engine.mode_writes and selects:
+            registry = er.async_get(hass)
+            for select in selects:
+                if select.registry_entry is not None:
+                    registry.async_remove(select.entity_id)
+                else:
+                    hass.async_create_task(select.async_remove())
+            selects.clear()
+
+    coordinator.mode_writes_listener = async_update_selects
+    async_update_selects()
+
+
+class HeatpumpModeSelect(HeatpumpEntity, SelectEntity):
+    """Heating or hot water mode of the controller."""
+
+    _attr_options = SETTABLE_MODES
+
+    def __init__(
+        self, coordinator: HeatpumpCoordinator, function: HeatPumpFunction
+    ) -> None:
+        """Init select."""
+        self.function = function
+        field = next(record_fields(function))
+        super().__init__(coordinator, field.attr, field.name, field.attr + "_select")
+
+    def update_from_snapshot(self) -> None:
+        """Take over the field value of the latest snapshot."""
+        mode = self.snapshot_value()
+        self._attr_current_option = (
+            mode.name if mode is not None and mode.name in SETTABLE_MODES else None
+        )
+
+    async def async_select_option(self, option: str) -> None:
+        """Set the mode, the state follows once it was read back."""
+        await self.coordinator.async_set_mode(self.function, HeatPumpMode[option])
@@ -1,283 +1,409 @@
 """Platform for sensor integration."""
 
 from __future__ import annotations
+
 from datetime import datetime
+from enum import IntEnum
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
-from homeassistant.const import UnitOfTemperature
-from homeassistant.core import HomeAssistant
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import (
+    EVENT_HOMEASSISTANT_STOP,
+    MATCH_ALL,
+    EntityCategory,
+    Platform,
+    UnitOfTemperature,
+    UnitOfTime,
+)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+from homeassistant.util import dt as dt_util
+
+from .analytics import DERIVED_FIELDS, DerivedField
+from .capture import FrameCapture
+from .const import DEFAULT_NAME, DEFAULT_PORT, DOMAIN, HeatPumpFunction
+from .coordinator import HeatpumpCoordinator, async_open_history
+from .entity import HeatpumpEntity
+from .filters import deadbands_from_config
+from .protocol import Field, entry_time, record_fields, system_time
+
+# unique id suffixes of the sensors that existed before sensors were generated
+# from the record layouts, unique ids start with the unique id prefix of
+# the controller
+LEGACY_UNIQUE_IDS = {
+    "outdoor_temp": "1",
+    "heating_circuit_flow_temp": "2",
+    "heating_circuit_return_flow_temp_actual": "3",
+    "heating_circuit_return_flow_temp_setpoint": "4",
+    "domestic_hot_water_temp_actual": "5",
+    "domestic_hot_water_temp_setpoint": "6",
+}
+
+# unique id prefix of the entities of the ser2net-host/ser2net-port setup
+LEGACY_UNIQUE_ID_PREFIX = "baba-cafe:4322"
+
+# record families shown as sensors, inputs and outputs are binary sensors
+SENSOR_FUNCTIONS = (
+    HeatPumpFunction.TEMPERATURE,
+    HeatPumpFunction.HEAT_CIRC,
+    HeatPumpFunction.HOT_WATER,
+    HeatPumpFunction.GEN_STATUS,
+    HeatPumpFunction.RUNTIMES,
+    HeatPumpFunction.FAULTS,
+    HeatPumpFunction.SHUTDOWNS,
+)
 
-from .const import DOMAIN, HeatPumpType
-
-# from .heatpump_engine import heatpump_engine
-from .heatpump_engine import HeatPumpMode, my_heatpump_engine, HeatPumpGenStatus
-
-
-class Peer:
-    """Representation of the ser2net peer."""
-
-    def __init__(self, host, port) -> None:
-        """Init sensor."""
-        self.host = host
-        self.port = port
-
-    def set_peer(self, host, port):
-        """Set the peer."""
-
-        if self.host != host or self.port != port:
-            self.port = port
-            self.host = host
-        return self.host, self.port
-
-    def get_peer(self):
-        """Get the current peer."""
-
-        return self.host, self.port
-
-
-peer = Peer("unknown", 4322)
-
-
-def setup_platform(
+# engine phase timers shown as diagnostic sensors, in ms
+METRIC_SENSORS = {
+    "poll": "poll duration",
+    "connect": "connect duration",
+    "send": "send duration",
+    "first_byte": "first byte latency",
+    "frame": "reply frame duration",
+    "parse": "parse duration",
+}
+
+DIAGNOSTIC_ATTRS = {
+    "main_wp_type",
+    "main_sw_status",
+    "main_biv_level",
+    "main_sys_uptime",
+    "main_compact",
+    "main_comfort",
+}
+
+
+async def async_setup_platform(
     hass: HomeAssistant,
     config: ConfigType,
-    add_entities: AddEntitiesCallback,
+    async_add_entities: AddEntitiesCallback,
     discovery_info: DiscoveryInfoType | None = None,
 ) -> None:
-    """Set up the sensor platform."""
-    add_entities([HeatpumpSensor1()])
-    add_entities([HeatpumpSensor2()])
-    add_entities([HeatpumpSensor3()])
-    add_entities([HeatpumpSensor4()])
-    add_entities([HeatpumpSensor5()])
-    add_entities([HeatpumpSensor6()])
-    host, port = peer.get_peer()
-
-    hass.states.set(DOMAIN + ".controller_mac", "-")
-    hass.states.set(DOMAIN + ".heat_circuit_mode", "-")
-    hass.states.set(DOMAIN + ".hot_water_mode", "-")
-    # main states
-    hass.states.set(DOMAIN + ".operational_status", "-")
-    hass.states.set(DOMAIN + ".system_uptime", "-")
-    hass.states.set(DOMAIN + ".heat_pump_type", "-")
-    hass.states.set(DOMAIN + ".software_version", "-")
-    hass.states.set(DOMAIN + ".biv_level", "-")
-    hass.states.set(DOMAIN + ".compact", "-")
-    hass.states.set(DOMAIN + ".comfort", "-")
-    my_heatpump_engine.host = str(config["ser2net-host"])
-    my_heatpump_engine.port = int(config["ser2net-port"])
-    peer.set_peer(my_heatpump_engine.host, my_heatpump_engine.port)
-    hass.states.set(DOMAIN + ".controller_host", peer.host)
-    hass.states.set(DOMAIN + ".controller_port", peer.port)
-
-
-class HeatpumpSensor1(SensorEntity):
-    """Representation of a Sensor."""
-
-    _attr_name = "luxtronik1 Outdoor temperature"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
-    _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:1"
-
-    def __init__(self) -> None:
-        """Init sensor."""
-        self.eng = my_heatpump_engine
-        self.heat_mode_cache = HeatPumpMode.UNKNOWN
-        self.hot_water_mode_cache = HeatPumpMode.UNKNOWN
-        self.main_wp_type_cache = HeatPumpType.UNKNOWN
-        self.main_sw_status_cache = "-"
-        self.main_biv_level_cache = -1
-        self.main_status_cache = HeatPumpGenStatus.UNKNOWN
-        self.main_sys_uptime_cache = datetime.fromisoformat("2000-01-01T00:05:23")
-        self.main_compact_cache = -1
-        self.main_comfort_cache = -1
-        self.controller_mac_addr_cache = "-"
-
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
-
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        host, port = peer.get_peer()
-
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.outdoor_temp
-
-        if self.heat_mode_cache != my_heatpump_engine.heat_circ_mode:
-            self.hass.states.set(
-                DOMAIN + ".heat_circuit_mode", my_heatpump_engine.heat_circ_mode.name
-            )
-            self.heat_mode_cache = my_heatpump_engine.heat_circ_mode
-
-        if self.hot_water_mode_cache != my_heatpump_engine.hot_water_mode:
-            self.hass.states.set(
-                DOMAIN + ".hot_water_mode", my_heatpump_engine.hot_water_mode.name
-            )
-            self.hot_water_mode_cache = my_heatpump_engine.hot_water_mode
-
-        if self.main_wp_type_cache != my_heatpump_engine.main_wp_type:
-            self.hass.states.set(
-                DOMAIN + ".heat_pump_type", my_heatpump_engine.main_wp_type.name
-            )
-            self.main_wp_type_cache = my_heatpump_engine.main_wp_type
-
-        if self.main_sw_status_cache != my_heatpump_engine.main_sw_status:
-            self.hass.states.set(
-                DOMAIN + ".software_version", my_heatpump_engine.main_sw_status
-            )
-            self.main_sw_status_cache = my_heatpump_engine.main_sw_status
-
-        if self.main_biv_level_cache != my_heatpump_engine.main_biv_level:
-            self.hass.states.set(
-                DOMAIN + ".biv_level", my_heatpump_engine.main_biv_level
+    """Set up the sensor platform, one engine per configured controller."""
+    controllers = config.get("controllers") or [
+        {
+            "host": config["ser2net-host"],
+            "port": config["ser2net-port"],
+            # the single controller setup always had these unique ids,
+            # whatever host was configured
+            "unique_id_prefix": LEGACY_UNIQUE_ID_PREFIX,
+        }
+    ]
+    deadbands = deadbands_from_config(config.get("deadbands"))
+    coordinators = []
+    for controller in controllers:
+        host = str(controller["host"])
+        port = int(controller.get("port", DEFAULT_PORT))
+        history = None
+        if config.get("history", True):
+            path = config.get("history_file")
+            history = await async_open_history(
+                hass, None if path is None else f"{path}-{host}-{port}"
             )
-            self.main_biv_level_cache = my_heatpump_engine.main_biv_level
-
-        if self.main_status_cache != my_heatpump_engine.main_status:
-            self.hass.states.set(
-                DOMAIN + ".operational_status", my_heatpump_engine.main_status.name
+        capture = None
+        if config.get("capture_file"):
+            capture = await hass.async_add_executor_job(
+                FrameCapture, f"{config['capture_file']}-{host}-{port}.cap"
             )
-            self.main_status_cache = my_heatpump_engine.main_status
-
-        if self.main_sys_uptime_cache != my_heatpump_engine.main_sys_uptime:
-            self.hass.states.set(
-                DOMAIN + ".system_uptime", my_heatpump_engine.main_sys_uptime
+        coordinators.append(
+            HeatpumpCoordinator(
+                hass,
+                host,
+                port,
+                bool(config.get("pipelined", True)),
+                bool(config.get("adaptive_polling", True)),
+                str(controller.get("name", DEFAULT_NAME)),
+                history,
+                deadbands,
+                capture,
+                unique_id_prefix=controller.get("unique_id_prefix"),
+                mode_writes=bool(config.get("mode_writes", False)),
             )
-            self.main_sys_uptime_cache = my_heatpump_engine.main_sys_uptime
+        )
 
-        if self.main_compact_cache != my_heatpump_engine.main_compact:
-            self.hass.states.set(DOMAIN + ".compact", my_heatpump_engine.main_compact)
-            self.main_compact_cache = my_heatpump_engine.main_compact
+    async def async_stop(event):
+        for coordinator in coordinators:
+            await coordinator.async_shutdown()
 
-        if self.main_comfort_cache != my_heatpump_engine.main_comfort:
-            self.hass.states.set(DOMAIN + ".comfort", my_heatpump_engine.main_comfort)
-            self.main_comfort_cache = my_heatpump_engine.main_comfort
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop)
 
-        if self.controller_mac_addr_cache != my_heatpump_engine.mac_id:
-            self.hass.states.set(DOMAIN + ".controller_mac", my_heatpump_engine.mac_id)
-            self.controller_mac_addr_cache = my_heatpump_engine.mac_id
-            # if self._attr_unique_id != my_heatpump_engine.mac_id:
-            #    self._attr_unique_id = my_heatpump_engine.mac_id
+    for controller, coordinator in zip(controllers, coordinators):
+        await coordinator.async_set_proxy(int(controller.get("proxy_port", 0)))
+        async_setup_controller(hass, config, coordinator, async_add_entities)
+        # the first polls run concurrently in the background, a slow or
+        # unreachable controller does not delay the startup
+        hass.async_create_background_task(
+            coordinator.async_refresh(),
+            f"{DOMAIN} first refresh {coordinator.controller_id}",
+        )
 
 
-class HeatpumpSensor2(SensorEntity):
-    """Representation of a Sensor."""
+async def async_setup_entry(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Set up the sensors of a config entry."""
+    async_add_entities(controller_sensors(entry.runtime_data))
 
-    _attr_name = "luxtronik1 heating circuit flow temperature"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
-    _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:2"
 
-    def __init__(self) -> None:
+@callback
+def async_setup_controller(
+    hass: HomeAssistant,
+    config: ConfigType,
+    coordinator: HeatpumpCoordinator,
+    async_add_entities: AddEntitiesCallback,
+) -> None:
+    """Add the entities of one controller."""
+    hass.data.setdefault(DOMAIN, {})[coordinator.controller_id] = coordinator
+    async_add_entities(controller_sensors(coordinator))
+    for platform in (Platform.BINARY_SENSOR, Platform.SELECT):
+        hass.async_create_task(
+            async_load_platform(
+                hass,
+                platform,
+                DOMAIN,
+                {"controller": coordinator.controller_id},
+                config,
+            )
+        )
+
+
+def controller_sensors(coordinator: HeatpumpCoordinator) -> list[SensorEntity]:
+    """Return the sensors of one controller."""
+    entities: list[SensorEntity] = [HeatpumpControllerSensor(coordinator)]
+    entities.extend(
+        HeatpumpMetricSensor(coordinator, phase, name)
+        for phase, name in METRIC_SENSORS.items()
+    )
+    entities.append(HeatpumpErrorSensor(coordinator))
+    entities.append(HeatpumpBusTimeSensor(coordinator))
+    entities.append(HeatpumpConnectionSensor(coordinator))
+    entities.extend(
+        HeatpumpDerivedSensor(coordinator, field) for field in DERIVED_FIELDS
+    )
+    for function in SENSOR_FUNCTIONS:
+        entities.extend(
+            HeatpumpSensor(coordinator, field)
+            for field in record_fields(function)
+            if field.name
+        )
+    return entities
+
+
+class HeatpumpSensor(HeatpumpEntity, SensorEntity):
+    """Representation of a record field."""
+
+    def __init__(self, coordinator: HeatpumpCoordinator, field: Field) -> None:
         """Init sensor."""
-        self.eng = my_heatpump_engine
-
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
-
-        This is the only method that should fetch new data for Home Assistant .
-        """
-        host, port = peer.get_peer()
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.heating_circuit_flow_temp
-
-
-class HeatpumpSensor3(SensorEntity):
-    """Representation of a Sensor."""
-
-    _attr_name = "luxtronik1 heating circuit return flow temperature (actual)"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
-    _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:3"
-
-    def __init__(self) -> None:
+        if field.unit == "°C":
+            self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+            self._attr_device_class = SensorDeviceClass.TEMPERATURE
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+        elif field.type in (entry_time, system_time):
+            self._attr_device_class = SensorDeviceClass.TIMESTAMP
+        elif field.unit == "s":
+            self._attr_native_unit_of_measurement = UnitOfTime.SECONDS
+            self._attr_device_class = SensorDeviceClass.DURATION
+        elif isinstance(field.type, type) and issubclass(field.type, IntEnum):
+            self._attr_device_class = SensorDeviceClass.ENUM
+            self._attr_options = [member.name for member in field.type]
+        if field.attr.endswith(("_runtime", "_starts")) and "_avg_" not in field.attr:
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+        if field.attr in DIAGNOSTIC_ATTRS:
+            self._attr_entity_category = EntityCategory.DIAGNOSTIC
+        super().__init__(
+            coordinator,
+            field.attr,
+            field.name,
+            LEGACY_UNIQUE_IDS.get(field.attr, field.attr),
+        )
+
+    def update_from_snapshot(self) -> None:
+        """Take over the field value of the latest snapshot."""
+        value = self.snapshot_value()
+        if isinstance(value, IntEnum):
+            value = value.name
+        elif isinstance(value, datetime) and value.tzinfo is None:
+            # the controller clock runs in local time
+            value = dt_util.as_local(value)
+        self._attr_native_value = value
+
+
+class HeatpumpDerivedSensor(HeatpumpEntity, SensorEntity):
+    """Figure the engine derives from the polls, e.g. compressor starts."""
+
+    def __init__(self, coordinator: HeatpumpCoordinator, field: DerivedField) -> None:
         """Init sensor."""
-        self.eng = my_heatpump_engine
+        if field.unit == "°C":
+            self._attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+            self._attr_device_class = SensorDeviceClass.TEMPERATURE
+        elif field.unit == "s":
+            self._attr_native_unit_of_measurement = UnitOfTime.SECONDS
+            self._attr_device_class = SensorDeviceClass.DURATION
+        self._attr_state_class = (
+            SensorStateClass.TOTAL_INCREASING
+            if field.total
+            else SensorStateClass.MEASUREMENT
+        )
+        super().__init__(coordinator, field.attr, field.name, "derived_" + field.attr)
+
+    def snapshot_value(self):
+        """Return the derived value of the latest poll."""
+        return getattr(self.coordinator.engine.derived, self.engine_attr)
+
+    def update_from_snapshot(self) -> None:
+        """Take over the derived value."""
+        self._attr_native_value = self.snapshot_value()
+
+
+class HeatpumpControllerSensor(HeatpumpEntity, SensorEntity):
+    """Unique id of the controller and its ser2net peer."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: HeatpumpCoordinator) -> None:
+        """Init sensor."""
+        super().__init__(coordinator, "mac_id", "controller MAC")
+
+    @property
+    def extra_state_attributes(self):
+        """Return the ser2net peer, it may change with the options."""
+        return {"host": self.coordinator.host, "port": self.coordinator.port}
 
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
+    def update_from_snapshot(self) -> None:
+        """Take over the field value of the latest snapshot."""
+        self._attr_native_value = self.snapshot_value()
 
-        update_peer(host,port)
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        host, port = peer.get_peer()
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.heating_circuit_return_flow_temp_actual
 
+class HeatpumpMetricSensor(HeatpumpEntity, SensorEntity):
+    """Mean duration of an engine phase, per function in the attributes.
 
-class HeatpumpSensor4(SensorEntity):
-    """Representation of a Sensor."""
+    The state and the attributes are written when the mean, rounded to
+    0.1 ms, changed. The attributes are not recorded.
+    """
 
-    _attr_name = "luxtronik1 heating circuit return flow temperature (setpoint)"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
     _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:4"
+    _attr_suggested_display_precision = 1
+    _unrecorded_attributes = frozenset({MATCH_ALL})
 
-    def __init__(self) -> None:
+    def __init__(self, coordinator: HeatpumpCoordinator, phase, name) -> None:
+        """Init sensor."""
+        self.phase = phase
+        super().__init__(coordinator, "metrics_" + phase, name)
+
+    def snapshot_value(self):
+        """Return the mean duration of the phase in ms, rounded to 0.1 ms."""
+        timers = self.coordinator.engine.metrics_report().get(self.phase, {})
+        count = sum(stats["count"] for stats in timers.values())
+        total = sum(stats["mean"] * stats["count"] for stats in timers.values())
+        return round(total / count * 1e3, 1) if count else None
+
+    def update_from_snapshot(self) -> None:
+        """Take over the phase timers of the engine."""
+        timers = self.coordinator.engine.metrics_report().get(self.phase, {})
+        self._attr_native_value = self.snapshot_value()
+        self._attr_extra_state_attributes = {
+            label: {
+                "count": stats["count"],
+                "mean_ms": round(stats["mean"] * 1e3, 3),
+                "max_ms": round(stats["max"] * 1e3, 3),
+            }
+            for label, stats in timers.items()
+        }
+
+
+class HeatpumpErrorSensor(HeatpumpMetricSensor):
+    """Engine errors, per kind in the attributes."""
+
+    _attr_device_class = None
+    _attr_native_unit_of_measurement = None
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_suggested_display_precision = None
+
+    def __init__(self, coordinator: HeatpumpCoordinator) -> None:
         """Init sensor."""
-        self.eng = my_heatpump_engine
+        super().__init__(coordinator, "errors", "errors")
 
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
+    def snapshot_value(self):
+        """Return the error total."""
+        return sum(self.coordinator.engine.metrics_report().get("errors", {}).values())
 
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        host, port = peer.get_peer()
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.heating_circuit_return_flow_temp_setpoint
+    def update_from_snapshot(self) -> None:
+        """Take over the error counters of the engine."""
+        errors = self.coordinator.engine.metrics_report().get("errors", {})
+        self._attr_native_value = sum(errors.values())
+        self._attr_extra_state_attributes = errors
 
 
-class HeatpumpSensor5(SensorEntity):
-    """Representation of a Sensor."""
+class HeatpumpBusTimeSensor(HeatpumpEntity, SensorEntity):
+    """Serial line time of all replies, the schedule per function in the attributes.
 
-    _attr_name = "luxtronik1 hot water temperature (actual)"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
-    _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:5"
+    The attributes show interval, fetches, failures and bus time of every
+    record family. The state and the attributes are written when the total
+    changed by a second, the attributes are not recorded.
+    """
 
-    def __init__(self) -> None:
-        """Init sensor."""
-        self.eng = my_heatpump_engine
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.SECONDS
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _unrecorded_attributes = frozenset({MATCH_ALL})
 
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
+    def __init__(self, coordinator: HeatpumpCoordinator) -> None:
+        """Init sensor."""
+        super().__init__(coordinator, "bus_time", "bus time")
 
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        host, port = peer.get_peer()
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.domestic_hot_water_temp_actual
+    def snapshot_value(self):
+        """Return the seconds the replies occupied the serial line."""
+        schedules = self.coordinator.engine.scheduler.schedules.values()
+        return round(sum(schedule.bus_time for schedule in schedules))
 
+    def update_from_snapshot(self) -> None:
+        """Take over the schedule report of the engine."""
+        self._attr_native_value = self.snapshot_value()
+        self._attr_extra_state_attributes = (
+            self.coordinator.engine.scheduler.report()
+        )
 
-class HeatpumpSensor6(SensorEntity):
-    """Representation of a Sensor."""
 
-    _attr_name = "luxtronik1 hot water temperature (setpoint)"
-    _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
-    _attr_device_class = SensorDeviceClass.TEMPERATURE
-    _attr_state_class = SensorStateClass.MEASUREMENT
-    _attr_unique_id = "baba-cafe:4322:6"
+class HeatpumpConnectionSensor(HeatpumpEntity, SensorEntity):
+    """Reconnects of the ser2net session, its statistics in the attributes.
 
-    def __init__(self) -> None:
-        """Init sensor."""
-        self.eng = my_heatpump_engine
+    The attributes show connects, connect failures and durations, backoff,
+    session durations, bytes and the last disconnect reason. The state and
+    the attributes are written when the session connects, reconnects or
+    drops, the attributes are not recorded.
+    """
 
-    def update(self) -> None:
-        """Fetch new state data for the sensor.
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _unrecorded_attributes = frozenset({MATCH_ALL})
 
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        host, port = peer.get_peer()
-        self.eng.poll_for_stats(host, port)
-        self._attr_native_value = self.eng.domestic_hot_water_temp_setpoint
+    def __init__(self, coordinator: HeatpumpCoordinator) -> None:
+        """Init sensor."""
+        super().__init__(coordinator, "reconnects", "reconnects")
+
+    def snapshot_value(self):
+        """Return the reconnects, connect failures and the session state."""
+        connection = self.coordinator.engine.connection
+        return (
+            connection.reconnects,
+            connection.connect_failures,
+            connection.is_connected(),
+        )
+
+    def update_from_snapshot(self) -> None:
+        """Take over the connection statistics of the engine."""
+        stats = self.coordinator.engine.connection.stats()
+        self._attr_native_value = stats["reconnects"]
+        self._attr_extra_state_attributes = stats
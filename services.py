@@ -0,0 +1,93 @@
+"""Services of the lux_heatpump integration."""
+
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, HeatPumpFunction, HeatPumpMode
+
+SERVICE_QUERY_HISTORY = "query_history"
+SERVICE_SET_MODE = "set_mode"
+
+# resolution names of the history tables, seconds per bucket
+RESOLUTIONS = {"raw": None, "1m": 60, "15m": 900, "1h": 3600}
+
+QUERY_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional("controller"): cv.string,
+        vol.Optional("fields"): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("resolution", default="raw"): vol.In(RESOLUTIONS),
+    }
+)
+
+
+# circuits of the set_mode service
+CIRCUITS = {
+    "heating": HeatPumpFunction.HEAT_CIRC,
+    "hot_water": HeatPumpFunction.HOT_WATER,
+}
+
+SET_MODE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("controller"): cv.string,
+        vol.Required("circuit"): vol.In(CIRCUITS),
+        vol.Required("mode"): vol.In(
+            [mode.name for mode in HeatPumpMode if mode != HeatPumpMode.UNKNOWN]
+        ),
+    }
+)
+
+
+@callback
+def async_register_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+
+    async def async_set_mode(call: ServiceCall) -> None:
+        """Set a mode on one or all controllers."""
+        controller = call.data.get("controller")
+        for controller_id, coordinator in hass.data.get(DOMAIN, {}).items():
+            if controller in (None, controller_id):
+                await coordinator.async_set_mode(
+                    CIRCUITS[call.data["circuit"]], HeatPumpMode[call.data["mode"]]
+                )
+
+    async def async_query_history(call: ServiceCall) -> ServiceResponse:
+        """Return the history of the controllers, times are epoch seconds."""
+        since = call.data.get("start")
+        until = call.data.get("end")
+        controller = call.data.get("controller")
+        return {
+            controller_id: coordinator.engine.history.query(
+                call.data.get("fields"),
+                None if since is None else dt_util.as_timestamp(since),
+                None if until is None else dt_util.as_timestamp(until),
+                RESOLUTIONS[call.data["resolution"]],
+            )
+            for controller_id, coordinator in hass.data.get(DOMAIN, {}).items()
+            if coordinator.engine.history is not None
+            and controller in (None, controller_id)
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_QUERY_HISTORY,
+        async_query_history,
+        schema=QUERY_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_MODE, async_set_mode, schema=SET_MODE_SCHEMA
+    )
@@ -0,0 +1,379 @@
+"""Offline Luxtronik v1 controller behind ser2net, for tests and benchmarks.
+
+Run from the folder holding the integration, e.g.
+``python -m lux_heatpump.simulator --port 4322 --drop 0.01 --split``
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import random
+import time
+
+if __package__:
+    from .const import HeatPumpFunction
+else:
+    from const import HeatPumpFunction
+
+BAUD_RATE = 57600
+BITS_PER_BYTE = 10  # 8N1 with start and stop bit
+
+
+class SimulatorOptions:
+    """Line and failure behaviour of a simulated controller."""
+
+    def __init__(
+        self,
+        baud_rate=BAUD_RATE,
+        response_delay=0.005,
+        jitter=0.0,
+        drop_rate=0.0,
+        garble_rate=0.0,
+        split=False,
+        drop_queued=False,
+        kick_old_user=True,
+        kick_interval=None,
+        seed=0,
+        mac="00:11:22:33:44:55",
+    ) -> None:
+        """Init options.
+
+        baud_rate 0 sends without line delay, response_delay is the controller
+        think time per request, jitter the maximum random extra delay.
+        drop_rate and garble_rate are probabilities per reply, split sends
+        replies in random small TCP segments. drop_queued ignores requests
+        arriving while a reply is on the line, like controllers that do not
+        queue commands. kick_old_user closes a session when a new client
+        connects, kick_interval closes all sessions every that many seconds.
+        """
+        self.byte_time = BITS_PER_BYTE / baud_rate if baud_rate else 0.0
+        self.response_delay = response_delay
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.garble_rate = garble_rate
+        self.split = split
+        self.drop_queued = drop_queued
+        self.kick_old_user = kick_old_user
+        self.kick_interval = kick_interval
+        self.seed = seed
+        self.mac = mac
+
+
+class ControllerModel:
+    """Deterministic, slowly changing controller values."""
+
+    def __init__(self) -> None:
+        """Init model."""
+        self.start = time.time()
+        self.heat_circ_mode = 0
+        self.hot_water_mode = 0
+
+    def set_mode(self, code, mode):
+        """Apply a mode write, unknown modes raise ValueError."""
+        if not 0 <= mode <= 4:
+            raise ValueError(mode)
+        if code == 3401:
+            self.heat_circ_mode = mode
+        else:
+            self.hot_water_mode = mode
+
+    def temperatures(self, now):
+        """Values of the 1100 record in 0.1 degC."""
+        phase = (now - self.start) / 600 * 2 * math.pi
+        outdoor = round(-20 + 30 * math.sin(phase / 6))
+        flow = round(320 + 40 * math.sin(phase))
+        return (
+            flow,
+            flow - 35,
+            300,
+            flow + 250,
+            outdoor,
+            round(480 + 20 * math.cos(phase)),
+            500,
+            90,
+            60,
+            flow - 5,
+            310,
+            0,
+        )
+
+    def reply(self, function: HeatPumpFunction, now):
+        """Return the reply frame of function, None for unknown functions."""
+        compressor = int(math.sin((now - self.start) / 300) > 0)
+        runtime = int(now - self.start)
+        if function == HeatPumpFunction.TEMPERATURE:
+            fields = self.temperatures(now)
+        elif function == HeatPumpFunction.INPUTS:
+            fields = (1, 1, 0, 1, 1, 0)
+        elif function == HeatPumpFunction.OUTPUTS:
+            fields = (0, 0, 0, 1, 0, 0, 0, compressor, compressor, 0, 0, 0, 0)
+        elif function == HeatPumpFunction.RUNTIMES:
+            fields = (
+                3600000 + runtime // 2,
+                1500 + runtime // 600,
+                2400,
+                0,
+                0,
+                0,
+                3600,
+                0,
+                4000000 + runtime,
+            )
+        elif function in (HeatPumpFunction.FAULTS, HeatPumpFunction.SHUTDOWNS):
+            lines = [f"{function.value};5"]
+            for entry in range(1, 6):
+                lines.append(
+                    f"{function.value + entry};6;{700 + entry};1;2;24;10;{entry}"
+                )
+            return "\r\n".join(lines) + "\r\n"
+        elif function == HeatPumpFunction.GEN_STATUS:
+            clock = time.localtime(now)
+            fields = (
+                1,
+                " V2.33",
+                0,
+                0 if compressor else 5,
+                clock.tm_mday,
+                clock.tm_mon,
+                clock.tm_year - 2000,
+                clock.tm_hour,
+                clock.tm_min,
+                clock.tm_sec,
+                0,
+                1,
+            )
+        elif function == HeatPumpFunction.HEAT_CIRC:
+            fields = (self.heat_circ_mode,)
+        elif function == HeatPumpFunction.HOT_WATER:
+            fields = (self.hot_water_mode,)
+        else:
+            return None
+        tokens = [function.value, len(fields), *fields]
+        return ";".join(str(token) for token in tokens) + "\r\n"
+
+
+class LuxtronikSimulator:
+    """TCP server answering Luxtronik v1 requests like ser2net and the controller.
+
+    All sessions share one simulated serial line, replies are serialized and
+    delayed by the configured baud rate.
+    """
+
+    def __init__(self, options: SimulatorOptions | None = None) -> None:
+        """Init simulator."""
+        self.options = options or SimulatorOptions()
+        self.random = random.Random(self.options.seed)
+        self.model = ControllerModel()
+        self.line = asyncio.Lock()
+        self.server: asyncio.Server | None = None
+        self.sessions: list[asyncio.StreamWriter] = []
+        self.handlers: set[asyncio.Task] = set()
+        self.kick_task: asyncio.Task | None = None
+        # statistics
+        self.connects = 0
+        self.kicks = 0
+        self.requests = 0
+        self.replies = 0
+        self.dropped = 0
+        self.garbled = 0
+        self.bytes_sent = 0
+
+    @property
+    def port(self):
+        """TCP port the simulator listens on."""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening, port 0 picks a free port."""
+        self.server = await asyncio.start_server(self.handle_session, host, port)
+        if self.options.kick_interval:
+            self.kick_task = asyncio.create_task(self.kick_periodically())
+        return self
+
+    async def stop(self):
+        """Stop listening and close all sessions."""
+        if self.kick_task is not None:
+            self.kick_task.cancel()
+        self.kick_all()
+        self.server.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def kick_all(self):
+        """Close all sessions."""
+        for writer in self.sessions:
+            writer.close()
+            self.kicks += 1
+        self.sessions.clear()
+
+    async def kick_periodically(self):
+        """Close all sessions every kick_interval seconds."""
+        while True:
+            await asyncio.sleep(self.options.kick_interval)
+            self.kick_all()
+
+    async def handle_session(self, reader, writer):
+        """Serve one client session."""
+        if self.options.kick_old_user:
+            self.kick_all()
+        self.sessions.append(writer)
+        self.handlers.add(asyncio.current_task())
+        self.connects += 1
+        pending = []  # requests not answered yet
+        try:
+            await self.send(writer, f"\r\nser2net port uid={self.options.mac}\r\n")
+            buffer = b""
+            while True:
+                data = await reader.read(256)
+                if not data:
+                    break
+                buffer += data
+                # requests are terminated by "\n\r", tolerate "\r\n" and "\n"
+                *lines, buffer = buffer.replace(b"\r", b"\n").split(b"\n")
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    self.requests += 1
+                    if self.options.drop_queued and (self.line.locked() or pending):
+                        self.dropped += 1
+                        continue
+                    pending.append(line.strip())
+                while pending:
+                    await self.answer(writer, pending.pop(0))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if writer in self.sessions:
+                self.sessions.remove(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def answer(self, writer, request: bytes):
+        """Answer one request."""
+        code, _, value = request.partition(b";")
+        if code in (b"3401", b"3501"):
+            # "<code>;1;<mode>" sets a mode, the record is echoed
+            try:
+                self.model.set_mode(int(code), int(value.rpartition(b";")[2]))
+            except ValueError:
+                return
+            self.replies += 1
+            await self.send(writer, request.decode("utf-8") + "\r\n")
+            return
+        try:
+            function = HeatPumpFunction(int(request))
+        except ValueError:
+            return
+        reply = self.model.reply(function, time.time())
+        if reply is None:
+            return
+        if self.random.random() < self.options.drop_rate:
+            self.dropped += 1
+            return
+        if self.random.random() < self.options.garble_rate:
+            self.garbled += 1
+            reply = self.garble(reply)
+        self.replies += 1
+        await self.send(writer, reply)
+
+    def garble(self, reply: str) -> str:
+        """Damage a reply like line noise or a lost byte would."""
+        position = self.random.randrange(len(reply) - 2)
+        if self.random.random() < 0.5:
+            return reply[:position] + reply[position + 1 :]
+        noise = chr(self.random.randrange(33, 127))
+        return reply[:position] + noise + reply[position + 1 :]
+
+    async def send(self, writer, text: str):
+        """Send text over the simulated serial line."""
+        data = text.encode("utf-8")
+        options = self.options
+        async with self.line:
+            delay = options.response_delay + self.random.uniform(0, options.jitter)
+            if delay:
+                await asyncio.sleep(delay)
+            while data:
+                size = len(data)
+                if options.split:
+                    size = self.random.randint(1, min(size, 16))
+                chunk, data = data[:size], data[size:]
+                if options.byte_time:
+                    await asyncio.sleep(len(chunk) * options.byte_time)
+                writer.write(chunk)
+                await writer.drain()
+                self.bytes_sent += len(chunk)
+
+    def stats(self):
+        """Return simulator statistics."""
+        return {
+            "connects": self.connects,
+            "kicks": self.kicks,
+            "requests": self.requests,
+            "replies": self.replies,
+            "dropped": self.dropped,
+            "garbled": self.garbled,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+async def async_main(args):
+    """Run simulators until interrupted."""
+    simulators = []
+    for index in range(args.count):
+        options = SimulatorOptions(
+            baud_rate=args.baud,
+            response_delay=args.response_delay,
+            jitter=args.jitter,
+            drop_rate=args.drop,
+            garble_rate=args.garble,
+            split=args.split,
+            drop_queued=args.drop_queued,
+            kick_interval=args.kick_interval,
+            seed=args.seed + index,
+            mac="00:11:22:33:44:%02x" % index,
+        )
+        simulator = LuxtronikSimulator(options)
+        await simulator.start(args.host, args.port + index)
+        print("simulated controller on %s:%s" % (args.host, simulator.port))
+        simulators.append(simulator)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for simulator in simulators:
+            print(simulator.stats())
+            await simulator.stop()
+
+
+def main(argv=None):
+    """Parse the command line and run the simulators."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4322)
+    parser.add_argument(
+        "--count", type=int, default=1, help="controllers on port, port+1, ..."
+    )
+    parser.add_argument(
+        "--baud", type=int, default=BAUD_RATE, help="0 disables line delay"
+    )
+    parser.add_argument("--response-delay", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop", type=float, default=0.0, help="reply drop rate")
+    parser.add_argument("--garble", type=float, default=0.0, help="reply garble rate")
+    parser.add_argument(
+        "--split", action="store_true", help="split replies in small segments"
+    )
+    parser.add_argument(
+        "--drop-queued", action="store_true", help="ignore pipelined requests"
+    )
+    parser.add_argument("--kick-interval", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    try:
+        asyncio.run(async_main(parser.parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Immutable engine state published after every poll."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+from datetime import datetime
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple
+
+if __package__:
+    from .const import HeatPumpFunction
+    from .protocol import RECORD_LAYOUTS, record_fields
+else:
+    from const import HeatPumpFunction
+    from protocol import RECORD_LAYOUTS, record_fields
+
+
+def _record_type(function: HeatPumpFunction, attrs):
+    """Frozen record of the fields of a family, e.g. TemperatureRecord."""
+    name = function.name.title().replace("_", "") + "Record"
+    return namedtuple(name, attrs, defaults=(None,) * len(attrs))
+
+
+# record type of every family, records are tuples without instance dict and
+# replaced as a whole when the reply of their family was parsed
+RECORD_TYPES = {
+    function: _record_type(function, [field.attr for field in record_fields(function)])
+    for function in RECORD_LAYOUTS
+    if isinstance(function, HeatPumpFunction)
+}
+RECORD_TYPES[HeatPumpFunction.UNIQUE_ID] = _record_type(
+    HeatPumpFunction.UNIQUE_ID, ["mac_id"]
+)
+
+# family of every field attribute
+FIELD_FAMILIES = {
+    attr: function
+    for function, record_type in RECORD_TYPES.items()
+    for attr in record_type._fields
+}
+
+
+def flatten(records: Mapping[HeatPumpFunction, tuple]) -> dict[str, Any]:
+    """Return the {field: value} of the records of several families."""
+    return {
+        attr: value
+        for record in records.values()
+        for attr, value in zip(record._fields, record)
+    }
+
+
+def json_value(value):
+    """JSON representation of a field value."""
+    if isinstance(value, IntEnum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class HeatpumpSnapshot(NamedTuple):
+    """State of a controller after a poll.
+
+    seq grows with every snapshot, records maps the families to their
+    records, a family that did not change shares its record with the
+    previous snapshot. changed names the fields that differ from the
+    previous snapshot.
+    """
+
+    seq: int
+    time: float  # epoch time of the poll
+    records: Mapping[HeatPumpFunction, tuple]
+    changed: frozenset[str]
+
+    def get(self, attr, default=None):
+        """Return the value of a field."""
+        record = self.records.get(FIELD_FAMILIES.get(attr))
+        if record is None:
+            return default
+        return getattr(record, attr)
+
+    def next(self, records: Mapping[HeatPumpFunction, tuple], now: float):
+        """Return the snapshot following this one, self if nothing changed."""
+        changed = []
+        for function, record in records.items():
+            previous = self.records.get(function)
+            if previous is None:
+                changed.extend(record._fields)
+            elif previous != record:
+                changed.extend(
+                    attr
+                    for attr, old, new in zip(record._fields, previous, record)
+                    if old != new
+                )
+        if not changed:
+            return self
+        return HeatpumpSnapshot(
+            self.seq + 1, now, MappingProxyType(dict(records)), frozenset(changed)
+        )
+
+
+EMPTY_SNAPSHOT = HeatpumpSnapshot(0, 0.0, MappingProxyType({}), frozenset())
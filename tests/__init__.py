@@ -0,0 +1,5 @@
+"""Tests of the engine modules, they run without Home Assistant.
+
+Run from the integration folder with ``pytest``; its select platform keeps
+``python -m pytest`` from working there.
+"""
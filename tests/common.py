@@ -0,0 +1,49 @@
+"""Helpers of the engine tests, a simulated controller and poll intervals."""
+
+from contextlib import asynccontextmanager
+
+from ..const import RECORD_INTERVALS, HeatPumpFunction
+from ..heatpump_engine import async_heatpump_engine
+from ..simulator import ControllerModel, LuxtronikSimulator, SimulatorOptions
+
+
+def intervals(seconds):
+    """Return RECORD_INTERVALS with every polled family due every seconds."""
+    return {
+        function: None if interval is None else seconds
+        for function, interval in RECORD_INTERVALS.items()
+    }
+
+
+class GarbledModel(ControllerModel):
+    """Controller whose replies of the garbled functions have a wrong count."""
+
+    def __init__(self, garbled=()) -> None:
+        """Init model."""
+        super().__init__()
+        self.garbled = set(garbled)
+
+    def reply(self, function: HeatPumpFunction, now):
+        """Return the reply frame, with a wrong field count if garbled."""
+        reply = super().reply(function, now)
+        if reply is not None and function in self.garbled:
+            code, count, rest = reply.split(";", 2)
+            return f"{code};{int(count) + 1};{rest}"
+        return reply
+
+
+@asynccontextmanager
+async def simulated(options=None, model=None, **engine_options):
+    """Yield (engine, simulator) of an engine polling a simulated controller."""
+    simulator = await LuxtronikSimulator(
+        options or SimulatorOptions(baud_rate=0)
+    ).start()
+    if model is not None:
+        simulator.model = model
+    engine_options.setdefault("deadbands", {})
+    engine = async_heatpump_engine(**engine_options)
+    try:
+        yield engine, simulator
+    finally:
+        await engine.disconnect()
+        await simulator.stop()
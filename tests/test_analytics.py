@@ -0,0 +1,116 @@
+"""Tests of the figures derived from the polls."""
+
+from ..analytics import DerivedMetrics
+from ..const import DERIVED_MAX_GAP, SHORT_CYCLE, HeatPumpFunction, HeatPumpGenStatus
+from ..snapshot import RECORD_TYPES
+
+HEATING = HeatPumpGenStatus.HEATING
+DEFROST = HeatPumpGenStatus.DEFROST
+IDLE = HeatPumpGenStatus.IDLE
+
+
+def records(compressor, status, flow=35.0, return_flow=30.0):
+    """Return the records of a poll with the fields the metrics read."""
+    outputs = RECORD_TYPES[HeatPumpFunction.OUTPUTS]()
+    temperatures = RECORD_TYPES[HeatPumpFunction.TEMPERATURE]()
+    gen_status = RECORD_TYPES[HeatPumpFunction.GEN_STATUS]()
+    return {
+        HeatPumpFunction.OUTPUTS: outputs._replace(
+            output_compressor1=compressor, output_compressor2=0
+        ),
+        HeatPumpFunction.TEMPERATURE: temperatures._replace(
+            heating_circuit_flow_temp=flow,
+            heating_circuit_return_flow_temp_actual=return_flow,
+            heat_source_inlet_temp=5.0,
+            heat_source_outlet_temp=2.0,
+        ),
+        HeatPumpFunction.GEN_STATUS: gen_status._replace(main_status=status),
+    }
+
+
+def run(metrics, polls):
+    """Feed (time, compressor, status) polls, return the last record."""
+    for now, compressor, status in polls:
+        record = metrics.update(records(compressor, status), now)
+    return record
+
+
+def test_compressor_starts_and_run_lengths():
+    """Starts are counted from off to on, runs below SHORT_CYCLE are short."""
+    metrics = DerivedMetrics()
+    record = run(
+        metrics,
+        [
+            (0, 1, HEATING),  # running at startup is no start
+            (100, 0, IDLE),
+            (200, 1, HEATING),
+            (200 + SHORT_CYCLE + 100, 0, IDLE),
+            (1000, 1, HEATING),
+            (1100, 0, IDLE),
+        ],
+    )
+    assert record.compressor_starts == 2
+    assert record.compressor_short_cycles == 1
+    assert record.compressor_run_length == 100
+    assert record.compressor_run_length_mean == (SHORT_CYCLE + 100 + 100) / 2
+    assert record.compressor_starts_hour == 2
+    record = run(metrics, [(200 + 3600, 0, IDLE)])
+    assert record.compressor_starts_hour == 1
+    assert record.compressor_starts == 2
+
+
+def test_defrosts():
+    """A defrost is counted on entering DEFROST, its duration on leaving."""
+    metrics = DerivedMetrics()
+    record = run(
+        metrics,
+        [
+            (0, 1, DEFROST),  # defrosting at startup is no defrost
+            (60, 1, HEATING),
+            (100, 1, DEFROST),
+            (190, 1, DEFROST),
+            (250, 1, HEATING),
+        ],
+    )
+    assert record.defrosts == 1
+    assert record.defrosts_day == 1
+    assert record.defrost_duration == 150
+    assert record.status_changes == 3
+    # UNKNOWN keeps the last status
+    record = run(metrics, [(300, 1, HeatPumpGenStatus.UNKNOWN)])
+    assert record.status_changes == 3
+    record = run(metrics, [(86400 + 100, 1, HEATING)])
+    assert record.defrosts_day == 0
+
+
+def test_time_in_status():
+    """Time between polls is credited to the first status, outages are capped."""
+    metrics = DerivedMetrics()
+    record = run(
+        metrics,
+        [
+            (0, 0, HeatPumpGenStatus.EVU_LOCK),
+            (30, 0, IDLE),
+            (40, 1, HEATING),
+            (40 + 10 * DERIVED_MAX_GAP, 1, HEATING),
+        ],
+    )
+    assert record.time_evu_lock == 30
+    assert record.time_idle == 10
+    assert record.time_heating == DERIVED_MAX_GAP
+
+
+def test_delta_t():
+    """Delta T of every poll, its running mean only while the compressor runs."""
+    metrics = DerivedMetrics()
+    record = metrics.update(records(0, IDLE, 30.0, 29.0), 0)
+    assert record.delta_t == 1.0
+    assert record.delta_t_running is None
+    assert record.delta_t_source == 3.0
+    metrics.update(records(1, HEATING, 35.0, 30.0), 10)
+    record = metrics.update(records(1, HEATING, 36.0, 30.0), 20)
+    assert record.delta_t == 6.0
+    assert record.delta_t_running == 5.5
+    record = metrics.update(records(1, HEATING, None, 30.0), 30)
+    assert record.delta_t is None
+    assert record.delta_t_running == 5.5
@@ -0,0 +1,100 @@
+"""Tests of the mode writes against a simulated controller."""
+
+import asyncio
+
+from ..const import COMMAND_RETRIES, HeatPumpFunction, HeatPumpMode
+from ..simulator import ControllerModel
+from .common import intervals, simulated
+
+HEAT_CIRC = HeatPumpFunction.HEAT_CIRC
+HOT_WATER = HeatPumpFunction.HOT_WATER
+
+
+class StubbornModel(ControllerModel):
+    """Controller echoing mode writes but ignoring the first few."""
+
+    def __init__(self, ignored=0) -> None:
+        """Init model."""
+        super().__init__()
+        self.ignored = ignored
+        self.writes = 0
+
+    def set_mode(self, code, mode):
+        """Count the write, apply it once the ignored ones are used up."""
+        self.writes += 1
+        if self.writes > self.ignored:
+            super().set_mode(code, mode)
+
+
+def test_mode_write_is_verified():
+    """A write is read back and published without another poll."""
+
+    async def run():
+        async with simulated(intervals=intervals(0), mode_writes=True) as (
+            engine,
+            sim,
+        ):
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            assert engine.snapshot.get("heat_circ_mode") == HeatPumpMode.AUTO
+            assert await engine.async_set_mode(
+                "127.0.0.1", sim.port, HEAT_CIRC, HeatPumpMode.PARTY
+            )
+            assert await engine.async_set_mode(
+                "127.0.0.1", sim.port, HOT_WATER, HeatPumpMode.OFF
+            )
+            assert sim.model.heat_circ_mode == HeatPumpMode.PARTY
+            assert sim.model.hot_water_mode == HeatPumpMode.OFF
+            assert engine.records[HEAT_CIRC][0] == HeatPumpMode.PARTY
+            assert engine.records[HOT_WATER][0] == HeatPumpMode.OFF
+            assert engine.snapshot.get("heat_circ_mode") == HeatPumpMode.PARTY
+            # the echo of the write is no resync
+            assert engine.decoder.resyncs == 0
+            assert "command" in engine.metrics_report()
+
+    asyncio.run(run())
+
+
+def test_mode_write_is_retried():
+    """A write the controller did not take is repeated."""
+
+    async def run():
+        model = StubbornModel(ignored=COMMAND_RETRIES)
+        async with simulated(model=model, mode_writes=True) as (engine, sim):
+            assert await engine.async_set_mode(
+                "127.0.0.1", sim.port, HEAT_CIRC, HeatPumpMode.VACATION
+            )
+            assert model.writes == 1 + COMMAND_RETRIES
+            assert engine.records[HEAT_CIRC][0] == HeatPumpMode.VACATION
+
+    asyncio.run(run())
+
+
+def test_mode_write_gives_up():
+    """A write not taken after the retries fails and counts an error."""
+
+    async def run():
+        model = StubbornModel(ignored=1 + COMMAND_RETRIES)
+        async with simulated(model=model, mode_writes=True) as (engine, sim):
+            assert not await engine.async_set_mode(
+                "127.0.0.1", sim.port, HEAT_CIRC, HeatPumpMode.ZWE
+            )
+            assert model.writes == 1 + COMMAND_RETRIES
+            assert model.heat_circ_mode == HeatPumpMode.AUTO
+            assert engine.records[HEAT_CIRC][0] == HeatPumpMode.AUTO
+            assert engine.metrics_report()["errors"]["command"] == 1
+
+    asyncio.run(run())
+
+
+def test_mode_write_disabled():
+    """Without mode writes nothing is sent."""
+
+    async def run():
+        async with simulated() as (engine, sim):
+            assert not await engine.async_set_mode(
+                "127.0.0.1", sim.port, HEAT_CIRC, HeatPumpMode.OFF
+            )
+            assert sim.requests == 0
+            assert not engine.commands
+
+    asyncio.run(run())
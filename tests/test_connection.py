@@ -0,0 +1,40 @@
+"""Tests of the ser2net session statistics."""
+
+import asyncio
+
+from .common import intervals, simulated
+
+
+def test_connection_stats():
+    """Reconnects, session durations and the backoff show in the stats."""
+
+    async def run():
+        async with simulated(intervals=intervals(0)) as (engine, sim):
+            connection = engine.connection
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            stats = connection.stats()
+            assert stats["connected"]
+            assert stats["connects"] == 1
+            assert stats["session_duration"] >= 0
+            assert stats["last_session_duration"] is None
+            sim.kick_all()
+            await asyncio.sleep(0.05)
+            for _ in range(2):
+                if await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0:
+                    break
+            stats = connection.stats()
+            assert stats["reconnects"] == 1
+            assert stats["disconnect_reason"] == "closed by peer"
+            assert stats["last_session_duration"] >= 0.05
+            port = sim.port
+            await sim.stop()
+            await engine.disconnect()
+            assert await engine.async_poll_for_stats("127.0.0.1", port) != 0
+            stats = connection.stats()
+            assert not stats["connected"]
+            assert stats["session_duration"] is None
+            assert stats["connect_failures"] == 1
+            assert stats["failures_in_row"] == 1
+            assert stats["retry_in"] > 0
+
+    asyncio.run(run())
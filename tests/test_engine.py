@@ -0,0 +1,138 @@
+"""Tests of the engine polling a simulated controller."""
+
+import asyncio
+
+from ..const import PIPELINE_MAX_DROPS, HeatPumpFunction
+from ..simulator import SimulatorOptions
+from .common import GarbledModel, intervals, simulated
+
+TEMPERATURE = HeatPumpFunction.TEMPERATURE
+
+
+def test_garbled_reply_is_not_complete():
+    """A rejected last record leaves its family missing, not fetched."""
+
+    async def run():
+        model = GarbledModel({TEMPERATURE})
+        async with simulated(model=model, intervals=intervals(0)) as (engine, sim):
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            schedule = engine.scheduler.schedules[TEMPERATURE]
+            assert schedule.fetches == 0
+            assert schedule.failures == 1
+            assert TEMPERATURE not in engine.record_times
+            assert engine.records[TEMPERATURE].outdoor_temp is None
+            assert engine.metrics_report()["errors"]["resync"] >= 1
+            assert engine.scheduler.schedules[HeatPumpFunction.INPUTS].fetches == 1
+
+    asyncio.run(run())
+
+
+def test_garbled_reply_is_retried_and_turns_stale():
+    """A family failing on garbled replies stays due and turns stale."""
+
+    async def run():
+        model = GarbledModel()
+        async with simulated(model=model, intervals=intervals(0.05)) as (
+            engine,
+            sim,
+        ):
+            engine.read_timeout = 0.1
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            received = engine.record_times[TEMPERATURE]
+            model.garbled.add(TEMPERATURE)
+            requests = sim.requests
+            for cycle in range(1, 4):
+                await asyncio.sleep(0.2)
+                assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+                schedule = engine.scheduler.schedules[TEMPERATURE]
+                assert schedule.failures == cycle
+                assert schedule.fetches == 1
+            # re-requested in every cycle, pipelined and alone
+            assert sim.requests - requests >= 3 * 2
+            assert engine.record_times[TEMPERATURE] == received
+            stale = engine.stale_functions()
+            assert TEMPERATURE in stale
+            assert HeatPumpFunction.INPUTS not in stale
+
+    asyncio.run(run())
+
+
+def test_slow_controller_keeps_pipelining():
+    """Replies trickling in slower than the read timeout are no drops."""
+
+    async def run():
+        options = SimulatorOptions(baud_rate=0, response_delay=0.06)
+        async with simulated(options, intervals=intervals(0)) as (engine, sim):
+            for _ in range(PIPELINE_MAX_DROPS + 2):
+                assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            assert engine.pipelined
+            assert engine.pipeline_drops == 0
+            assert "pipeline_miss" not in engine.metrics_report().get("errors", {})
+
+    asyncio.run(run())
+
+
+def test_dropping_controller_falls_back_to_strict_mode():
+    """A controller ignoring queued requests is polled one request at a time."""
+
+    async def run():
+        options = SimulatorOptions(baud_rate=0, drop_queued=True)
+        async with simulated(options, intervals=intervals(0)) as (engine, sim):
+            engine.read_timeout = 0.1
+            for _ in range(PIPELINE_MAX_DROPS):
+                await engine.async_poll_for_stats("127.0.0.1", sim.port)
+            assert not engine.pipelined
+            assert engine.strict_until is not None
+            # strict polls get every reply
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            assert all(
+                schedule.failed_in_row == 0
+                for schedule in engine.scheduler.schedules.values()
+            )
+
+    asyncio.run(run())
+
+
+def test_lossy_line_keeps_pipelining():
+    """Randomly lost or garbled replies do not count as dropped commands."""
+
+    async def run():
+        options = SimulatorOptions(
+            baud_rate=0, drop_rate=0.05, garble_rate=0.05, split=True, seed=1
+        )
+        async with simulated(options, intervals=intervals(0)) as (engine, sim):
+            engine.read_timeout = 0.05
+            for _ in range(20):
+                await engine.async_poll_for_stats("127.0.0.1", sim.port)
+            assert engine.pipelined
+
+    asyncio.run(run())
+
+
+def test_adaptive_intervals_grow_and_reset():
+    """Unchanged families back off, a change or a failure keeps the base."""
+
+    async def run():
+        model = GarbledModel({HeatPumpFunction.INPUTS})
+        async with simulated(model=model, intervals=intervals(0.05)) as (
+            engine,
+            sim,
+        ):
+            engine.read_timeout = 0.05
+            schedules = engine.scheduler.schedules
+            for _ in range(20):
+                await engine.async_poll_for_stats("127.0.0.1", sim.port)
+                await asyncio.sleep(0.06)
+            assert schedules[HeatPumpFunction.HOT_WATER].interval == 0.2
+            assert schedules[HeatPumpFunction.GEN_STATUS].interval == 0.2
+            # garbled replies are failures, no unchanged values
+            assert schedules[HeatPumpFunction.INPUTS].interval == 0.05
+            assert schedules[HeatPumpFunction.INPUTS].fetches == 0
+
+            model.hot_water_mode = 2
+            await asyncio.sleep(0.2)
+            await engine.async_poll_for_stats("127.0.0.1", sim.port)
+            assert engine.records[HeatPumpFunction.HOT_WATER].hot_water_mode == 2
+            assert schedules[HeatPumpFunction.HOT_WATER].interval == 0.05
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+"""Tests of the deadband change filter."""
+
+from ..const import HeatPumpFunction
+from ..filters import ChangeFilter, Deadband
+from ..heatpump_engine import initial_records
+
+TEMPERATURE = HeatPumpFunction.TEMPERATURE
+
+
+def outdoor(records, value):
+    """Return records with the outdoor temperature set to value."""
+    records = dict(records)
+    records[TEMPERATURE] = records[TEMPERATURE]._replace(outdoor_temp=value)
+    return records
+
+
+def published(change_filter, records, value, now):
+    """Filter an outdoor temperature, return the published one."""
+    return change_filter.apply(outdoor(records, value), now)[TEMPERATURE].outdoor_temp
+
+
+def test_deadband_holds_back_small_changes():
+    """Changes below the deadband publish the last published value."""
+    records = initial_records()
+    change_filter = ChangeFilter({"outdoor_temp": Deadband(0.2)})
+    assert published(change_filter, records, 5.0, 0) == 5.0
+    assert published(change_filter, records, 5.1, 1) == 5.0
+    assert published(change_filter, records, 5.2, 2) == 5.2
+    assert change_filter.suppressed == 1
+
+
+def test_deadband_hysteresis_against_direction():
+    """Turning back needs deadband plus hysteresis."""
+    records = initial_records()
+    change_filter = ChangeFilter({"outdoor_temp": Deadband(0.2, 0.1)})
+    published(change_filter, records, 5.0, 0)
+    assert published(change_filter, records, 5.2, 1) == 5.2
+    assert published(change_filter, records, 5.0, 2) == 5.2
+    assert published(change_filter, records, 4.9, 3) == 4.9
+
+
+def test_deadband_max_silence():
+    """A held back value is published after max_silence seconds."""
+    records = initial_records()
+    change_filter = ChangeFilter({"outdoor_temp": Deadband(0.2, 0, 300)})
+    published(change_filter, records, 5.0, 0)
+    assert published(change_filter, records, 5.1, 299) == 5.0
+    assert published(change_filter, records, 5.1, 300) == 5.1
+
+
+def test_unfiltered_records_are_kept():
+    """Families without held back changes keep their record."""
+    records = initial_records()
+    change_filter = ChangeFilter({"outdoor_temp": Deadband(0.2)})
+    first = change_filter.apply(outdoor(records, 5.0), 0)
+    second = change_filter.apply(outdoor(records, 5.0), 1)
+    assert second[HeatPumpFunction.GEN_STATUS] is records[HeatPumpFunction.GEN_STATUS]
+    assert second[TEMPERATURE] == first[TEMPERATURE]
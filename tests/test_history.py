@@ -0,0 +1,39 @@
+"""Tests of the ring buffer behind the history."""
+
+import math
+
+from ..history import RingBuffer
+
+
+def test_ring_buffer_wraparound():
+    """A full buffer overwrites its oldest rows, rows stay in time order."""
+    buffer = RingBuffer(("value",), 4)
+    for time in range(6):
+        buffer.append(time, (time * 10.0,))
+    assert buffer.rows == 4
+    rows = buffer.query()
+    assert rows["time"] == [2.0, 3.0, 4.0, 5.0]
+    assert rows["value"] == [20.0, 30.0, 40.0, 50.0]
+    assert buffer.query(since=3, until=5)["time"] == [3.0, 4.0]
+    buffer.append(6, (math.nan,))
+    assert buffer.query()["value"][-1] is None
+    buffer.close()
+
+
+def test_ring_buffer_file_reopen(tmp_path):
+    """A mapped file keeps its rows, another layout starts over."""
+    path = str(tmp_path / "history.bin")
+    buffer = RingBuffer(("value",), 3, path)
+    for time in range(5):
+        buffer.append(time, (time + 0.5,))
+    buffer.close()
+
+    buffer = RingBuffer(("value",), 3, path)
+    assert buffer.query() == {"time": [2.0, 3.0, 4.0], "value": [2.5, 3.5, 4.5]}
+    buffer.append(5, (5.5,))
+    assert buffer.query()["time"] == [3.0, 4.0, 5.0]
+    buffer.close()
+
+    buffer = RingBuffer(("other",), 3, path)
+    assert buffer.rows == 0
+    buffer.close()
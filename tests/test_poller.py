@@ -0,0 +1,119 @@
+"""Tests of the headless poller output."""
+
+import asyncio
+import csv
+import json
+import os
+
+import pytest
+
+from ..poller import CSV_FIELDS, SnapshotServer, SnapshotWriter, main, snapshot_row
+from .common import intervals, simulated
+
+
+def row(seq):
+    """Return a snapshot row with a few values."""
+    return {
+        "controller": "127.0.0.1:4322",
+        "seq": seq,
+        "time": 1000.0 + seq,
+        "values": {"outdoor_temp": -1.5},
+        "updated": {},
+        "derived": {"compressor_starts": seq},
+    }
+
+
+def read_rows(path):
+    """Return the NDJSON rows of a file."""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    """Rows are buffered up to batch_rows or flush_interval seconds."""
+    path = str(tmp_path / "lux.ndjson")
+    writer = SnapshotWriter(path, batch_rows=3, flush_interval=10)
+    writer.write(row(1), 0)
+    writer.write(row(2), 1)
+    assert read_rows(path) == []
+    writer.write(row(3), 2)
+    assert [line["seq"] for line in read_rows(path)] == [1, 2, 3]
+    writer.write(row(4), 3)
+    writer.flush_due(12.9)
+    assert len(read_rows(path)) == 3
+    writer.flush_due(13)
+    assert len(read_rows(path)) == 4
+    writer.write(row(5), 14)
+    writer.close()
+    assert len(read_rows(path)) == 5
+    assert writer.stats()["flushes"] == 3
+    assert writer.stats()["rows_buffered"] == 0
+
+
+def test_full_file_is_rotated(tmp_path):
+    """A full file moves to <path>.1, only backups files are kept."""
+    path = str(tmp_path / "lux.ndjson")
+    size = len(json.dumps(row(10), separators=(",", ":"))) + 1
+    writer = SnapshotWriter(path, batch_rows=1, max_bytes=2 * size, backups=2)
+    for seq in range(10, 18):
+        writer.write(row(seq), seq)
+    writer.close()
+    assert writer.stats()["rotations"] == 3
+    assert [line["seq"] for line in read_rows(path)] == [16, 17]
+    assert [line["seq"] for line in read_rows(path + ".1")] == [14, 15]
+    assert [line["seq"] for line in read_rows(path + ".2")] == [12, 13]
+    assert not os.path.exists(path + ".3")
+
+
+def test_csv_files_start_with_a_header(tmp_path):
+    """Every CSV file, also after a rotation, starts with its header."""
+    path = str(tmp_path / "lux.csv")
+    writer = SnapshotWriter(path, "csv", batch_rows=1, max_bytes=1, backups=1)
+    writer.write(row(1), 0)
+    writer.write(row(2), 1)
+    writer.close()
+    for name, seq in ((path + ".1", 1), (path, 2)):
+        with open(name, encoding="utf-8", newline="") as file:
+            header, *rows = csv.reader(file)
+        assert header == ["controller", "seq", "time", *CSV_FIELDS]
+        assert len(rows) == 1
+        cells = dict(zip(header, rows[0]))
+        assert cells["seq"] == str(seq)
+        assert cells["outdoor_temp"] == "-1.5"
+        assert cells["compressor_starts"] == str(seq)
+
+
+def test_changed_only_works_with_ndjson():
+    """--changed cannot be combined with CSV."""
+    with pytest.raises(SystemExit):
+        main(["127.0.0.1", "--format", "csv", "--changed"])
+
+
+def test_snapshot_rows_and_server():
+    """Rows carry the polled values, the server returns the latest ones."""
+
+    async def run():
+        async with simulated(intervals=intervals(0)) as (engine, sim):
+            assert await engine.async_poll_for_stats("127.0.0.1", sim.port) == 0
+            label = f"127.0.0.1:{sim.port}"
+            full = snapshot_row(label, engine)
+            assert full["values"]["mac_id"] == "00:11:22:33:44:55"
+            assert full["updated"]["temperature"] is not None
+            changed = snapshot_row(label, engine, True)
+            assert set(changed["values"]) == set(engine.snapshot.changed)
+            server = await SnapshotServer().start("127.0.0.1:0")
+            server.latest[label] = full
+            port = server.servers[0].sockets[0].getsockname()[1]
+            try:
+                for target, status in ((label, b"200"), ("other:1", b"404")):
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.write(f"GET /{target} HTTP/1.1\r\n\r\n".encode("ascii"))
+                    response = await reader.read()
+                    writer.close()
+                    head, _, body = response.partition(b"\r\n\r\n")
+                    assert head.split(b" ")[1] == status
+                assert json.loads(body) == {"error": "unknown controller"}
+            finally:
+                await server.stop()
+
+    asyncio.run(run())
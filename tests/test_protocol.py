@@ -0,0 +1,63 @@
+"""Tests of the record parser and the line decoder."""
+
+from ..protocol import LineDecoder, decode_record
+
+TEMPERATURES = b"1100;12;301;289;290;512;-12;480;500;81;63;0;0;0"
+
+
+def test_decode_uniform_record():
+    """Scaled temperatures are decoded in field order."""
+    code, values = decode_record(TEMPERATURES)
+    values = dict(values)
+    assert code == 1100
+    assert len(values) == 12
+    assert values["heating_circuit_flow_temp"] == 30.1
+    assert values["outdoor_temp"] == -1.2
+    assert values["remote_room_temp"] == 0.0
+
+
+def test_decode_rejects_invalid_records():
+    """Wrong counts, garbled values and unknown codes are no record."""
+    assert decode_record(b"1100;11;301;289") is None
+    assert decode_record(TEMPERATURES.replace(b"512", b"5x2")) is None
+    assert decode_record(b"9999;1;0") is None
+    assert decode_record(b"3405;1;9") is None
+
+
+def test_decode_mixed_record():
+    """The general status splits on "," as well and builds the clock."""
+    code, values = decode_record(b"1700;12;1; V2.33;1;5;24;9;11;10;12;30;0;1")
+    values = dict(values)
+    assert code == 1700
+    assert values["main_sw_status"] == "V2.33"
+    assert values["main_sys_uptime"].isoformat() == "2011-09-24T10:12:30"
+
+
+def test_line_decoder_split_terminator():
+    """Lines and a terminator cut between reads are completed by the next."""
+    decoder = LineDecoder()
+    assert decoder.feed(b"3405;1;0\r") == []
+    assert decoder.feed(b"\n3505;1;") == [b"3405;1;0"]
+    assert decoder.pending == len(b"3505;1;")
+    assert decoder.feed(b"1\r\n1100") == [b"3505;1;1"]
+    assert decoder.lines == 2
+
+
+def test_line_decoder_overlong_line():
+    """A line without terminator beyond max_line is dropped as a resync."""
+    decoder = LineDecoder(max_line=16)
+    assert decoder.feed(b"x" * 20) == []
+    assert decoder.pending == 0
+    assert decoder.resyncs == 1
+    assert decoder.discarded_bytes == 20
+    assert decoder.feed(b"3405;1;0\r\n") == [b"3405;1;0"]
+
+
+def test_line_decoder_reset():
+    """Resetting drops the partial line of a closed session."""
+    decoder = LineDecoder()
+    decoder.feed(b"1100;12;30")
+    decoder.reset()
+    assert decoder.pending == 0
+    assert decoder.resyncs == 1
+    assert decoder.feed(b"3405;1;0\r\n") == [b"3405;1;0"]
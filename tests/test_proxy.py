@@ -0,0 +1,99 @@
+"""Tests of the ser2net proxy sharing the session of an engine."""
+
+import asyncio
+
+from ..const import HeatPumpFunction, HeatPumpMode
+from ..proxy import Ser2NetProxy
+from .common import GarbledModel, simulated
+
+TEMPERATURE = HeatPumpFunction.TEMPERATURE
+INPUTS = HeatPumpFunction.INPUTS
+
+
+def test_reply_is_served_within_ttl():
+    """A second read within the ttl does not touch the line."""
+
+    async def run():
+        async with simulated() as (engine, sim):
+            proxy = Ser2NetProxy(engine, "127.0.0.1", sim.port, ttl=60)
+            frame = await proxy.answer(b"1100")
+            assert frame.startswith(b"1100;12;")
+            requests = sim.requests
+            assert await proxy.answer(b"1100") == frame
+            assert sim.requests == requests
+            assert proxy.stats()["cache_hits"] == 1
+            assert proxy.stats()["fetched"] == 1
+
+    asyncio.run(run())
+
+
+def test_expired_reply_is_fetched_again():
+    """A read after the ttl fetches the function again."""
+
+    async def run():
+        async with simulated() as (engine, sim):
+            proxy = Ser2NetProxy(engine, "127.0.0.1", sim.port, ttl=0)
+            await proxy.answer(b"1100")
+            requests = sim.requests
+            assert (await proxy.answer(b"1100")).startswith(b"1100;")
+            assert sim.requests == requests + 1
+            assert proxy.stats()["cache_hits"] == 0
+            assert proxy.stats()["fetched"] == 2
+
+    asyncio.run(run())
+
+
+def test_concurrent_reads_share_one_fetch():
+    """Clients asking for a function being fetched wait for that fetch."""
+
+    async def run():
+        async with simulated() as (engine, sim):
+            proxy = Ser2NetProxy(engine, "127.0.0.1", sim.port)
+            frames = await asyncio.gather(*(proxy.answer(b"1200") for _ in range(4)))
+            assert len(set(frames)) == 1
+            assert frames[0].startswith(b"1200;6;")
+            assert sim.requests == 1
+            assert proxy.stats()["fetched"] == 1
+            assert proxy.stats()["coalesced"] == 3
+
+    asyncio.run(run())
+
+
+def test_invalid_and_failed_requests_get_no_reply():
+    """Unknown codes, the unique id and garbled replies are not answered."""
+
+    async def run():
+        model = GarbledModel({TEMPERATURE})
+        async with simulated(model=model) as (engine, sim):
+            engine.read_timeout = 0.1
+            proxy = Ser2NetProxy(engine, "127.0.0.1", sim.port)
+            assert await proxy.answer(b"0") == b""
+            assert await proxy.answer(b"9999") == b""
+            assert await proxy.answer(b"abc") == b""
+            assert await proxy.answer(b"1100") == b""
+            assert proxy.stats()["failed"] == 1
+
+    asyncio.run(run())
+
+
+def test_client_session():
+    """A client gets the banner, replies and mode write echoes over TCP."""
+
+    async def run():
+        async with simulated(mode_writes=True) as (engine, sim):
+            proxy = await Ser2NetProxy(engine, "127.0.0.1", sim.port).start()
+            try:
+                reader, writer = await asyncio.open_connection(
+                    "127.0.0.1", proxy.listen_port
+                )
+                banner = await reader.readuntil(b"uid=00:11:22:33:44:55\r\n")
+                assert banner.startswith(b"\r\nser2net port")
+                writer.write(b"1200\n\r3401;1;2\n\r")
+                assert (await reader.readline()).startswith(b"1200;6;")
+                assert await reader.readline() == b"3401;1;2\r\n"
+                assert sim.model.heat_circ_mode == HeatPumpMode.PARTY
+                writer.close()
+            finally:
+                await proxy.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+"""Tests of the per record family poll scheduler."""
+
+from ..const import RETRY_MAX, HeatPumpFunction
+from ..scheduler import PollScheduler
+
+TEMPERATURE = HeatPumpFunction.TEMPERATURE
+RUNTIMES = HeatPumpFunction.RUNTIMES
+UNIQUE_ID = HeatPumpFunction.UNIQUE_ID
+
+
+def scheduler(adaptive=False):
+    """Return a scheduler with a 5 s, a 60 s and a once per connection family."""
+    return PollScheduler({TEMPERATURE: 5, RUNTIMES: 60, UNIQUE_ID: None}, adaptive)
+
+
+def test_due_by_interval():
+    """Families are due once their interval passed."""
+    schedule = scheduler()
+    assert schedule.due(0) == [TEMPERATURE, RUNTIMES, UNIQUE_ID]
+    for function in (TEMPERATURE, RUNTIMES, UNIQUE_ID):
+        schedule.done(function, 0, False)
+    assert schedule.due(5) == [TEMPERATURE]
+    assert schedule.due(60) == [TEMPERATURE, RUNTIMES]
+
+
+def test_failed_is_retried_with_backoff():
+    """A failed family is retried on the next tick, then with doubling delays."""
+    schedule = scheduler()
+    schedule.done(RUNTIMES, 0, False)
+    schedule.failed(RUNTIMES, 60)
+    assert RUNTIMES in schedule.due(65)
+    schedule.failed(RUNTIMES, 65)
+    assert schedule.schedules[RUNTIMES].retry_at == 70
+    schedule.failed(RUNTIMES, 70)
+    assert schedule.schedules[RUNTIMES].retry_at == 80
+    assert RUNTIMES not in schedule.due(75)
+    assert RUNTIMES in schedule.due(80)
+    for now in range(80, 2000, 5):
+        schedule.failed(RUNTIMES, now)
+    assert schedule.schedules[RUNTIMES].retry_at == 1995 + RETRY_MAX
+    schedule.done(RUNTIMES, 2000, True)
+    assert schedule.schedules[RUNTIMES].retry_at is None
+    assert schedule.schedules[RUNTIMES].failed_in_row == 0
+
+
+def test_failed_once_per_connection():
+    """A family fetched once per connection waits for the next connection."""
+    schedule = scheduler()
+    schedule.failed(UNIQUE_ID, 0)
+    assert UNIQUE_ID not in schedule.due(5)
+    schedule.reset_connection()
+    assert UNIQUE_ID in schedule.due(5)
+
+
+def test_adaptive_backoff():
+    """Unchanged fetches double the interval up to its limit."""
+    schedule = scheduler(adaptive=True)
+    for now in range(0, 100, 5):
+        schedule.done(TEMPERATURE, now, False)
+    assert schedule.schedules[TEMPERATURE].interval == 20
+    schedule.done(TEMPERATURE, 100, True)
+    assert schedule.schedules[TEMPERATURE].interval == 5
@@ -0,0 +1,34 @@
+"""Stress test of one engine shared by threads, tasks and readers."""
+
+from ..benchmark import bench_stress
+from ..simulator import SimulatorOptions
+
+
+def test_stress_against_simulator():
+    """Concurrent polls share the poll in flight, readers see whole snapshots."""
+    options = SimulatorOptions(baud_rate=0)
+    result = bench_stress(threads=4, tasks=4, readers=2, seconds=2.0, options=options)
+    assert result["calls"] > 0
+    assert result["polls"] > 0
+    assert result["coalesced"] > 0
+    assert result["failed_calls"] == 0
+    assert result["seq_regressions"] == 0
+    assert result["incomplete_snapshots"] == 0
+    assert result["engine_errors"] == {}
+    assert result["snapshot_reads"] > 0
+
+
+def test_stress_lossy_line():
+    """Dropped and garbled replies fail calls, snapshots still only advance."""
+    result = bench_stress(
+        threads=2,
+        tasks=2,
+        readers=1,
+        seconds=2.0,
+        options=SimulatorOptions(
+            baud_rate=0, drop_rate=0.05, garble_rate=0.05, split=True, seed=1
+        ),
+    )
+    assert result["polls"] > 0
+    assert result["seq_regressions"] == 0
+    assert result["snapshot_reads"] > 0